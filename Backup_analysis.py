@@ -1,13 +1,25 @@
 import os
-import calendar
-import gzip
-import shutil
+import sys
+import argparse
+import atexit
 import mysql.connector
-import pandas as pd
-from openpyxl.styles import Font, Alignment
-from openpyxl.utils import get_column_letter
-from openpyxl import load_workbook
+import mysql.connector.pooling
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from dump_restore import (iter_backup_chunks, filter_tables, stream_restore, parallel_restore,
+                          parallel_restore_directory, dump_table_hashes, plan_restore,
+                          file_checksum, load_manifest, save_manifest,
+                          require_complete_dump, find_backups, backup_size)
+from report_sql import fetch_report_results, fetch_rollup_days, create_report_indexes, explain_report_queries
+from rollup_store import open_rollup_store, refresh_rollups, rollup_results, ROLLUP_SECTIONS
+from snapshot_compare import newest_first, snapshot_labels, compare_snapshots, comparative_frames
+from report_workbook import write_report_workbook
+from report_shaping import shape_report, report_sheets, report_pdf_sections
+from report_pdf import write_report_pdf
+from report_windows import NAMED_WINDOWS, metric_windows
+from run_metrics import RunLog
+from backup_watcher import SETTLE_SECONDS
+from delta_transfer import remote_for, send_file
 
 # Configuration
 DB_HOST = "localhost"
@@ -15,519 +27,392 @@ DB_USER = "root"
 DB_PASSWORD = "password"
 TEMP_DB = "billing_analysis"
 BACKUP_DIR = "/home/shadreck/Documents/backup"
+# Every table read by the report queries below; the rest of the dump is not restored.
+REPORT_TABLES = ["patient", "person", "order_entries", "services", "service_prices", "receipts"]
+# Backup checksum and per-table dump hashes of what TEMP_DB currently holds.
+RESTORE_MANIFEST = "restore_manifest.json"
+# Per-day aggregates behind sections 6, 9 and 10, kept between runs.
+ROLLUP_STORE = "report_rollups.sqlite"
+# One JSON line of stage spans per run, and the Prometheus textfile-collector file of the last run.
+RUN_LOG = "report_run_log.jsonl"
+METRICS_TEXTFILE = "billing_report.prom"
+PROFILE_FILE = "report_profile.prof"
+# Where the reports are sent, as HOST:DIRECTORY.
+LAB_SERVER = "ghii@192.168.10.186:/home/ghii/tests/backup"
+
+parser = argparse.ArgumentParser(description="Restore the newest billing backup and build the consolidated report.")
+parser.add_argument("--engine", choices=["mysql", "columnar"], default="mysql",
+                    help="mysql: restore the dump into MySQL and query it (default); "
+                         "columnar: parse the dump into a Parquet snapshot next to the backup and "
+                         "compute the report with pandas, no MySQL server needed")
+parser.add_argument("--order-entries-scan", choices=["single", "per-query", "compare"], default="single",
+                    help="single: compute the five order_entries sections from one streamed scan (default); "
+                         "per-query: one SQL query per section; "
+                         "compare: run both, report whether they match and use the per-query results")
+parser.add_argument("--restore-mode", choices=["stream", "file"], default="stream",
+                    help="stream: pipe the decompressed dump straight into mysql (default); "
+                         "file: extract a full .sql file first and restore from it")
+parser.add_argument("--tables", type=lambda value: [t.strip() for t in value.split(",") if t.strip()],
+                    default=REPORT_TABLES,
+                    help="comma-separated tables to restore (default: the tables the report queries)")
+parser.add_argument("--all-tables", action="store_true",
+                    help="restore the whole dump instead of only --tables")
+parser.add_argument("--force-restore", action="store_true",
+                    help="drop and restore the database even if the manifest says it is up to date")
+parser.add_argument("--query-workers", type=int, default=4,
+                    help="run independent report sections concurrently on this many pooled "
+                         "connections (default: 4, at most 32)")
+parser.add_argument("--build-indexes", action="store_true",
+                    help="after restore, add the covering indexes the report queries need and "
+                         "print EXPLAIN plans before and after")
+parser.add_argument("--no-rollups", action="store_true",
+                    help="compute sections 6, 9 and 10 from all history instead of the rollup store")
+parser.add_argument("--rebuild-rollups", action="store_true",
+                    help="recompute the rollup store from all history (after the rollup logic changes)")
+parser.add_argument("--compare-backups", nargs="*", metavar="BACKUP",
+                    help="build a comparative report over several backups instead (default: every "
+                         "backup in the backup directory), processed in parallel")
+parser.add_argument("--snapshot-workers", type=int, default=4,
+                    help="backups processed concurrently by --compare-backups (default: 4)")
+parser.add_argument("--metrics-textfile",
+                    help="where to write the Prometheus metrics of the run, e.g. the node_exporter "
+                         "textfile directory (default: billing_report.prom in the backup directory)")
+parser.add_argument("--profile", action="store_true",
+                    help="run every stage under cProfile and save the profile of the slowest one")
+parser.add_argument("--restore-workers", type=int, default=1,
+                    help="restore tables concurrently over this many mysql connections (default: 1, serial)")
+parser.add_argument("--start-date", help="first day of the report window, YYYY-MM-DD (default: 30 days ago)")
+parser.add_argument("--end-date", help="last day of the report window, YYYY-MM-DD (default: today)")
+parser.add_argument("--windows", type=lambda value: [w.strip() for w in value.split(",") if w.strip()],
+                    default=NAMED_WINDOWS,
+                    help=f"calendar periods to date in the window metrics sheet (default: {','.join(NAMED_WINDOWS)})")
+parser.add_argument("--window", action="append", default=[], metavar="LABEL=YYYY-MM-DD:YYYY-MM-DD",
+                    help="add a custom date range (both days included) to the window metrics; repeatable")
+parser.add_argument("--watch", action="store_true",
+                    help="keep running: report on every new backup as soon as it has been completely "
+                         "written to the backup directory, reusing loaded modules and connections")
+parser.add_argument("--settle-seconds", type=float, default=SETTLE_SECONDS,
+                    help=f"with --watch, how long a new backup must stay unchanged before it is "
+                         f"processed (default: {SETTLE_SECONDS})")
+args = parser.parse_args()
+if args.watch and args.compare_backups is not None:
+    parser.error("--watch and --compare-backups cannot be combined")
+if not 1 <= args.query_workers <= mysql.connector.pooling.CNX_POOL_MAXSIZE:
+    parser.error(f"--query-workers must be between 1 and {mysql.connector.pooling.CNX_POOL_MAXSIZE}, "
+                 f"the largest connection pool mysql.connector allows")
+
+
+def write_run_metrics(run_log):
+    run_log.write_json(os.path.join(BACKUP_DIR, RUN_LOG))
+    run_log.write_prometheus(args.metrics_textfile or os.path.join(BACKUP_DIR, METRICS_TEXTFILE))
+    if args.profile:
+        profile_file = os.path.join(BACKUP_DIR, PROFILE_FILE)
+        slowest = run_log.write_profile(profile_file)
+        if slowest:
+            print(f"Profile of the slowest stage ({slowest[0]}, {slowest[1]:.1f} s): {profile_file}")
+
+
+def send_to_lab_server(report_file, run_log):
+    """Delta-transfer a report to LAB_SERVER, retrying a dropped connection.
+
+    Each report gets its own stage (transfer:xlsx, transfer:pdf), so the
+    metrics file never repeats a sample.
+    """
+    stage = "transfer:" + os.path.splitext(report_file)[1].lstrip(".")
+    with run_log.span(stage, bytes=os.path.getsize(report_file)) as span:
+        try:
+            span["sent_bytes"] = send_file(report_file, remote_for(LAB_SERVER))
+            span["exit_code"] = 0
+        except (OSError, RuntimeError) as e:
+            span["exit_code"] = 1
+            print(f"Failed to send the report to virtual server: {e}")
+            return
+    print("Report sent to virtual server")
 
-current_date = datetime.now()
-start_date = current_date - timedelta(days=30)
-start_date_str = start_date.strftime('%Y-%m-%d')
-end_date_str = current_date.strftime('%Y-%m-%d')
 
-backup_files = sorted([f for f in os.listdir(BACKUP_DIR) if f.endswith(".sql.gz")], reverse=True)
+def report_dates(current_date):
+    """The report window (first and last day) and the window metrics' windows of a run at `current_date`."""
+    start_date = current_date - timedelta(days=30)
+    start_date_str = args.start_date or start_date.strftime('%Y-%m-%d')
+    end_date_str = args.end_date or current_date.strftime('%Y-%m-%d')
+    windows = metric_windows(current_date, [*args.windows, f"report={start_date_str}:{end_date_str}", *args.window])
+    return start_date_str, end_date_str, windows
+
+
+# Report connection pool, kept between the runs of --watch.
+warm_pool = None
+
+
+def report_backup(backup_file, run_log, current_date, require_complete=False):
+    """Restore (or snapshot) one backup, then build, save and send its consolidated report.
+
+    Returns False if the restore failed. With `require_complete` a dump
+    without mysqldump's completion trailer fails the restore (or snapshot)
+    that reads it, leaving no restore manifest behind, so the next backup is
+    restored from scratch (see dump_restore.require_complete_dump); for
+    backups picked up by --watch.
+    """
+    global warm_pool
+    start_date_str, end_date_str, windows = report_dates(current_date)
+    print(f"Using backup file: {backup_file}")
+
+    if args.engine == "columnar":
+        # pyarrow is only needed for this engine
+        from columnar_snapshot import ensure_snapshot, load_snapshot
+        from report_frames import compute_report_results, rollup_days
+
+        with run_log.span("columnar_snapshot") as span:
+            snapshot_dir = ensure_snapshot(backup_file, require_complete=require_complete)
+            frames = load_snapshot(snapshot_dir)
+            span["rows"] = sum(len(frame) for frame in frames.values())
+        with run_log.span("columnar_report"):
+            results = compute_report_results(frames, current_date, start_date_str, end_date_str, windows,
+                                             skip=[] if args.no_rollups else ROLLUP_SECTIONS)
+        fetch_rollup = lambda rollup, since: rollup_days(frames, rollup, since)
+        table_hashes = None
+    else:
+        with run_log.span("restore_check") as span:
+            manifest_file = os.path.join(BACKUP_DIR, RESTORE_MANIFEST)
+            manifest = {} if args.force_restore else load_manifest(manifest_file)
+            backup_checksum = file_checksum(backup_file)
+
+            conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD)
+            cursor = conn.cursor()
+            cursor.execute("SHOW DATABASES LIKE %s", (TEMP_DB,))
+            if cursor.fetchone() is None or manifest.get("database") != TEMP_DB:
+                manifest = {}
+            restored_tables = manifest.get("tables", {})
+            # Every table of the restored backup, so an --all-tables run can tell a
+            # selective restore from a complete one.
+            dump_tables = manifest.get("dump_tables")
+            # A dump directory's manifest already says which tables changed; a
+            # single-file dump is only hashed by the restore that reads it.
+            dump_hashes = dump_table_hashes(backup_file)
+            changed_tables = plan_restore(manifest, backup_checksum, None if args.all_tables else args.tables,
+                                          dump_hashes)
+            if changed_tables == []:
+                if manifest.get("checksum") == backup_checksum:
+                    print(f"Backup unchanged since the last restore, reusing {TEMP_DB}.")
+                else:
+                    print(f"No table changed since the last restore, reusing {TEMP_DB}.")
+            elif not manifest:
+                cursor.execute(f"DROP DATABASE IF EXISTS {TEMP_DB}")
+                cursor.execute(f"CREATE DATABASE {TEMP_DB}")
+                # Connections of the dropped database have no default database any more.
+                if warm_pool is not None:
+                    warm_pool._remove_connections()
+                    warm_pool = None
+            cursor.close()
+            conn.close()
+            span["bytes"] = backup_size(backup_file)
+            span["changed_tables"] = changed_tables
+
+        if changed_tables != []:
+            # Invalidate the manifest first so a failed restore is never reused.
+            if os.path.exists(manifest_file):
+                os.remove(manifest_file)
+
+            # Filled in by the pass that restores the tables (see dump_restore.filter_tables).
+            table_hashes = {}
+            chunks = iter_backup_chunks(backup_file, tables=changed_tables)
+            if require_complete:
+                # An incomplete dump fails the restore before mysql sees its end;
+                # the manifest is already gone, so the next run starts over.
+                chunks = require_complete_dump(chunks, backup_file)
+            chunks = filter_tables(chunks, changed_tables, table_hashes)
+            if args.restore_mode == "file":
+                # Extract the SQL file
+                temp_sql_file = backup_file[:-len(".gz")] if backup_file.endswith(".gz") else backup_file + ".sql"
+                try:
+                    with run_log.span("gzip_extraction") as span:
+                        with open(temp_sql_file, 'wb') as f_out:
+                            for chunk in chunks:
+                                f_out.write(chunk)
+                        span["bytes"] = os.path.getsize(temp_sql_file)
+                except RuntimeError as e:
+                    os.remove(temp_sql_file)
+                    print(f"Database restore failed: {e}")
+                    return False
+                print(f"Extracted SQL file: {temp_sql_file}")
+                chunks = iter_backup_chunks(temp_sql_file)
+            print(f"Restoring tables: {', '.join(changed_tables) if changed_tables is not None else 'all'}")
+
+            try:
+                with run_log.span("restore", tables=changed_tables) as span:
+                    if args.restore_workers > 1:
+                        if args.restore_mode == "stream" and dump_hashes is not None:
+                            timings = parallel_restore_directory(backup_file, changed_tables, TEMP_DB, DB_USER,
+                                                                 DB_PASSWORD, host=DB_HOST,
+                                                                 workers=args.restore_workers)
+                        else:
+                            timings = parallel_restore(chunks, TEMP_DB, DB_USER, DB_PASSWORD, host=DB_HOST,
+                                                       workers=args.restore_workers, spool_dir=BACKUP_DIR)
+                        span["bytes"] = sum(total_bytes for total_bytes, _, _ in timings.values())
+                        span["rows"] = sum(total_rows for _, total_rows, _ in timings.values())
+                    else:
+                        span["bytes"], span["rows"] = stream_restore(chunks, TEMP_DB, DB_USER, DB_PASSWORD, host=DB_HOST)
+            except RuntimeError as e:
+                print(f"Database restore failed: {e}")
+                return False
+            finally:
+                if args.restore_mode == "file":
+                    os.remove(temp_sql_file)
+            print("Database restored successfully.")
+
+            if dump_hashes is None:
+                dump_hashes = table_hashes
+        if dump_hashes is not None:
+            dump_tables = list(dump_hashes)
+            missing_tables = [] if args.all_tables else [t for t in args.tables if t not in dump_hashes]
+            if missing_tables:
+                print(f"Not in the backup: {', '.join(missing_tables)}")
+            loaded = dump_tables if changed_tables is None else changed_tables
+            restored_tables.update({t: dump_hashes[t] for t in loaded if t in dump_hashes})
+            # Tables restored from an earlier backup that this one no longer has.
+            stale_tables = [t for t in restored_tables if t not in dump_hashes]
+            if stale_tables:
+                conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD)
+                cursor = conn.cursor()
+                for table in stale_tables:
+                    cursor.execute(f"DROP TABLE IF EXISTS {TEMP_DB}.`{table}`")
+                    del restored_tables[table]
+                    print(f"Dropped {table}, which is no longer in the backup.")
+                cursor.close()
+                conn.close()
+        if changed_tables != [] or manifest.get("checksum") != backup_checksum:
+            save_manifest(manifest_file, {
+                "database": TEMP_DB,
+                "backup": backup_file,
+                "checksum": backup_checksum,
+                "dump_tables": dump_tables,
+                "tables": restored_tables,
+            })
+
+        conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=TEMP_DB)
+        if args.build_indexes:
+            with run_log.span("build_indexes"):
+                cursor = conn.cursor()
+                explain_report_queries(cursor, start_date_str, end_date_str, "before indexing")
+                create_report_indexes(cursor, TEMP_DB)
+                explain_report_queries(cursor, start_date_str, end_date_str, "after indexing")
+                cursor.close()
+
+        conn.close()
+
+        if warm_pool is None:
+            warm_pool = mysql.connector.pooling.MySQLConnectionPool(pool_name="report", pool_size=args.query_workers,
+                                                                    host=DB_HOST, user=DB_USER,
+                                                                    password=DB_PASSWORD, database=TEMP_DB)
+        pool = warm_pool
+        with run_log.span("report_queries"):
+            results = fetch_report_results(pool, current_date, start_date_str, end_date_str,
+                                           order_entries_scan=args.order_entries_scan, workers=args.query_workers,
+                                           skip=[] if args.no_rollups else ROLLUP_SECTIONS, run_log=run_log,
+                                           windows=windows)
+
+        def fetch_rollup(rollup, since):
+            conn = pool.get_connection()
+            try:
+                return fetch_rollup_days(conn, rollup, since)
+            finally:
+                conn.close()
+        table_hashes = restored_tables
+
+    if not args.no_rollups:
+        with run_log.span("rollups"):
+            store = open_rollup_store(os.path.join(BACKUP_DIR, ROLLUP_STORE))
+            refresh_rollups(store, fetch_rollup, table_hashes, rebuild=args.rebuild_rollups)
+            results.update(rollup_results(store, start_date_str, end_date_str))
+            store.close()
+
+    with run_log.span("shaping") as span:
+        report = shape_report(results)
+        span["rows"] = sum(len(value) for value in report.values() if hasattr(value, "columns"))
+
+    consolidated_file = os.path.join(BACKUP_DIR, "Consolidated_Report.xlsx")
+    pdf_file = os.path.join(BACKUP_DIR, "Consolidated_Report.pdf")
+    # The PDF is rendered on a thread from the same shaped frames while this
+    # one writes the workbook; both only read the frames, so nothing is copied,
+    # and the page compression and file writes overlap the workbook's.
+    with ThreadPoolExecutor(max_workers=1) as pdf_pool:
+        pdf_pages = pdf_pool.submit(write_report_pdf, pdf_file,
+                                    report_pdf_sections(report, start_date_str, end_date_str))
+        with run_log.span("workbook_write") as span:
+            write_report_workbook(consolidated_file, report_sheets(report, start_date_str, end_date_str),
+                                  password='ghii@wkz')
+            span["bytes"] = os.path.getsize(consolidated_file)
+        print(f"Consolidated report saved: {consolidated_file}")
+
+        with run_log.span("pdf_write") as span:
+            try:
+                span["rows"] = pdf_pages.result()
+                span["bytes"] = os.path.getsize(pdf_file)
+                print(f"PDF report saved: {pdf_file} ({span['rows']} pages)")
+            except Exception as e:
+                pdf_file = None
+                print(f"Failed to write the PDF report: {e}")
+
+    # Send to virtual server
+    send_to_lab_server(consolidated_file, run_log)
+    if pdf_file:
+        send_to_lab_server(pdf_file, run_log)
+
+    run_log.success = True
+    return True
+
+
+if args.watch:
+    from backup_watcher import watch_backups
+    try:
+        report_dates(datetime.now())
+    except ValueError as e:
+        parser.error(str(e))
+    if args.engine == "columnar":
+        # Load pyarrow and the snapshot code up front too, so no run pays for them.
+        import columnar_snapshot
+
+    for backup_file in watch_backups(BACKUP_DIR, settle_seconds=args.settle_seconds):
+        run_log = RunLog(profile=args.profile)
+        try:
+            report_backup(backup_file, run_log, datetime.now(), require_complete=True)
+        except Exception as e:
+            print(f"Report for {backup_file} failed: {e}")
+        write_run_metrics(run_log)
+
+run_log = RunLog(profile=args.profile)
+atexit.register(write_run_metrics, run_log)
+
+current_date = datetime.now()
+try:
+    start_date_str, end_date_str, windows = report_dates(current_date)
+except ValueError as e:
+    parser.error(str(e))
+
+with run_log.span("backup_discovery") as span:
+    backup_files = newest_first(find_backups(BACKUP_DIR))
+    span["rows"] = len(backup_files)
 if not backup_files:
     print("No backup files found.")
     exit(1)
-backup_file = os.path.join(BACKUP_DIR, backup_files[0])
-print(f"Using backup file: {backup_file}")
-
-# Extract the SQL file
-temp_sql_file = backup_file.replace(".gz", "")
-with gzip.open(backup_file, 'rb') as f_in:
-    with open(temp_sql_file, 'wb') as f_out:
-        shutil.copyfileobj(f_in, f_out)
-print(f"Extracted SQL file: {temp_sql_file}")
-
-conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD)
-cursor = conn.cursor()
-cursor.execute(f"DROP DATABASE IF EXISTS {TEMP_DB}")
-cursor.execute(f"CREATE DATABASE {TEMP_DB}")
-cursor.close()
-conn.close()
-os.system(f"mysql -u {DB_USER} -p{DB_PASSWORD} {TEMP_DB} < {temp_sql_file}")
-print("Database restored successfully.")
-
-conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=TEMP_DB)
-cursor = conn.cursor()
-
-
-# 1. Registered Patients Summary
-registered_patients_query = """
-SELECT 
-    (SELECT COUNT(*) 
-     FROM patient 
-     WHERE voided = 0 
-     AND date_created >= MAKEDATE(YEAR(CURDATE()), 1)) AS this_year,
-     
-    (SELECT COUNT(*) 
-     FROM patient 
-     WHERE voided = 0 
-     AND date_created >= DATE_FORMAT(CURDATE(), '%Y-%m-01')) AS this_month,
-     
-    (SELECT COUNT(*) 
-     FROM patient 
-     WHERE voided = 0 
-     AND date_created >= DATE_SUB(CURDATE(), INTERVAL WEEKDAY(CURDATE()) DAY)) AS this_week,
-     
-    (SELECT COUNT(*) 
-     FROM patient 
-     WHERE voided = 0 
-     AND DATE(date_created) = CURDATE()) AS today;
-"""
-cursor.execute(registered_patients_query)
-this_year, this_month, this_week, today = cursor.fetchone()
-
-# Paying vs Non-Paying Query
-paying_query = """
-SELECT 
-    COUNT(*) AS total_patients,
-    SUM(CASE WHEN paying_orders > 0 AND non_paying_orders = 0 THEN 1 ELSE 0 END) AS exclusively_paying,
-    SUM(CASE WHEN non_paying_orders > 0 AND paying_orders = 0 THEN 1 ELSE 0 END) AS exclusively_non_paying,
-    SUM(CASE WHEN paying_orders > 0 AND non_paying_orders > 0 THEN 1 ELSE 0 END) AS both_categories
-FROM (
-    SELECT 
-        patient_id,
-        SUM(CASE WHEN full_price >= 1000 THEN 1 ELSE 0 END) AS paying_orders,
-        SUM(CASE WHEN full_price = 0 THEN 1 ELSE 0 END) AS non_paying_orders
-    FROM order_entries
-    WHERE order_date BETWEEN %s AND %s
-    GROUP BY patient_id
-) AS patient_summary;
-"""
-cursor.execute(paying_query, (f"{start_date_str} 00:00:00", f"{end_date_str} 23:59:59"))
-total, paying, non_paying, both = cursor.fetchone()
-
-# Combine the first part only in DataFrame
-registered_patients_df = pd.DataFrame({
-    "Metric": ["Registered This Year", "Registered This Month", "Registered This Week", "Registered Today"],
-    "Count": [this_year, this_month, this_week, today]
-})
-
-# 2. Order Entries Analysis
-order_entries_query = """
-    SELECT s.service_id, 
-           s.name AS service_name, 
-           SUM(oe.quantity) AS total_quantity, 
-           SUM(oe.amount_paid) AS total_amount_paid,
-           SUM(oe.quantity * sp.price) AS expected_total_amount_paid,
-           COUNT(DISTINCT CASE WHEN oe.amount_paid < oe.full_price THEN oe.patient_id END) AS patients_with_balance
-    FROM order_entries oe
-    JOIN services s ON oe.service_id = s.service_id
-    JOIN service_prices sp ON oe.service_id = sp.service_id AND sp.voided = 0
-    WHERE oe.voided = 0
-    GROUP BY s.service_id, s.name;
-"""
-cursor.execute(order_entries_query)
-order_entries_results = cursor.fetchall()
-
-order_entries_df = pd.DataFrame(order_entries_results, columns=[
-    "  Service ID   ", "Service Name", "   Total Quantity   ", "Total Amount Paid", 
-    "Expected Total Amount Paid", "Patients With Outstanding Balance"
-])
-
-order_entries_df["Total Amount Overdue"] = order_entries_df["Expected Total Amount Paid"] - order_entries_df["Total Amount Paid"]
-
-total_quantity = order_entries_df["   Total Quantity   "].sum()
-total_amount_collected = order_entries_df["Total Amount Paid"].sum()
-total_expected = order_entries_df["Expected Total Amount Paid"].sum()
-total_overdue = order_entries_df["Total Amount Overdue"].sum()
-total_patients_balance = order_entries_df["Patients With Outstanding Balance"].sum()
-
-totals_df = pd.DataFrame([{
-    "Total Amount Paid": total_amount_collected,
-    "Expected Total Amount Paid": total_expected,
-    "Patients With Outstanding Balance": total_patients_balance,
-    "Total Amount Overdue": total_overdue
-}])
-
-order_entries_df = pd.concat([order_entries_df, totals_df], ignore_index=True)
-
-for col in ["Total Amount Paid", "Expected Total Amount Paid", "Total Amount Overdue"]:
-    order_entries_df[col] = order_entries_df[col].apply(lambda x: f"MWK {x:,.2f}" if isinstance(x, (int, float)) else x)
-
-
-# 3. Patient Age Groups
-age_group_query = """
-SELECT age_group, 
-       gender,
-       COUNT(*) AS total_patients
-FROM (
-    SELECT 
-        CASE 
-            WHEN TIMESTAMPDIFF(YEAR, p.birthdate, NOW()) < 5 THEN 'Under 5'
-            WHEN TIMESTAMPDIFF(YEAR, p.birthdate, NOW()) BETWEEN 5 AND 9 THEN '5-9'
-            WHEN TIMESTAMPDIFF(YEAR, p.birthdate, NOW()) BETWEEN 10 AND 14 THEN '10-14'
-            WHEN TIMESTAMPDIFF(YEAR, p.birthdate, NOW()) BETWEEN 15 AND 19 THEN '15-19'
-            WHEN TIMESTAMPDIFF(YEAR, p.birthdate, NOW()) BETWEEN 20 AND 24 THEN '20-24'
-            ELSE 'Other'
-        END AS age_group, 
-        p.gender
-    FROM patient pat
-    JOIN person p ON pat.patient_id = p.person_id
-    WHERE pat.date_created BETWEEN DATE_SUB(NOW(), INTERVAL 30 DAY) AND NOW()
-) AS subquery
-GROUP BY age_group, gender
-ORDER BY age_group, gender;
-"""
-cursor.execute(age_group_query)
-age_group_results = cursor.fetchall()
-
-age_group_df = pd.DataFrame(age_group_results, columns=["Age Group", "Gender", "Total Patients"])
-age_group_df["Age Group"] = pd.Categorical(age_group_df["Age Group"], categories=['Under 5', '5-9', '10-14', '15-19', '20-24', 'Other'], ordered=True)
-age_group_df = age_group_df.sort_values(["Age Group", "Gender"])
-
-
-# 4. Services Used Per Age Group
-most_profitable_services_query = """
-    SELECT 
-        CASE 
-            WHEN TIMESTAMPDIFF(YEAR, p.birthdate, CURDATE()) < 5 THEN 'Under 5'
-            WHEN TIMESTAMPDIFF(YEAR, p.birthdate, CURDATE()) BETWEEN 6 AND 17 THEN '6-17'
-            WHEN TIMESTAMPDIFF(YEAR, p.birthdate, CURDATE()) BETWEEN 18 AND 35 THEN '18-35'
-            WHEN TIMESTAMPDIFF(YEAR, p.birthdate, CURDATE()) BETWEEN 36 AND 50 THEN '36-50'
-            WHEN TIMESTAMPDIFF(YEAR, p.birthdate, CURDATE()) > 50 THEN 'Above 50'
-            ELSE 'Unknown'
-        END AS age_group,
-        s.name AS service_name, 
-        SUM(oe.amount_paid) AS total_amount_paid
-    FROM order_entries oe
-    JOIN services s ON oe.service_id = s.service_id
-    JOIN patient pt ON oe.patient_id = pt.patient_id
-    JOIN person p ON pt.patient_id = p.person_id
-    WHERE oe.voided = 0
-    GROUP BY age_group, service_name
-    ORDER BY total_amount_paid DESC;
-"""
-cursor.execute(most_profitable_services_query)
-most_profitable_services_results = cursor.fetchall()
-most_profitable_services_df = pd.DataFrame(most_profitable_services_results, columns=["Age Group", "Service Name", "Total Amount Paid"])
-most_profitable_services_df["Total Amount Paid"] = most_profitable_services_df["Total Amount Paid"].apply(lambda x: f"MWK {x:,.2f}")
-
-# 5. Most Popular Services Overall
-most_popular_services_query = """
-    SELECT 
-        s.name AS service_name, 
-        SUM(oe.quantity) AS total_quantity,
-        SUM(oe.amount_paid) AS total_amount_paid,
-        sp.price AS service_price,
-        sp.price_type AS price_type
-    FROM order_entries oe
-    JOIN services s ON oe.service_id = s.service_id
-    JOIN service_prices sp ON s.service_id = sp.service_id AND sp.voided = 0
-    WHERE oe.voided = 0
-    GROUP BY service_name, sp.price, sp.price_type
-    ORDER BY total_quantity DESC;
-"""
-cursor.execute(most_popular_services_query)
-most_popular_services_results = cursor.fetchall()
-
-most_popular_services_df = pd.DataFrame(most_popular_services_results, 
-    columns=["Service Name", "Total Quantity", "Total Amount Paid", "Service Price", "Price Type"])
-
-# 6. Services used per month
-services_used_per_month_query = """
-    SELECT 
-        s.name AS service_name,
-        YEAR(oe.order_date) AS year,
-        MONTH(oe.order_date) AS month,
-        COUNT(*) AS services_used_per_month
-    FROM order_entries oe
-    JOIN services s ON oe.service_id = s.service_id
-    WHERE oe.voided = 0
-    GROUP BY service_name, year, month
-    ORDER BY year DESC, month DESC;
-"""
-cursor.execute(services_used_per_month_query)
-services_used_results = cursor.fetchall()
-
-services_used_results = [
-    (service_name, year, calendar.month_name[month], services_used) 
-    for service_name, year, month, services_used in services_used_results
-    ]
-services_used_df = pd.DataFrame(services_used_results, columns=["Service Name", "Year", "Month", "Services Used Per Month"])
-services_used_df["Month_num"] = services_used_df["Month"].map({month: idx for idx, month in enumerate(calendar.month_name) if month})
-services_used_df.sort_values(by=["Year", "Month_num"], ascending=[False, False], inplace=True)
-services_used_df.drop("Month_num", axis=1, inplace=True)
-
-
-#7. Get distribution of returning patients
-returning_patients_query = f"""
-SELECT COUNT(*) 
-FROM (
-    SELECT patient_id 
-    FROM receipts 
-    WHERE payment_stamp BETWEEN '{start_date_str} 00:00:00' AND '{end_date_str} 23:59:59'
-    GROUP BY patient_id 
-    HAVING COUNT(receipt_number) > 1
-) AS subquery;
-"""
-cursor.execute(returning_patients_query)
-returning_patients_count = cursor.fetchone()[0]
-
-#8 Patient distribution based on age and gender
-returning_patients_distribution_query = f"""
-SELECT 
-    CASE 
-        WHEN TIMESTAMPDIFF(YEAR, per.birthdate, CURDATE()) < 5 THEN 'under_five'
-        WHEN TIMESTAMPDIFF(YEAR, per.birthdate, CURDATE()) BETWEEN 5 AND 12 THEN 'under_thirteen'
-        ELSE 'adult'
-    END AS age_category,
-    per.gender AS gender,
-    COUNT(DISTINCT r.patient_id) AS returning_patient_count
-FROM receipts r
-JOIN patient p ON r.patient_id = p.patient_id
-JOIN person per ON p.patient_id = per.person_id
-WHERE r.payment_stamp BETWEEN '{start_date_str} 00:00:00' AND '{end_date_str} 23:59:59'
-  AND r.patient_id IN (
-    SELECT patient_id 
-    FROM receipts
-    WHERE payment_stamp BETWEEN '{start_date_str} 00:00:00' AND '{end_date_str} 23:59:59'
-    GROUP BY patient_id
-    HAVING COUNT(*) > 1
-)
-GROUP BY age_category, per.gender
-ORDER BY age_category, per.gender;
-"""
-cursor.execute(returning_patients_distribution_query)
-returning_patients_results = cursor.fetchall()
-
-empty_row = pd.DataFrame([[""] * len(order_entries_df.columns)], columns=order_entries_df.columns)
-for _ in range(1):
-    order_entries_df = pd.concat([order_entries_df, empty_row], ignore_index=True)
-
-order_entries_df = pd.concat([order_entries_df, pd.DataFrame([{
-    "Service Name": "",
-    "Total Amount Paid": "",
-    "Expected Total Amount Paid": "",
-    "Patients With Outstanding Balance": ""
-}])], ignore_index=True)
-
-distribution_data = []
-for age_category, gender, count in returning_patients_results:
-    distribution_data.append({
-        "Service Name": "",
-        "Total Amount Paid": "",
-        "Expected Total Amount Paid": "",
-        "Patients With Outstanding Balance": ""
-    })
-
-distribution_df = pd.DataFrame(distribution_data)
-order_entries_df = pd.concat([order_entries_df, distribution_df], ignore_index=True)
-
-# Returning patients frequency
-returning_patients_frequency_query = f"""
-SELECT
-    visit_count AS 'Number of Visits',
-    COUNT(patient_id) AS 'Number of Patients'
-FROM (
-    SELECT
-        patient_id,
-        COUNT(*) AS visit_count
-    FROM receipts
-    WHERE payment_stamp BETWEEN '{start_date_str} 00:00:00' AND '{end_date_str} 23:59:59'
-    GROUP BY patient_id
-    HAVING COUNT(*) > 1
-) AS returning_patient_visits
-GROUP BY visit_count
-ORDER BY visit_count;
-"""
-cursor.execute(returning_patients_frequency_query)
-returning_patients_freq_results = cursor.fetchall()
-
-#9. SQL query for the trend of money made per day
-trend_query = f"""
-SELECT 
-    DATE(created_at) AS transaction_date,
-    SUM(full_price) AS total_collected
-FROM order_entries
-WHERE cashier IN ('1','8', '9')
-AND created_at BETWEEN '{start_date_str} 00:00:00' AND '{end_date_str} 23:59:59'
-GROUP BY transaction_date
-ORDER BY transaction_date;
-"""
-cursor.execute(trend_query)
-result = cursor.fetchall()
-if result:
-    trend_df = pd.DataFrame(result)
-    trend_df.columns = ["Transaction Date", "Total Collected"]
-    trend_df["Transaction Date"] = pd.to_datetime(trend_df["Transaction Date"])
-    trend_df["Total Collected"] = trend_df["Total Collected"].apply(
-        lambda x: f"MWK {x:,.2f}" if isinstance(x, (int, float)) else x
-    )
-    trend_df["Transaction Date"] = trend_df["Transaction Date"].dt.strftime("%Y-%m-%d")
-else:
-    trend_df = pd.DataFrame(columns=["Transaction Date", "Total Collected"])
-
-
-#10. SQL query for Daily Hospital Patient Visits
-hospital_visits_query = f"""
-SELECT
-    daily_registrations.registration_date,
-    daily_registrations.total_registrations,
-    COALESCE(daily_returning.total_returning_patients, 0) AS total_returning_patients,
-    daily_registrations.total_registrations + COALESCE(daily_returning.total_returning_patients, 0) AS total_visits
-FROM (
-    SELECT DATE(date_created) AS registration_date, COUNT(*) AS total_registrations
-    FROM patient
-    WHERE date_created BETWEEN '{start_date_str} 00:00:00' AND '{end_date_str} 23:59:59'
-    GROUP BY registration_date
-) AS daily_registrations
-LEFT JOIN (
-    SELECT
-        visit_date,
-        COUNT(patient_id) AS total_returning_patients
-    FROM (
-        SELECT
-            DATE(payment_stamp) AS visit_date,
-            patient_id,
-            COUNT(*) AS visit_count
-        FROM receipts
-        WHERE payment_stamp BETWEEN '{start_date_str} 00:00:00' AND '{end_date_str} 23:59:59'
-        GROUP BY visit_date, patient_id
-        HAVING COUNT(*) > 1
-    ) AS daily_returning
-    GROUP BY visit_date
-) AS daily_returning ON daily_registrations.registration_date = daily_returning.visit_date
-ORDER BY daily_registrations.registration_date;
-"""
-cursor.execute(hospital_visits_query)
-result = cursor.fetchall()
-if result:
-    hospital_visits_df = pd.DataFrame(result)
-    hospital_visits_df.columns = ["Registration Date", "Total Registrations", "Total Returning Patients", "Total Visits"]
-    hospital_visits_df["Registration Date"] = pd.to_datetime(hospital_visits_df["Registration Date"])
-    hospital_visits_df["Registration Date"] = hospital_visits_df["Registration Date"].dt.strftime("%Y-%m-%d")
-else:
-    hospital_visits_df = pd.DataFrame(columns=["Registration Date", "Total Registrations", "Total Returning Patients", "Total Visits"])
-
-cursor.close()
-conn.close()
-
-consolidated_file = os.path.join(BACKUP_DIR, "Consolidated_Report.xlsx")
-with pd.ExcelWriter(consolidated_file, engine='openpyxl') as writer:
-    registered_patients_df.to_excel(writer, sheet_name="Registered Patients", index=False)
-    order_entries_df.to_excel(writer, sheet_name="Order Entries", index=False)
-    age_group_df.to_excel(writer, sheet_name="Registered Patient Age Groups", index=False)
-    most_profitable_services_df.to_excel(writer, sheet_name="Service Profits By Age Group", index=False)
-    most_popular_services_df.to_excel(writer, sheet_name="Popular Services", index=False)
-    services_used_df.to_excel(writer, sheet_name="Services Used Per Month", index=False)
-    trend_df.to_excel(writer, sheet_name="Daily Money Trend", index=False)
-    hospital_visits_df.to_excel(writer, sheet_name="Daily Hospital Patient Visits", index=False)
-pdf_file = os.path.join(BACKUP_DIR, "Consolidated_Report.pdf")
-
-wb = load_workbook(consolidated_file)
-ws = wb["Registered Patients"]
-
-right_title = "Paying vs. Non-Paying Patients"
-right_data = [
-    ("Total Patients", total),
-    ("Exclusively Paying Patients", paying),
-    ("Exclusively Non-Paying Patients", non_paying),
-    ("Patients in Both Categories", both)
-]
-
-start_col = 4 
-start_row = 1
-ws.cell(row=start_row, column=start_col).value = right_title
-ws.cell(row=start_row, column=start_col).font = Font(bold=True)
-
-for i, (label, count) in enumerate(right_data, start=1):
-    ws.cell(row=start_row + i, column=start_col).value = label
-    ws.cell(row=start_row + i, column=start_col + 1).value = count
-
-ws.column_dimensions[get_column_letter(start_col)].width = 35
-ws.column_dimensions[get_column_letter(start_col + 1)].width = 15
-
-wb.save(consolidated_file)
-
-for sheet_name in wb.sheetnames:
-    ws = wb[sheet_name]
-    ws.insert_rows(1)
-
-    ws['A1'] = sheet_name
-    ws['A1'].font = Font(bold=True, size=14)
-    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=ws.max_column)
-
-    for col_idx, col_cells in enumerate(ws.iter_cols(), start=1):
-        max_length = 0
-        col_letter = get_column_letter(col_idx)
-
-        for cell in col_cells:
-            if cell.value:
-                max_length = max(max_length, len(str(cell.value)))
-        ws.column_dimensions[col_letter].width = max_length + 2
-
-    if sheet_name == "Order Entries":
-        returning_patients_row = len(order_entries_df)
-
-        ws.merge_cells(start_row=returning_patients_row, start_column=1, end_row=returning_patients_row, end_column=3)
-        ws[f"A{returning_patients_row}"].alignment = Alignment(horizontal="left", vertical="center", wrap_text=True)
-        ws[f"A{returning_patients_row}"].font = Font(bold=True)
-        ws[f"A{returning_patients_row}"] = f"Returning Patients Distribution · {start_date_str} to {end_date_str}"
-        ws.row_dimensions[returning_patients_row].height = 30
-
-        ws[f"A{returning_patients_row + 1}"] = "Distribution"
-        ws[f"B{returning_patients_row + 1}"] = "Count"
-        ws[f"C{returning_patients_row + 1}"] = "Total Patients"
-        ws[f"A{returning_patients_row + 1}"].alignment = Alignment(horizontal="center", vertical="center")
-        ws[f"B{returning_patients_row + 1}"].alignment = Alignment(horizontal="center", vertical="center")
-        ws[f"C{returning_patients_row + 1}"].alignment = Alignment(horizontal="center", vertical="center")
-        ws[f"A{returning_patients_row + 1}"].font = Font(bold=True)
-        ws[f"B{returning_patients_row + 1}"].font = Font(bold=True)
-        ws[f"C{returning_patients_row + 1}"].font = Font(bold=True)
-
-        total_returning_patients = 0
-        for idx, (age_category, gender, count) in enumerate(returning_patients_results, start=returning_patients_row + 2):
-            ws[f"A{idx}"] = f"{age_category} ({gender})"
-            ws[f"B{idx}"] = count
-            ws[f"A{idx}"].alignment = Alignment(horizontal="left", vertical="center")
-            ws[f"B{idx}"].alignment = Alignment(horizontal="center", vertical="center")
-            total_returning_patients += count
-
-        total_row = returning_patients_row + 2 + len(returning_patients_results)
-        ws[f"B{total_row}"].font = Font(bold=True)
-        ws[f"C{total_row}"] = total_returning_patients
-        ws[f"A{total_row}"].alignment = Alignment(horizontal="left", vertical="center")
-        ws[f"C{total_row}"].alignment = Alignment(horizontal="center", vertical="center")
-        ws[f"C{total_row}"].font = Font(bold=True)
-
-        frequency_title_row = total_row + 2
-        ws.merge_cells(start_row=frequency_title_row, start_column=1, end_row=frequency_title_row, end_column=3)
-        ws[f"A{frequency_title_row}"] = "Frequency of The Returning Patients"
-        ws[f"A{frequency_title_row}"].font = Font(bold=True)
-        ws[f"A{frequency_title_row}"].alignment = Alignment(horizontal="left", vertical="center")
-        ws.row_dimensions[frequency_title_row].height = 30
-
-        freq_header_row = frequency_title_row + 1
-        ws[f"A{freq_header_row}"] = "Number of Visits"
-        ws[f"B{freq_header_row}"] = "Number of Patients"
-        ws[f"C{freq_header_row}"] = "Patients With More Visits"
-        ws[f"A{freq_header_row}"].font = Font(bold=False)
-        ws[f"B{freq_header_row}"].font = Font(bold=False)
-        ws[f"A{freq_header_row}"].alignment = Alignment(horizontal="center", vertical="center")
-        ws[f"B{freq_header_row}"].alignment = Alignment(horizontal="center", vertical="center")
-        ws[f"C{freq_header_row}"].alignment = Alignment(horizontal="center", vertical="center")
-
-        total_patients_with_more_visits = 0
-        for idx_offset, (visits, patient_count) in enumerate(returning_patients_freq_results):
-            row = freq_header_row + 1 + idx_offset
-            ws[f"A{row}"] = visits
-            ws[f"B{row}"] = patient_count
-            ws[f"A{row}"].alignment = Alignment(horizontal="center", vertical="center")
-            ws[f"B{row}"].alignment = Alignment(horizontal="center", vertical="center")
-            total_patients_with_more_visits += patient_count
-
-        final_freq_row = freq_header_row + 1 + len(returning_patients_freq_results)
-        ws[f"C{final_freq_row}"] = total_patients_with_more_visits
-        ws[f"C{final_freq_row}"].alignment = Alignment(horizontal="center", vertical="center")
-        ws[f"C{final_freq_row}"].font = Font(bold=True)
-
-    ws.protection.sheet = True
-    ws.protection.password = 'ghii@wkz'
-
-wb.save(consolidated_file)
-print(f"Consolidated report saved: {consolidated_file}")
-
-# Send to virtual server
-result = os.system(f"scp {consolidated_file} ghii@192.168.10.186:/home/ghii/tests/backup")
-if result == 0:
-    print("Report sent to virtual server")
-else: 
-    print("Failed to send the report to virtual server: Lost Connection")
\ No newline at end of file
+
+if args.compare_backups is not None:
+    compared_files = args.compare_backups or backup_files
+    print(f"Comparing backups: {', '.join(snapshot_labels(compared_files))}")
+    db = {"host": DB_HOST, "user": DB_USER, "password": DB_PASSWORD, "database": TEMP_DB, "tables": REPORT_TABLES}
+    with run_log.span("compare_snapshots") as span:
+        snapshots = compare_snapshots(compared_files, args.engine, db, current_date, start_date_str, end_date_str,
+                                      workers=args.snapshot_workers, query_workers=args.query_workers)
+        span["rows"] = len(snapshots)
+    comparative_file = os.path.join(BACKUP_DIR, "Comparative_Report.xlsx")
+    with run_log.span("workbook_write") as span:
+        write_report_workbook(comparative_file,
+                              [(name, frame, None) for name, frame in comparative_frames(snapshots)],
+                              password='ghii@wkz')
+        span["bytes"] = os.path.getsize(comparative_file)
+    print(f"Comparative report saved: {comparative_file}")
+    send_to_lab_server(comparative_file, run_log)
+    run_log.success = True
+    sys.exit(0)
+
+if not report_backup(backup_files[0], run_log, current_date):
+    sys.exit(1)
@@ -0,0 +1,129 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+from dump_restore import DUMP_MANIFEST, is_dump_directory
+
+# A backup file is handed over once it has been closed (or moved into place) and
+# its size and mtime then stay unchanged for this long.
+SETTLE_SECONDS = 10
+POLL_SECONDS = 5
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def backup_signature(path):
+    """(size, mtime) of a file, or of a dump directory's manifest; None if it is gone."""
+    if os.path.isdir(path):
+        path = os.path.join(path, DUMP_MANIFEST)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def open_inotify(directory):
+    """An inotify descriptor watching `directory` for closed and moved-in files, or None if unavailable."""
+    library = ctypes.util.find_library("c")
+    if library is None:
+        return None
+    libc = ctypes.CDLL(library, use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    fd = libc.inotify_init1(IN_CLOEXEC)
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def read_events(fd, timeout):
+    """File names of the inotify events that arrive within `timeout` seconds."""
+    ready, _, _ = select.select([fd], [], [], timeout)
+    if not ready:
+        return []
+    data = os.read(fd, 64 * 1024)
+    names = []
+    offset = 0
+    while offset < len(data):
+        _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+        offset += EVENT_HEADER.size
+        names.append(os.fsdecode(data[offset:offset + length].rstrip(b"\0")))
+        offset += length
+    return names
+
+
+def watch_backups(directory, suffix=".sql.gz", settle_seconds=SETTLE_SECONDS, poll_seconds=POLL_SECONDS):
+    """Yield the path of every new or rewritten backup in `directory` once it is complete; runs forever.
+
+    Backups are `suffix` files and per-table dump directories (see
+    dump_pipeline.py), the latter judged by their manifest. Uses inotify on
+    Linux and falls back to polling the directory every `poll_seconds`; dump
+    directories are rescanned every `poll_seconds` either way, since writes
+    inside them raise no event on `directory`. A dump directory is yielded
+    as soon as its manifest appears, since the manifest is renamed into place
+    after every table file is complete. A file only counts as complete after
+    its writer closed it (or, when polling, it stopped changing) and its size
+    and mtime then held still for `settle_seconds`; repeated events for the
+    same contents are yielded once. Backups already present at start are not
+    reprocessed.
+
+    The report does not start on a file that is still growing: a restore
+    has to drop the tables it replaces, and a dump that then turns out to
+    be cut short would leave the database neither old nor new. Dumps that
+    should overlap the report with their own writing go to a directory.
+    """
+    def is_backup(name):
+        return name.endswith(suffix) or is_dump_directory(os.path.join(directory, name))
+
+    seen = {}
+    for name in os.listdir(directory):
+        if is_backup(name):
+            seen[name] = backup_signature(os.path.join(directory, name))
+    pending = {}  # name -> (signature, monotonic time it was last seen changing)
+
+    fd = open_inotify(directory)
+    print(f"Watching {directory} for new backups ({'inotify' if fd is not None else 'polling'})")
+    try:
+        while True:
+            timeout = min(settle_seconds, poll_seconds) if pending or fd is None else poll_seconds
+            if fd is not None:
+                names = read_events(fd, timeout) + [name for name in os.listdir(directory)
+                                                    if os.path.isdir(os.path.join(directory, name))]
+            else:
+                time.sleep(timeout)
+                names = os.listdir(directory)
+            now = time.monotonic()
+            for name in names:
+                if not is_backup(name):
+                    continue
+                signature = backup_signature(os.path.join(directory, name))
+                if signature is None or signature == seen.get(name):
+                    continue
+                if name not in pending or pending[name][0] != signature:
+                    pending[name] = (signature, now)
+
+            for name, (signature, changed) in list(pending.items()):
+                path = os.path.join(directory, name)
+                current = backup_signature(path)
+                if current is None:
+                    del pending[name]
+                elif current != signature:
+                    pending[name] = (current, now)
+                elif os.path.isdir(path) or now - changed >= settle_seconds:
+                    del pending[name]
+                    seen[name] = signature
+                    yield path
+    finally:
+        if fd is not None:
+            os.close(fd)
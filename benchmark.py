@@ -0,0 +1,236 @@
+"""Time every stage of the report pipeline against synthetic dumps of growing size.
+
+Each scale gets a dump from synthetic_dump.py and runs in a fresh child
+process, so its peak RSS is its own. Results go to a JSON file for tracking
+regressions between commits.
+
+    python benchmark.py --scales 10000,100000,1000000 --output benchmark_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from run_metrics import peak_rss_mb
+
+DEFAULT_SCALES = [10_000, 100_000, 1_000_000]
+# Pooled connections for the report_queries stage (Backup_analysis' --query-workers default).
+QUERY_WORKERS = 4
+BACKUP_NAME = "billing_prod_import_backup_Friday.sql.gz"
+
+
+class Stages:
+    """Collects one record per timed stage."""
+
+    def __init__(self):
+        self.records = []
+
+    def run(self, name, function, *args):
+        """Time `function(*args)`; it returns (result, rows, bytes)."""
+        started = time.monotonic()
+        result, rows, size = function(*args)
+        seconds = time.monotonic() - started
+        self.records.append({"stage": name, "seconds": round(seconds, 4), "rows": rows, "bytes": size,
+                             "peak_rss_mb": round(peak_rss_mb(), 1)})
+        print(f"  {name:<36} {seconds:9.3f} s  {rows or 0:12,} rows")
+        return result
+
+
+def run_stages(dump, work_dir, db=None, transfer_target=None):
+    """Run every stage once against `dump` and return the stage records.
+
+    The report results come from the columnar engine; with `db` the dump is
+    also restored into MySQL, every report statement is timed there, and so
+    is the whole report as Backup_analysis runs it, over a connection pool.
+    The workbook is sent with delta_transfer, to `transfer_target` or to a
+    local directory.
+    """
+    import pandas as pd
+    from columnar_snapshot import build_snapshot, load_snapshot
+    from delta_transfer import DirectoryRemote, remote_for, send_file
+    from dump_restore import iter_backup_chunks, count_rows
+    from report_frames import compute_report_results
+    from report_shaping import shape_report, report_sheets
+    from report_workbook import write_report_workbook
+
+    current_date = datetime.now()
+    start_date_str = (current_date - timedelta(days=30)).strftime('%Y-%m-%d')
+    end_date_str = current_date.strftime('%Y-%m-%d')
+    stages = Stages()
+
+    def decompress():
+        total_bytes = total_rows = 0
+        tail = b""
+        for chunk in iter_backup_chunks(dump):
+            total_bytes += len(chunk)
+            total_rows += count_rows(chunk, tail)
+            tail = (tail + chunk)[-16:]
+        return None, total_rows, total_bytes
+    stages.run("decompress", decompress)
+
+    if db:
+        import mysql.connector
+        import mysql.connector.pooling
+        from dump_restore import stream_restore
+        from report_sql import report_statements, fetch_order_entry_results, fetch_report_results
+
+        def restore():
+            conn = mysql.connector.connect(host=db["host"], user=db["user"], password=db["password"])
+            cursor = conn.cursor()
+            cursor.execute(f"DROP DATABASE IF EXISTS {db['database']}")
+            cursor.execute(f"CREATE DATABASE {db['database']}")
+            conn.close()
+            total_bytes, total_rows = stream_restore(iter_backup_chunks(dump), db["database"], db["user"],
+                                                     db["password"], host=db["host"])
+            return None, total_rows, total_bytes
+        stages.run("restore", restore)
+
+        conn = mysql.connector.connect(host=db["host"], user=db["user"], password=db["password"],
+                                       database=db["database"])
+        for name, query, params in report_statements(start_date_str, end_date_str):
+            def execute(query=query, params=params):
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                cursor.close()
+                return None, len(rows), None
+            stages.run(f"query:{name}", execute)
+        stages.run("query:order_entries_single_pass",
+                   lambda: (fetch_order_entry_results(conn, current_date, start_date_str, end_date_str), None, None))
+        conn.close()
+
+        def report_queries():
+            pool = mysql.connector.pooling.MySQLConnectionPool(pool_name="benchmark", pool_size=QUERY_WORKERS,
+                                                               host=db["host"], user=db["user"],
+                                                               password=db["password"], database=db["database"])
+            fetch_report_results(pool, current_date, start_date_str, end_date_str, workers=QUERY_WORKERS)
+            return None, None, None
+        stages.run("report_queries", report_queries)
+
+    snapshot_dir = os.path.join(work_dir, "snapshot")
+
+    def snapshot():
+        build_snapshot(iter_backup_chunks(dump), snapshot_dir)
+        frames = load_snapshot(snapshot_dir)
+        size = sum(os.path.getsize(os.path.join(snapshot_dir, f)) for f in os.listdir(snapshot_dir))
+        return frames, sum(len(frame) for frame in frames.values()), size
+    frames = stages.run("columnar_snapshot", snapshot)
+
+    results = stages.run("columnar_report", lambda: (
+        compute_report_results(frames, current_date, start_date_str, end_date_str), None, None))
+    del frames
+
+    def shaping():
+        report = shape_report(results)
+        rows = sum(len(value) for value in report.values() if isinstance(value, pd.DataFrame))
+        return report, rows, None
+    report = stages.run("shaping", shaping)
+
+    workbook = os.path.join(work_dir, "Consolidated_Report.xlsx")
+
+    def excel_write():
+        write_report_workbook(workbook, report_sheets(report, start_date_str, end_date_str), password='ghii@wkz')
+        return None, None, os.path.getsize(workbook)
+    stages.run("excel_write", excel_write)
+
+    def transfer():
+        if transfer_target:
+            remote = remote_for(transfer_target)
+        else:
+            remote = DirectoryRemote(os.path.join(work_dir, "transfer"))
+        return None, None, send_file(workbook, remote)
+    stages.run("transfer", transfer)
+
+    return stages.records
+
+
+def benchmark_scale(scale, work_dir, seed, db=None, transfer_target=None):
+    """Generate (or reuse) the dump for `scale`, then run the stages in a child process."""
+    from synthetic_dump import write_synthetic_dump
+
+    scale_dir = os.path.join(work_dir, f"scale_{scale}")
+    os.makedirs(scale_dir, exist_ok=True)
+    dump = os.path.join(scale_dir, BACKUP_NAME)
+    generated = None
+    if not os.path.exists(dump):
+        started = time.monotonic()
+        write_synthetic_dump(dump, scale, seed=seed)
+        generated = round(time.monotonic() - started, 4)
+
+    print(f"Scale {scale:,} order entries ({os.path.getsize(dump) / (1024 * 1024):,.1f} MB compressed)")
+    stage_file = os.path.join(scale_dir, "stages.json")
+    command = [sys.executable, os.path.abspath(__file__), "--run-stages", dump, "--stage-file", stage_file]
+    if db:
+        command += ["--mysql", f"{db['user']}:{db['password']}@{db['host']}/{db['database']}"]
+    if transfer_target:
+        command += ["--transfer-target", transfer_target]
+    subprocess.run(command, check=True)
+    with open(stage_file) as f:
+        stages = json.load(f)
+
+    return {
+        "scale": scale,
+        "dump_bytes": os.path.getsize(dump),
+        "generate_seconds": generated,
+        "peak_rss_mb": max(stage["peak_rss_mb"] for stage in stages),
+        "total_seconds": round(sum(stage["seconds"] for stage in stages), 4),
+        "stages": stages,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def parse_mysql(value):
+    """user:password@host/database"""
+    credentials, _, location = value.rpartition("@")
+    user, _, password = credentials.partition(":")
+    host, _, database = location.partition("/")
+    return {"user": user, "password": password, "host": host, "database": database or "billing_benchmark"}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the report pipeline on synthetic dumps.")
+    parser.add_argument("--scales", type=lambda value: [int(s) for s in value.split(",")], default=DEFAULT_SCALES,
+                        help="comma-separated order_entries row counts (default: 10000,100000,1000000)")
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="JSON file the results are written to (default: benchmark_results.json)")
+    parser.add_argument("--work-dir", help="where dumps and outputs are kept between runs (default: a temp dir)")
+    parser.add_argument("--seed", type=int, default=0, help="generator seed (default: 0)")
+    parser.add_argument("--mysql", type=parse_mysql, metavar="USER:PASSWORD@HOST/DATABASE",
+                        help="also restore into this scratch database and time every report query there")
+    parser.add_argument("--transfer-target", metavar="HOST:DIRECTORY",
+                        help="send the workbook here with delta_transfer in the transfer stage "
+                             "(default: a local directory)")
+    parser.add_argument("--run-stages", metavar="DUMP", help=argparse.SUPPRESS)
+    parser.add_argument("--stage-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stages:
+        records = run_stages(args.run_stages, os.path.dirname(args.run_stages), args.mysql, args.transfer_target)
+        with open(args.stage_file, "w") as f:
+            json.dump(records, f)
+        sys.exit(0)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="report_benchmark_")
+    runs = [benchmark_scale(scale, work_dir, args.seed, args.mysql, args.transfer_target) for scale in args.scales]
+    with open(args.output, "w") as f:
+        json.dump({
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "runs": runs,
+        }, f, indent=2)
+    print(f"Benchmark results written: {args.output}")
@@ -0,0 +1,205 @@
+import os
+import re
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dump_restore import iter_backup_chunks, iter_dump_lines, require_complete_dump
+
+# The columns each report section reads; nothing else is kept from the dump.
+REPORT_COLUMNS = {
+    "patient": ["patient_id", "date_created", "voided"],
+    "person": ["person_id", "gender", "birthdate"],
+    "order_entries": ["patient_id", "service_id", "quantity", "amount_paid", "full_price",
+                      "voided", "order_date", "created_at", "cashier"],
+    "services": ["service_id", "name"],
+    "service_prices": ["service_id", "price", "price_type", "voided"],
+    "receipts": ["receipt_number", "patient_id", "payment_stamp"],
+}
+ROW_GROUP_SIZE = 1_000_000
+
+CREATE_TABLE = re.compile(rb"CREATE TABLE `([^`]+)`")
+COLUMN_DEFINITION = re.compile(rb"\s+`([^`]+)` (\w+)")
+INSERT_INTO = re.compile(rb"INSERT INTO `([^`]+)`(?: \(([^)]*)\))? VALUES \(")
+# One value of an extended INSERT: a quoted string (with backslash escapes) or a bare NULL/number.
+VALUE = re.compile(rb"(?:_binary )?'(?:[^'\\]|\\.)*'|[^,()']+")
+ESCAPES = {b"0": b"\0", b"n": b"\n", b"r": b"\r", b"t": b"\t", b"Z": b"\x1a", b"b": b"\b"}
+
+INTEGER_TYPES = {"tinyint", "smallint", "mediumint", "int", "integer", "bigint", "bit"}
+FLOAT_TYPES = {"decimal", "numeric", "float", "double", "real"}
+DATETIME_TYPES = {"date", "datetime", "timestamp"}
+
+
+def snapshot_dir_for(backup_file):
+    """Directory next to the backup (file or dump directory) holding its Parquet snapshot."""
+    if backup_file.endswith(".sql.gz"):
+        backup_file = backup_file[:-len(".sql.gz")]
+    return backup_file.rstrip(os.sep) + ".columnar"
+
+
+def ensure_snapshot(backup_file, columns=REPORT_COLUMNS, require_complete=False):
+    """Build the Parquet snapshot of `backup_file` unless an up-to-date one exists.
+
+    With `require_complete` an incomplete dump raises RuntimeError (see
+    dump_restore.require_complete_dump) and leaves no snapshot behind.
+    """
+    snapshot_dir = snapshot_dir_for(backup_file)
+    backup_mtime = os.path.getmtime(backup_file)
+    paths = [os.path.join(snapshot_dir, f"{table}.parquet") for table in columns]
+    if all(os.path.exists(path) and os.path.getmtime(path) >= backup_mtime for path in paths):
+        print(f"Using existing columnar snapshot: {snapshot_dir}")
+    else:
+        chunks = iter_backup_chunks(backup_file, tables=list(columns))
+        if require_complete:
+            chunks = require_complete_dump(chunks, backup_file)
+        try:
+            build_snapshot(chunks, snapshot_dir, columns)
+        except BaseException:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+            raise
+        print(f"Columnar snapshot written: {snapshot_dir}")
+    return snapshot_dir
+
+
+def load_snapshot(snapshot_dir, columns=REPORT_COLUMNS):
+    """Read the snapshot tables back as DataFrames keyed by table name."""
+    return {table: pd.read_parquet(os.path.join(snapshot_dir, f"{table}.parquet")) for table in columns}
+
+
+def build_snapshot(chunks, snapshot_dir, columns=REPORT_COLUMNS):
+    """Parse the extended INSERTs of a dump stream straight into one Parquet file per table.
+
+    Column names and types come from the dump's CREATE TABLE statements, so no
+    MySQL server is involved. Only `columns` of each table are converted; rows
+    are written in row groups of ROW_GROUP_SIZE so memory stays bounded.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    schemas = {}
+    writers = {}
+    batches = {table: [] for table in columns}
+    pending_rows = {table: 0 for table in columns}
+
+    def flush(table):
+        if not batches[table]:
+            return
+        frame = pd.concat(batches[table], ignore_index=True)
+        writers[table].write_table(pa.Table.from_pandas(frame, schema=writers[table].schema,
+                                                        preserve_index=False))
+        batches[table] = []
+        pending_rows[table] = 0
+
+    lines = iter_dump_lines(chunks)
+    try:
+        for line in lines:
+            if line.startswith(b"CREATE TABLE"):
+                table = CREATE_TABLE.match(line).group(1).decode()
+                definitions = []
+                for definition in lines:
+                    match = COLUMN_DEFINITION.match(definition)
+                    if not match:
+                        break
+                    definitions.append((match.group(1).decode(), match.group(2).decode().lower()))
+                if table in columns:
+                    schemas[table] = dict(definitions)
+                    missing = [column for column in columns[table] if column not in schemas[table]]
+                    if missing:
+                        raise ValueError(f"Table {table} has no column(s) {', '.join(missing)}")
+            elif line.startswith(b"INSERT INTO"):
+                match = INSERT_INTO.match(line)
+                table = match.group(1).decode()
+                if table not in columns:
+                    continue
+                if table not in schemas:
+                    raise ValueError(f"INSERT for {table} before its CREATE TABLE")
+                if match.group(2):
+                    names = [name.strip().strip("`") for name in match.group(2).decode().split(",")]
+                else:
+                    names = list(schemas[table])
+                values = line[match.end():].rstrip(b";")
+                batch = parse_insert_values(values, names, columns[table], schemas[table])
+                if table not in writers:
+                    path = os.path.join(snapshot_dir, f"{table}.parquet.tmp")
+                    writers[table] = pq.ParquetWriter(path, arrow_schema(columns[table], schemas[table]))
+                batches[table].append(batch)
+                pending_rows[table] += len(batch)
+                if pending_rows[table] >= ROW_GROUP_SIZE:
+                    flush(table)
+
+        for table in columns:
+            if table not in schemas:
+                raise ValueError(f"Table {table} not found in the dump")
+            if table not in writers:
+                path = os.path.join(snapshot_dir, f"{table}.parquet.tmp")
+                writers[table] = pq.ParquetWriter(path, arrow_schema(columns[table], schemas[table]))
+            flush(table)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    for table in columns:
+        path = os.path.join(snapshot_dir, f"{table}.parquet")
+        os.replace(path + ".tmp", path)
+
+
+def arrow_schema(names, types):
+    """Arrow schema for `names`, mapped from their MySQL column types."""
+    fields = []
+    for name in names:
+        column_type = types[name]
+        if column_type in INTEGER_TYPES:
+            arrow_type = pa.int64()
+        elif column_type in FLOAT_TYPES:
+            arrow_type = pa.float64()
+        elif column_type in DATETIME_TYPES:
+            arrow_type = pa.timestamp("ns")
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def parse_insert_values(values, names, wanted, types):
+    """Turn the `(...),(...);` tail of one extended INSERT into a typed DataFrame.
+
+    The values are tokenized in one regex pass; because every row has the
+    same number of values, column i is simply every len(names)-th token
+    starting at i, and only the `wanted` columns are ever converted.
+    """
+    tokens = VALUE.findall(values)
+    width = len(names)
+    if len(tokens) % width:
+        raise ValueError(f"Malformed INSERT: {len(tokens)} values for {width} columns")
+
+    frame = {}
+    for name in wanted:
+        raw = tokens[names.index(name)::width]
+        frame[name] = convert_column(raw, types[name])
+    return pd.DataFrame(frame)
+
+
+def convert_column(raw, column_type):
+    """Vectorized conversion of raw value tokens to the pandas dtype of a MySQL column type."""
+    if column_type in INTEGER_TYPES:
+        return pd.to_numeric(pd.Series(raw).str.decode("ascii"), errors="coerce").astype("Int64")
+    if column_type in FLOAT_TYPES:
+        return pd.to_numeric(pd.Series(raw).str.decode("ascii"), errors="coerce").astype("float64")
+    if column_type in DATETIME_TYPES:
+        text = pd.Series(raw).str.decode("ascii").str.strip("'")
+        return pd.to_datetime(text, errors="coerce", format="ISO8601").astype("datetime64[ns]")
+    return pd.Series([unquote(token) for token in raw], dtype="object")
+
+
+def unquote(token):
+    """Decode one mysqldump string literal; NULL becomes None."""
+    if token == b"NULL":
+        return None
+    if token.startswith(b"_binary "):
+        token = token[len(b"_binary "):]
+    if not token.startswith(b"'"):
+        return token.decode("utf-8", "replace")
+    body = token[1:-1]
+    if b"\\" not in body:
+        return body.decode("utf-8", "replace")
+    return re.sub(rb"\\(.)", lambda m: ESCAPES.get(m.group(1), m.group(1)), body).decode("utf-8", "replace")
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+FETCH_BATCH_SIZE = 50_000
+
+
+def typed_column(values, kind):
+    """One column of a fetched batch as a typed array.
+
+    `kind` is "int" (int64, or nullable Int64 when the batch has NULLs),
+    "float" (float64; DECIMAL values included, NULL as NaN), "datetime"
+    (datetime64[ns], NULL as NaT), "category" or None to keep the values as
+    objects.
+    """
+    if kind == "float":
+        return np.fromiter((np.nan if value is None else float(value) for value in values),
+                           dtype="float64", count=len(values))
+    if kind == "int":
+        if None in values:
+            return pd.array(values, dtype="Int64")
+        return np.fromiter(values, dtype="int64", count=len(values))
+    if kind == "datetime":
+        return pd.to_datetime(pd.Series(values, dtype="object"), errors="coerce").astype("datetime64[ns]").array
+    if kind == "category":
+        return pd.Categorical(values)
+    if kind is None:
+        return np.array(values, dtype="object")
+    raise ValueError(f"Unknown column kind {kind}")
+
+
+def batch_frame(batch, columns):
+    """A list of row tuples from fetchmany() as a DataFrame; `columns` maps each column to its kind."""
+    values = list(zip(*batch)) if batch else [()] * len(columns)
+    return pd.DataFrame({name: typed_column(column, kind) for (name, kind), column in zip(columns.items(), values)})
+
+
+def iter_frames(cursor, columns, batch_size=FETCH_BATCH_SIZE):
+    """Typed DataFrames of `batch_size` rows each from an executed cursor.
+
+    With an unbuffered cursor only one batch of rows is ever held as Python
+    tuples, however large the result.
+    """
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return
+        yield batch_frame(batch, columns)
+
+
+def concat_frames(frames, columns):
+    """Concatenate typed batch frames, merging the categories of categorical columns."""
+    if not frames:
+        return batch_frame([], columns)
+    if len(frames) == 1:
+        return frames[0]
+    data = {}
+    for name, kind in columns.items():
+        parts = [frame[name] for frame in frames]
+        if kind == "category":
+            data[name] = union_categoricals([part.array for part in parts], sort_categories=True)
+        else:
+            data[name] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(data)
+
+
+def fetch_frame(cursor, query, params, columns, batch_size=FETCH_BATCH_SIZE):
+    """Execute `query` and return its whole result as one typed DataFrame, fetched in batches."""
+    cursor.execute(query, params)
+    return concat_frames(list(iter_frames(cursor, columns, batch_size)), columns)
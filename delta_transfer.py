@@ -0,0 +1,430 @@
+"""Send files to the lab server as content-defined chunks, transferring only the chunks it does not have yet.
+
+Files are cut where a rolling hash of the last WINDOW bytes has its top
+bits clear, so an insert or delete early in a dump only changes the chunks
+around it and the rest of the file still lines up with yesterday's chunks.
+The sending side keeps a chunk index of every file it has chunked
+(.delta_index.json next to the file); the receiving side keeps a store of
+zlib-compressed chunks plus the chunk list of every file it holds, and only
+the chunks missing from that store cross the link. The receiver rebuilds the
+file and checks its sha256 before renaming it into place.
+
+Chunks are stored as soon as they arrive, so after a dropped connection the
+transfer is retried and picks up where it stopped, also across runs.
+
+The remote end is pluggable: DirectoryRemote is a local directory (a mounted
+share, or a stand-in for the lab server in tests), and SshRemote runs this
+same module on the other host over ssh, sending its own source along so
+nothing has to be installed there but python3.
+
+    python delta_transfer.py billing_prod_import_backup_Friday.sql ghii@192.168.10.186:/home/ghii/tests/backup
+"""
+import argparse
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+import zlib
+from urllib.parse import quote, unquote
+
+# Content-defined chunking: cut after a byte where the polynomial rolling
+# hash of the WINDOW bytes up to it has its top 16 bits clear, giving chunks
+# of about MIN_CHUNK + 64 KiB, never shorter than MIN_CHUNK or longer than
+# MAX_CHUNK. Both ends of every transfer, past and future, must cut the same
+# way, so none of these may change.
+WINDOW = 48
+MIN_CHUNK = 16 * 1024
+MAX_CHUNK = 256 * 1024
+CUT_BITS = 16
+PRIME = 0x100000001B3
+BYTE_HASHES = [int.from_bytes(hashlib.sha256(bytes([value])).digest()[:8], "little") for value in range(256)]
+READ_SIZE = 8 * 1024 * 1024
+# Window hashes computed per numpy pass; bounds cut_points' arrays to a few MB.
+HASH_SPAN = 512 * 1024
+
+# Compressed chunk bytes sent per request.
+BATCH_BYTES = 4 * 1024 * 1024
+# Seconds to wait before each retry of an interrupted transfer.
+RETRY_DELAYS = [5, 15, 60, 120, 300]
+LOCAL_INDEX = ".delta_index.json"
+# Chunk store of a remote directory; unreferenced chunks older than
+# PRUNE_SECONDS are deleted, the younger ones may belong to a transfer that
+# is going to be resumed.
+STORE_DIR = ".delta_store"
+PRUNE_SECONDS = 24 * 60 * 60
+# Sent after the other files of a directory, so the receiving copy only
+# looks complete once everything has arrived (see dump_pipeline.py).
+MANIFEST_NAME = "manifest.json"
+# Run on the remote host by SshRemote: read this module's source from stdin, then serve.
+BOOTSTRAP = ("import sys; source = sys.stdin.buffer.read(int(sys.stdin.buffer.readline())); "
+             "exec(compile(source, 'delta_transfer.py', 'exec'))")
+
+
+def cut_points(data, final):
+    """Chunk end offsets in `data`, which starts at a chunk boundary.
+
+    Unless `final`, the bytes after the last offset are an unfinished chunk
+    to be carried into the next read. With h[j] the BYTE_HASHES value of byte
+    j, the hash of the window ending at byte i is sum(h[j] * PRIME^(i-j))
+    mod 2^64, computed for HASH_SPAN windows at a time from a prefix sum of
+    h[j] * PRIME^-j, so the arrays stay a few MB whatever the size of `data`.
+    """
+    cuts = []
+    start = 0
+    for position in cut_candidates(data):
+        while position - start > MAX_CHUNK:
+            start += MAX_CHUNK
+            cuts.append(start)
+        if position - start >= MIN_CHUNK:
+            start = position
+            cuts.append(position)
+    while len(data) - start > MAX_CHUNK:
+        start += MAX_CHUNK
+        cuts.append(start)
+    if final and start < len(data):
+        cuts.append(len(data))
+    return cuts
+
+
+def cut_candidates(data):
+    """Offsets just after every window of `data` whose hash has its top CUT_BITS bits clear, in order."""
+    # numpy is only needed to send; the receiving end runs this module without it.
+    import numpy as np
+
+    if len(data) <= WINDOW:
+        return
+    length = min(len(data), HASH_SPAN + WINDOW - 1)
+    rising = np.full(length, PRIME, dtype=np.uint64)
+    rising[0] = 1
+    np.cumprod(rising, out=rising)
+    falling = np.full(length, pow(PRIME, -1, 1 << 64), dtype=np.uint64)
+    falling[0] = 1
+    np.cumprod(falling, out=falling)
+    byte_hashes = np.array(BYTE_HASHES, dtype=np.uint64)
+    prefix = np.zeros(length + 1, dtype=np.uint64)
+    # Each span holds the windows starting in [offset, offset + HASH_SPAN).
+    for offset in range(0, len(data) - WINDOW + 1, HASH_SPAN):
+        span = np.frombuffer(data, dtype=np.uint8, count=min(length, len(data) - offset), offset=offset)
+        values = byte_hashes[span]
+        values *= falling[:len(span)]
+        np.cumsum(values, out=prefix[1:len(span) + 1])
+        rolling = prefix[WINDOW:len(span) + 1] - prefix[:len(span) + 1 - WINDOW]
+        rolling *= rising[WINDOW - 1:len(span)]
+        candidates = np.flatnonzero((rolling >> np.uint64(64 - CUT_BITS)) == 0) + (offset + WINDOW)
+        yield from candidates.tolist()
+
+
+def chunk_file(path):
+    """(sha256 of the file, [[chunk sha256, length], ...]) of a file, reading it once."""
+    file_hash = hashlib.sha256()
+    chunks = []
+    pending = b""
+    with open(path, "rb") as f_in:
+        while True:
+            data = f_in.read(READ_SIZE)
+            file_hash.update(data)
+            buffer = pending + data
+            start = 0
+            for end in cut_points(buffer, final=not data):
+                chunks.append([hashlib.sha256(buffer[start:end]).hexdigest(), end - start])
+                start = end
+            pending = buffer[start:]
+            if not data:
+                break
+    return file_hash.hexdigest(), chunks
+
+
+def indexed_chunks(path):
+    """chunk_file(path), reused from the local chunk index while the file's size and mtime are unchanged."""
+    index_file = os.path.join(os.path.dirname(os.path.abspath(path)), LOCAL_INDEX)
+    try:
+        with open(index_file) as f:
+            index = json.load(f)
+    except (FileNotFoundError, ValueError):
+        index = {}
+    stat = os.stat(path)
+    name = os.path.basename(path)
+    entry = index.get(name)
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["sha256"], entry["chunks"]
+    sha256, chunks = chunk_file(path)
+    index[name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256, "chunks": chunks}
+    with open(index_file + ".part", "w") as f:
+        json.dump(index, f)
+    os.replace(index_file + ".part", index_file)
+    return sha256, chunks
+
+
+class DirectoryRemote:
+    """Receiving end of a transfer in a local directory; files land in `directory` itself."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.chunk_dir = os.path.join(directory, STORE_DIR, "chunks")
+        self.recipe_dir = os.path.join(directory, STORE_DIR, "recipes")
+
+    def connect(self):
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.recipe_dir, exist_ok=True)
+
+    def close(self):
+        pass
+
+    def _chunk_path(self, chunk_id):
+        return os.path.join(self.chunk_dir, chunk_id[:2], chunk_id)
+
+    def missing(self, chunk_ids):
+        """The chunk ids that are not in the store."""
+        return [chunk_id for chunk_id in chunk_ids if not os.path.exists(self._chunk_path(chunk_id))]
+
+    def put_chunks(self, chunks):
+        """Store [(chunk id, zlib-compressed bytes)], checking every chunk against its id."""
+        for chunk_id, compressed in chunks:
+            try:
+                intact = hashlib.sha256(zlib.decompress(compressed)).hexdigest() == chunk_id
+            except zlib.error:
+                intact = False
+            if not intact:
+                raise RuntimeError(f"Chunk {chunk_id} arrived corrupted")
+            path = self._chunk_path(chunk_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".part", "wb") as f:
+                f.write(compressed)
+            os.replace(path + ".part", path)
+        return len(chunks)
+
+    def assemble(self, name, chunk_ids, sha256):
+        """Rebuild `name` from stored chunks, renaming it into place only if its sha256 matches.
+
+        `name` may be DIRECTORY/FILE for a file of a sent directory; the
+        chunk store is shared by everything sent to this remote directory.
+        """
+        parts = name.split("/")
+        if name.startswith("/") or any(part in ("", ".", "..") for part in parts):
+            raise RuntimeError(f"Refusing to write {name!r} outside {self.directory}")
+        missing = self.missing(chunk_ids)
+        if missing:
+            raise RuntimeError(f"{len(missing)} chunk(s) of {name} are not in the store")
+        path = os.path.join(self.directory, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_hash = hashlib.sha256()
+        size = 0
+        with open(path + ".part", "wb") as f_out:
+            for chunk_id in chunk_ids:
+                with open(self._chunk_path(chunk_id), "rb") as f_in:
+                    data = zlib.decompress(f_in.read())
+                file_hash.update(data)
+                f_out.write(data)
+                size += len(data)
+        if file_hash.hexdigest() != sha256:
+            os.remove(path + ".part")
+            raise RuntimeError(f"{name} does not match its sha256 after reassembly")
+        os.replace(path + ".part", path)
+        with open(os.path.join(self.recipe_dir, quote(name, safe="") + ".json"), "w") as f:
+            json.dump({"sha256": sha256, "chunks": chunk_ids}, f)
+        self.prune()
+        return size
+
+    def prune(self):
+        """Delete stored chunks that no file's chunk list refers to any more."""
+        referenced = set()
+        for recipe in os.listdir(self.recipe_dir):
+            if not os.path.exists(os.path.join(self.directory, unquote(recipe[:-len(".json")]))):
+                os.remove(os.path.join(self.recipe_dir, recipe))
+                continue
+            with open(os.path.join(self.recipe_dir, recipe)) as f:
+                referenced.update(json.load(f)["chunks"])
+        cutoff = time.time() - PRUNE_SECONDS
+        removed = 0
+        for prefix in os.listdir(self.chunk_dir):
+            for chunk_id in os.listdir(os.path.join(self.chunk_dir, prefix)):
+                path = os.path.join(self.chunk_dir, prefix, chunk_id)
+                if chunk_id not in referenced and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+
+class SshRemote:
+    """Receiving end on another host: a DirectoryRemote served over ssh by this module's own source.
+
+    `target` is HOST:DIRECTORY, as for scp. Requests are JSON lines, each
+    answered by one JSON line; put_chunks requests are followed by the chunk
+    bytes.
+    """
+
+    def __init__(self, target):
+        self.host, _, self.directory = target.partition(":")
+        self.process = None
+
+    def connect(self):
+        command = " ".join(shlex.quote(arg) for arg in ["python3", "-c", BOOTSTRAP, "--serve", self.directory])
+        self.process = subprocess.Popen(["ssh", self.host, command], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        with open(os.path.abspath(__file__), "rb") as f:
+            source = f.read()
+        self.process.stdin.write(b"%d\n" % len(source) + source)
+        self._call("connect")
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def _call(self, op, *args, payload=b""):
+        try:
+            self.process.stdin.write(json.dumps({"op": op, "args": args}).encode() + b"\n" + payload)
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            raise ConnectionError(f"Lost connection to {self.host}")
+        line = self.process.stdout.readline()
+        if not line:
+            raise ConnectionError(f"Lost connection to {self.host}")
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(f"{self.host}: {response['error']}")
+        return response["result"]
+
+    def missing(self, chunk_ids):
+        return self._call("missing", chunk_ids)
+
+    def put_chunks(self, chunks):
+        header = [(chunk_id, len(compressed)) for chunk_id, compressed in chunks]
+        return self._call("put_chunks", header, payload=b"".join(compressed for _, compressed in chunks))
+
+    def assemble(self, name, chunk_ids, sha256):
+        return self._call("assemble", name, chunk_ids, sha256)
+
+
+def serve(remote, reader, writer):
+    """Answer SshRemote requests from `reader` on `writer` with `remote` until the input ends."""
+    operations = {"connect": remote.connect, "missing": remote.missing, "assemble": remote.assemble}
+    while True:
+        line = reader.readline()
+        if not line:
+            return
+        request = json.loads(line)
+        try:
+            if request["op"] == "put_chunks":
+                chunks = [(chunk_id, reader.read(length)) for chunk_id, length in request["args"][0]]
+                response = {"result": remote.put_chunks(chunks)}
+            else:
+                response = {"result": operations[request["op"]](*request["args"])}
+        except Exception as e:
+            response = {"error": str(e)}
+        writer.write(json.dumps(response).encode() + b"\n")
+        writer.flush()
+
+
+def remote_for(target):
+    """SshRemote for HOST:DIRECTORY, else a DirectoryRemote."""
+    host, separator, _ = target.partition(":")
+    if separator and "/" not in host and not os.path.exists(host):
+        return SshRemote(target)
+    return DirectoryRemote(target)
+
+
+def send_chunks(path, name, remote, sha256, chunks):
+    """One attempt at sending a file: the missing chunks, then the reassembly. Returns the compressed bytes sent."""
+    offsets = {}
+    position = 0
+    for chunk_id, length in chunks:
+        offsets.setdefault(chunk_id, (position, length))
+        position += length
+    missing = remote.missing(list(offsets))
+    sent = 0
+    batch, batch_bytes = [], 0
+    with open(path, "rb") as f_in:
+        for chunk_id in missing:
+            offset, length = offsets[chunk_id]
+            f_in.seek(offset)
+            compressed = zlib.compress(f_in.read(length), 6)
+            batch.append((chunk_id, compressed))
+            batch_bytes += len(compressed)
+            if batch_bytes >= BATCH_BYTES:
+                remote.put_chunks(batch)
+                sent += batch_bytes
+                batch, batch_bytes = [], 0
+    if batch:
+        remote.put_chunks(batch)
+        sent += batch_bytes
+    remote.assemble(name, [chunk_id for chunk_id, _ in chunks], sha256)
+    print(f"  {name}: {len(missing):,} of {len(offsets):,} chunks sent "
+          f"({sent / (1024 * 1024):,.1f} MB)")
+    return sent
+
+
+def send_file(path, remote, name=None, retry_delays=RETRY_DELAYS):
+    """Transfer `path` to `remote` as `name` (default: its file name), retrying after connection failures.
+
+    Returns the bytes sent over the link; raises the last error once every
+    retry has failed.
+    """
+    name = name or os.path.basename(path)
+    sha256, chunks = indexed_chunks(path)
+    sent = 0
+    for attempt, delay in enumerate([0, *retry_delays]):
+        if delay:
+            print(f"  Retrying in {delay} s (attempt {attempt + 1} of {len(retry_delays) + 1})")
+            time.sleep(delay)
+        try:
+            remote.connect()
+            sent += send_chunks(path, name, remote, sha256, chunks)
+            return sent
+        except (OSError, RuntimeError) as e:
+            print(f"  Transfer of {name} interrupted: {e}")
+            if attempt == len(retry_delays):
+                raise
+        finally:
+            remote.close()
+
+
+def directory_files(directory):
+    """(path, remote name) of every file of `directory`, kept under its name and with the manifest last."""
+    base = os.path.basename(os.path.abspath(directory))
+    names = sorted(name for name in os.listdir(directory)
+                   if not name.startswith(".") and not name.endswith(".part")
+                   and os.path.isfile(os.path.join(directory, name)))
+    names.sort(key=lambda name: name == MANIFEST_NAME)
+    return [(os.path.join(directory, name), f"{base}/{name}") for name in names]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send files as content-defined chunks, only the new chunks "
+                                                 "crossing the link.")
+    parser.add_argument("paths", nargs="*", metavar="FILE",
+                        help="files or directories to send, then the target directory (local, or "
+                             "HOST:DIRECTORY over ssh); a directory arrives as a directory of the target")
+    parser.add_argument("--serve", metavar="DIRECTORY", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(DirectoryRemote(args.serve), sys.stdin.buffer, sys.stdout.buffer)
+        raise SystemExit(0)
+
+    if len(args.paths) < 2:
+        parser.error("expected at least one file and a target")
+    *paths, target = args.paths
+    files = []
+    for path in paths:
+        files += directory_files(path) if os.path.isdir(path) else [(path, os.path.basename(path))]
+    remote = remote_for(target)
+    failed = set()
+    for path, name in files:
+        # A directory that lost a file does not get its manifest.
+        if os.path.dirname(name) in failed:
+            continue
+        started = time.monotonic()
+        try:
+            sent = send_file(path, remote, name)
+        except (OSError, RuntimeError) as e:
+            print(f"Failed to send {path} to {target}: {e}")
+            failed.add(os.path.dirname(name) or name)
+            continue
+        print(f"Sent {path} to {target}: {sent / (1024 * 1024):,.1f} MB of "
+              f"{os.path.getsize(path) / (1024 * 1024):,.1f} MB in {time.monotonic() - started:.1f} s")
+    raise SystemExit(1 if failed else 0)
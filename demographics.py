@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+# Named age bucket schemes: ages below edges[0] get labels[0], ages in
+# [edges[i - 1], edges[i]) get labels[i], older ones the last label, and
+# patients without a birthdate `missing`.
+AGE_BUCKET_SCHEMES = {
+    # 3. Patient Age Groups
+    "registration_age_groups": {
+        "edges": [5, 10, 15, 20, 25],
+        "labels": ["Under 5", "5-9", "10-14", "15-19", "20-24", "Other"],
+        "missing": "Other",
+    },
+    # 4. Services Used Per Age Group
+    "service_age_groups": {
+        "edges": [5, 18, 36, 51],
+        "labels": ["Under 5", "5-17", "18-35", "36-50", "Above 50"],
+        "missing": "Unknown",
+    },
+    # 8. Returning patient distribution
+    "returning_age_categories": {
+        "edges": [5, 13],
+        "labels": ["under_five", "under_thirteen", "adult"],
+        "missing": "adult",
+    },
+}
+
+demographics_query = """
+    SELECT pt.patient_id, pt.date_created, p.gender, p.birthdate
+    FROM patient pt
+    JOIN person p ON pt.patient_id = p.person_id;
+"""
+# Column kinds for cursor_frames.fetch_frame.
+DEMOGRAPHICS_COLUMNS = {"patient_id": "int", "date_created": "datetime", "gender": "category",
+                        "birthdate": "datetime"}
+
+
+def patient_demographics(people, reference):
+    """The demographics dimension: one row per patient with a person record.
+
+    `people` holds patient_id, date_created, gender and birthdate (from
+    demographics_query, or the snapshot tables joined); age in whole years
+    against `reference` is added once here, so every section buckets the
+    same ages. Gender is categorical and age a nullable Int16.
+    """
+    demographics = people[["patient_id", "date_created", "gender", "birthdate"]].reset_index(drop=True)
+    demographics["gender"] = demographics["gender"].astype("category")
+    demographics["age"] = age_in_years(demographics["birthdate"], pd.Timestamp(reference)).astype("Int16")
+    return demographics
+
+
+def bucket_ages(ages, scheme):
+    """Ordered categorical of the AGE_BUCKET_SCHEMES bucket label of every age."""
+    scheme = AGE_BUCKET_SCHEMES[scheme]
+    labels = list(scheme["labels"])
+    if scheme["missing"] not in labels:
+        labels.append(scheme["missing"])
+    ages = pd.array(ages, dtype="Int16")
+    codes = np.searchsorted(scheme["edges"], ages.fillna(0).to_numpy(), side="right")
+    codes = np.where(ages.isna(), labels.index(scheme["missing"]), codes)
+    return pd.Categorical.from_codes(codes, categories=labels, ordered=True)
+
+
+def age_in_years(birthdates, reference):
+    """Whole years from `birthdates` to `reference`, like TIMESTAMPDIFF(YEAR, birthdate, reference).
+
+    Missing birthdates give NaN, which the bucket schemes send to their
+    `missing` bucket just as NULL falls through to the ELSE branch of the SQL
+    CASE ladders.
+    """
+    years = reference.year - birthdates.dt.year
+    before_birthday = (birthdates.dt.month > reference.month) | (
+        (birthdates.dt.month == reference.month) & (birthdates.dt.day > reference.day)
+    )
+    return (years - before_birthday.astype(int)).astype("float64")
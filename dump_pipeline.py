@@ -0,0 +1,418 @@
+"""Dump a MySQL database table by table in parallel, compressed on the fly, with a checksum manifest.
+
+The backup script runs it in place of `mysqldump | gzip`, and
+Backup_analysis.py reads the resulting directory like a .sql.gz backup,
+restoring only the tables it needs (see dump_restore.iter_backup_chunks).
+All worker connections start their transaction inside one
+FLUSH TABLES WITH READ LOCK window, so every table is read from the same
+consistent snapshot while several tables are read at once. Each table goes
+to its own mysqldump-format .sql.gz, compressed block by block on a thread
+pool and streamed straight to the destination (a local directory, or a
+directory on another host over ssh); no uncompressed copy is written
+anywhere. manifest.json, written last, lists every file with its sha256 and
+a hash of the table's contents, so a restore can skip unchanged tables.
+Unchanged stretches of a table compress to the same bytes as in the
+previous dump, so delta_transfer.py only sends what changed.
+
+    python dump_pipeline.py --database billing_prod_import --password ... --output /backups/billing_Friday
+    python dump_pipeline.py --database billing_prod_import --password ... --output ghii@lab:/home/ghii/backup/Friday
+    python dump_pipeline.py --verify /backups/billing_Friday
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import queue
+import shlex
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from functools import partial
+
+import mysql.connector
+
+from delta_transfer import cut_points
+from dump_restore import DUMP_MANIFEST, verify_dump
+
+DEFAULT_WORKERS = 4
+# Uncompressed bytes buffered before they are cut into gzip members.
+SCAN_SIZE = 4 * 1024 * 1024
+# Longest extended INSERT written, like mysqldump's --net-buffer-length.
+INSERT_BYTES = 1024 * 1024
+FETCH_ROWS = 10_000
+
+HEADER = """-- Parallel dump of `{database}`.`{table}` (dump_pipeline.py), consistent snapshot of {started}
+--
+/*!40101 SET @OLD_CHARACTER_SET_CLIENT=@@CHARACTER_SET_CLIENT */;
+/*!50503 SET NAMES utf8mb4 */;
+/*!40103 SET @OLD_TIME_ZONE=@@TIME_ZONE */;
+/*!40103 SET TIME_ZONE='+00:00' */;
+/*!40014 SET @OLD_UNIQUE_CHECKS=@@UNIQUE_CHECKS, UNIQUE_CHECKS=0 */;
+/*!40014 SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0 */;
+"""
+TRAILER = """/*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;
+/*!40014 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS */;
+/*!40014 SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS */;
+/*!40101 SET CHARACTER_SET_CLIENT=@OLD_CHARACTER_SET_CLIENT */;
+
+-- Dump completed on {finished}
+"""
+STRING_ESCAPES = str.maketrans({"\\": "\\\\", "'": "\\'", "\0": "\\0", "\n": "\\n", "\r": "\\r", "\x1a": "\\Z"})
+
+
+class ParallelGzipWriter:
+    """Binary writer that gzips content-defined blocks as independent members on a shared thread pool.
+
+    Members end where delta_transfer.cut_points cuts the uncompressed stream,
+    as with gzip --rsyncable: rows changed in one place only change the
+    members around them, the rest of the file stays byte-for-byte what the
+    previous dump wrote, and delta_transfer only has to send the difference.
+    zlib releases the GIL, so the members of one file compress on several
+    cores at once. Concatenated gzip members are one valid .gz stream, which
+    gunzip, Python's gzip module and dump_restore all read as a single file.
+    The sha256 is of the compressed bytes, as they land at the destination.
+    """
+
+    def __init__(self, out, pool, compresslevel=6, scan_size=SCAN_SIZE, max_pending=64):
+        self.out = out
+        self.pool = pool
+        self.compresslevel = compresslevel
+        self.scan_size = scan_size
+        self.max_pending = max_pending
+        self.buffer = []
+        self.buffered = 0
+        self.pending = deque()
+        self.sha256 = hashlib.sha256()
+        self.raw_bytes = 0
+        self.bytes = 0
+
+    def write(self, data):
+        self.buffer.append(data)
+        self.buffered += len(data)
+        self.raw_bytes += len(data)
+        if self.buffered >= self.scan_size:
+            self._submit(final=False)
+
+    def _submit(self, final):
+        """Compress the complete blocks of the buffer, keeping an unfinished one for the next write."""
+        data = b"".join(self.buffer)
+        start = 0
+        for end in cut_points(data, final):
+            self.pending.append(self.pool.submit(partial(gzip.compress, data[start:end], self.compresslevel,
+                                                         mtime=0)))
+            start = end
+            while len(self.pending) > self.max_pending:
+                self._write_next()
+        self.buffer = [data[start:]]
+        self.buffered = len(data) - start
+
+    def _write_next(self):
+        data = self.pending.popleft().result()
+        self.out.write(data)
+        self.sha256.update(data)
+        self.bytes += len(data)
+
+    def close(self):
+        """Compress and write whatever is still buffered; the underlying file is left open."""
+        self._submit(final=True)
+        while self.pending:
+            self._write_next()
+
+
+class DirectoryDestination:
+    """Writes each file as NAME.part in a local directory and renames it into place once complete."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def open(self, name):
+        return open(os.path.join(self.directory, name + ".part"), "wb")
+
+    def commit(self, name, out):
+        out.close()
+        os.replace(os.path.join(self.directory, name + ".part"), os.path.join(self.directory, name))
+
+    def abort(self, name, out):
+        out.close()
+        os.remove(os.path.join(self.directory, name + ".part"))
+
+    def remove(self, name):
+        if os.path.exists(os.path.join(self.directory, name)):
+            os.remove(os.path.join(self.directory, name))
+
+
+class SshDestination:
+    """Streams each file into `cat` on a remote host over ssh, renaming it into place once complete.
+
+    `target` is HOST:DIRECTORY, as for scp.
+    """
+
+    def __init__(self, target):
+        self.host, _, self.directory = target.partition(":")
+        self.processes = {}
+        self._remote(f"mkdir -p {shlex.quote(self.directory)}")
+
+    def _remote(self, command):
+        if subprocess.run(["ssh", self.host, command]).returncode != 0:
+            raise RuntimeError(f"ssh {self.host} {command!r} failed")
+
+    def _path(self, name):
+        return shlex.quote(os.path.join(self.directory, name))
+
+    def open(self, name):
+        process = subprocess.Popen(["ssh", self.host, f"cat > {self._path(name + '.part')}"], stdin=subprocess.PIPE)
+        self.processes[name] = process
+        return process.stdin
+
+    def commit(self, name, out):
+        out.close()
+        if self.processes.pop(name).wait() != 0:
+            raise RuntimeError(f"Streaming {name} to {self.host} failed")
+        self._remote(f"mv {self._path(name + '.part')} {self._path(name)}")
+
+    def abort(self, name, out):
+        out.close()
+        self.processes.pop(name).wait()
+        self._remote(f"rm -f {self._path(name + '.part')}")
+
+    def remove(self, name):
+        self._remote(f"rm -f {self._path(name)}")
+
+
+def destination_for(output):
+    """SshDestination for HOST:DIRECTORY, else a DirectoryDestination."""
+    host, separator, _ = output.partition(":")
+    if separator and "/" not in host and not os.path.exists(host):
+        return SshDestination(output)
+    return DirectoryDestination(output)
+
+
+def sql_literal(value):
+    """A fetched value as a MySQL literal, the way mysqldump writes it."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + value.hex() if value else "''"
+    if isinstance(value, timedelta):
+        seconds = int(value.total_seconds())
+        sign = "-" if seconds < 0 else ""
+        hours, rest = divmod(abs(seconds), 3600)
+        return f"'{sign}{hours:02d}:{rest // 60:02d}:{rest % 60:02d}'"
+    if isinstance(value, (datetime, date)):
+        return f"'{value}'"
+    if isinstance(value, set):
+        value = ",".join(sorted(value))
+    return "'" + str(value).translate(STRING_ESCAPES) + "'"
+
+
+def open_snapshot_connections(database, user, password, host, count):
+    """`count` connections whose transactions all see the same consistent snapshot of `database`.
+
+    Every transaction starts while one connection holds FLUSH TABLES WITH
+    READ LOCK, which is released as soon as they have all started; the
+    binary log position at that moment is returned too (None without binary
+    logging).
+    """
+    lock_conn = mysql.connector.connect(host=host, user=user, password=password)
+    lock_cursor = lock_conn.cursor()
+    lock_cursor.execute("FLUSH TABLES WITH READ LOCK")
+    try:
+        connections = []
+        for _ in range(count):
+            conn = mysql.connector.connect(host=host, user=user, password=password, database=database)
+            cursor = conn.cursor()
+            cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cursor.execute("SET time_zone = '+00:00'")
+            cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+            cursor.close()
+            connections.append(conn)
+        binlog = None
+        try:
+            lock_cursor.execute("SHOW MASTER STATUS")
+            status = lock_cursor.fetchone()
+            if status:
+                binlog = {"file": status[0], "position": status[1]}
+        except mysql.connector.Error:
+            pass
+    finally:
+        lock_cursor.execute("UNLOCK TABLES")
+        lock_cursor.close()
+        lock_conn.close()
+    return connections, binlog
+
+
+def dump_table(conn, database, table, out, started):
+    """Write one table as a standalone mysqldump-format script to `out`.
+
+    Returns its row count and the sha256 of everything between the header
+    and the trailer, which unlike the file's own hash only changes when the
+    table's definition or rows do (see dump_restore.dump_table_hashes).
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"SHOW CREATE TABLE `{table}`")
+    create = cursor.fetchone()[1]
+    cursor.close()
+    content = hashlib.sha256()
+
+    def write(data):
+        content.update(data)
+        out.write(data)
+
+    out.write(HEADER.format(database=database, table=table, started=started).encode())
+    write(f"\n--\n-- Table structure for table `{table}`\n--\n\n"
+          f"DROP TABLE IF EXISTS `{table}`;\n{create};\n"
+          f"\n--\n-- Dumping data for table `{table}`\n--\n\n"
+          f"LOCK TABLES `{table}` WRITE;\n"
+          f"/*!40000 ALTER TABLE `{table}` DISABLE KEYS */;\n".encode())
+
+    rows = 0
+    statement = []
+    size = 0
+    prefix = f"INSERT INTO `{table}` VALUES "
+
+    def flush():
+        write((prefix + ",".join(statement) + ";\n").encode())
+
+    cursor = conn.cursor(buffered=False)
+    cursor.execute(f"SELECT * FROM `{table}`")
+    while True:
+        batch = cursor.fetchmany(FETCH_ROWS)
+        if not batch:
+            break
+        rows += len(batch)
+        for row in batch:
+            values = "(" + ",".join(map(sql_literal, row)) + ")"
+            if statement and size + len(values) > INSERT_BYTES:
+                flush()
+                statement, size = [], 0
+            statement.append(values)
+            size += len(values) + 1
+    cursor.close()
+    if statement:
+        flush()
+
+    write(f"/*!40000 ALTER TABLE `{table}` ENABLE KEYS */;\nUNLOCK TABLES;\n".encode())
+    out.write(TRAILER.format(finished=datetime.now().strftime("%Y-%m-%d %H:%M:%S")).encode())
+    return rows, content.hexdigest()
+
+
+def dump_database(database, user, password, destination, host="localhost", tables=None, workers=DEFAULT_WORKERS,
+                  compress_threads=None, compresslevel=6):
+    """Dump `tables` (default: every base table) of `database` to `destination` in parallel.
+
+    `workers` tables are read at once, over connections sharing one
+    consistent snapshot, largest tables first; their output is compressed on
+    `compress_threads` threads (default: one per CPU). Each table becomes
+    DATABASE_TABLE.sql.gz, and the manifest is written once every table has
+    been committed; the previous dump's manifest is removed first, so the
+    directory never looks complete while it is being rewritten. Returns the
+    manifest.
+    """
+    started = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    destination.remove(DUMP_MANIFEST)
+    conn = mysql.connector.connect(host=host, user=user, password=password, database=database)
+    cursor = conn.cursor()
+    cursor.execute("SELECT table_name FROM information_schema.tables "
+                   "WHERE table_schema = %s AND table_type = 'BASE TABLE' "
+                   "ORDER BY data_length + index_length DESC", (database,))
+    available = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    missing = set(tables or []) - set(available)
+    if missing:
+        raise RuntimeError(f"No such table(s) in {database}: {', '.join(sorted(missing))}")
+    tables = [table for table in available if tables is None or table in tables]
+
+    connections, binlog = open_snapshot_connections(database, user, password, host, min(workers, len(tables)))
+    idle = queue.Queue()
+    for snapshot_conn in connections:
+        idle.put(snapshot_conn)
+    compress_threads = compress_threads or os.cpu_count() or 1
+
+    with ThreadPoolExecutor(max_workers=compress_threads) as compress_pool, \
+            ThreadPoolExecutor(max_workers=len(connections)) as dump_pool:
+
+        def dump(table):
+            name = f"{database}_{table}.sql.gz"
+            table_started = time.monotonic()
+            snapshot_conn = idle.get()
+            out = destination.open(name)
+            try:
+                writer = ParallelGzipWriter(out, compress_pool, compresslevel, max_pending=8 * compress_threads)
+                rows, content_sha256 = dump_table(snapshot_conn, database, table, writer, started)
+                writer.close()
+            except BaseException:
+                destination.abort(name, out)
+                raise
+            finally:
+                idle.put(snapshot_conn)
+            destination.commit(name, out)
+            seconds = time.monotonic() - table_started
+            print(f"  {table:<30} {seconds:8.1f} s  {writer.raw_bytes / (1024 * 1024):10,.1f} MB -> "
+                  f"{writer.bytes / (1024 * 1024):8,.1f} MB  {rows:12,} rows")
+            return {"file": name, "rows": rows, "raw_bytes": writer.raw_bytes, "bytes": writer.bytes,
+                    "sha256": writer.sha256.hexdigest(), "content_sha256": content_sha256}
+
+        print(f"Dumping {len(tables)} table(s) of {database} on {len(connections)} connection(s):")
+        futures = {table: dump_pool.submit(dump, table) for table in tables}
+        try:
+            files = {table: future.result() for table, future in futures.items()}
+        finally:
+            for snapshot_conn in connections:
+                snapshot_conn.close()
+
+    manifest = {
+        "database": database,
+        "started": started,
+        "finished": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "binlog": binlog,
+        "tables": files,
+    }
+    out = destination.open(DUMP_MANIFEST)
+    out.write(json.dumps(manifest, indent=2).encode())
+    destination.commit(DUMP_MANIFEST, out)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dump a MySQL database in parallel to per-table .sql.gz files.")
+    parser.add_argument("--database", help="database to dump")
+    parser.add_argument("--host", default="localhost", help="MySQL host (default: localhost)")
+    parser.add_argument("--user", default="root", help="MySQL user (default: root)")
+    parser.add_argument("--password", default="", help="MySQL password")
+    parser.add_argument("--output", help="destination directory, local or HOST:DIRECTORY over ssh")
+    parser.add_argument("--tables", type=lambda value: [t.strip() for t in value.split(",") if t.strip()],
+                        help="comma-separated tables to dump (default: every table)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"tables dumped concurrently (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--compress-threads", type=int, help="compression threads (default: one per CPU)")
+    parser.add_argument("--compresslevel", type=int, default=6, help="gzip level 1-9 (default: 6)")
+    parser.add_argument("--verify", metavar="DIRECTORY",
+                        help="instead of dumping, check a local dump directory against its manifest")
+    args = parser.parse_args()
+
+    if args.verify:
+        problems = verify_dump(args.verify)
+        for problem in problems:
+            print(problem)
+        print("Dump verified." if not problems else f"{len(problems)} problem(s) found.")
+        raise SystemExit(1 if problems else 0)
+
+    if not args.database or not args.output:
+        parser.error("--database and --output are required unless --verify is given")
+    started = time.monotonic()
+    manifest = dump_database(args.database, args.user, args.password, destination_for(args.output), host=args.host,
+                             tables=args.tables, workers=args.workers, compress_threads=args.compress_threads,
+                             compresslevel=args.compresslevel)
+    total = sum(entry["bytes"] for entry in manifest["tables"].values())
+    print(f"Dump written to {args.output}: {len(manifest['tables'])} table(s), "
+          f"{total / (1024 * 1024):,.1f} MB compressed in {time.monotonic() - started:.1f} s")
@@ -0,0 +1,474 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 1024 * 1024
+PROGRESS_INTERVAL = 5
+
+# Prepended to every parallel segment: the segments load independent tables
+# inside one transaction each, so per-row key checks only slow them down.
+BULK_LOAD_SETTINGS = b"""SET SESSION unique_checks = 0;
+SET SESSION foreign_key_checks = 0;
+SET autocommit = 0;
+"""
+BULK_LOAD_OPTIONS = ["--max-allowed-packet=1G", "--net-buffer-length=16M"]
+# The last comment mysqldump writes once it has dumped everything.
+DUMP_COMPLETED_MARKER = b"-- Dump completed"
+# Lists the per-table files of a dump directory with their sha256 (see dump_pipeline.py).
+DUMP_MANIFEST = "manifest.json"
+
+
+def iter_backup_chunks(backup_file, chunk_size=CHUNK_SIZE, tables=None):
+    """Yield the decompressed contents of a backup in fixed-size chunks.
+
+    A backup is a .sql.gz or plain .sql dump, or a per-table dump directory
+    written by dump_pipeline.py; of a directory only `tables` are read when
+    given (a single-file dump still holds every table, see filter_tables).
+    """
+    if is_dump_directory(backup_file):
+        yield from iter_dump_directory(backup_file, tables, chunk_size)
+        return
+    opener = gzip.open if backup_file.endswith(".gz") else open
+    with opener(backup_file, 'rb') as f_in:
+        while True:
+            chunk = f_in.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def is_dump_directory(path):
+    """True for a complete per-table dump directory; its manifest is written last."""
+    return os.path.isfile(os.path.join(path, DUMP_MANIFEST))
+
+
+def find_backups(directory):
+    """Every backup in `directory`: .sql.gz dumps and complete per-table dump directories."""
+    return [os.path.join(directory, name) for name in os.listdir(directory)
+            if name.endswith(".sql.gz") or is_dump_directory(os.path.join(directory, name))]
+
+
+def backup_size(backup_file):
+    """Bytes on disk of a backup file or dump directory."""
+    if os.path.isdir(backup_file):
+        return sum(os.path.getsize(os.path.join(backup_file, name)) for name in os.listdir(backup_file))
+    return os.path.getsize(backup_file)
+
+
+def load_dump_manifest(directory):
+    with open(os.path.join(directory, DUMP_MANIFEST)) as f:
+        return json.load(f)
+
+
+def dump_table_hashes(backup_file):
+    """{table: hash of its contents} from a dump directory's manifest, or None for a single-file dump.
+
+    A single-file dump has no hashes until it has been read; see
+    filter_tables. A directory from before the manifest kept content hashes
+    gives the sha256 of each file instead, which changes with every dump.
+    """
+    if not is_dump_directory(backup_file):
+        return None
+    return {table: entry.get("content_sha256", entry["sha256"])
+            for table, entry in load_dump_manifest(backup_file)["tables"].items()}
+
+
+def verify_dump(directory, tables=None):
+    """Check the files of a dump directory (only `tables`, if given) against its manifest; returns the problems."""
+    problems = []
+    for table, entry in load_dump_manifest(directory)["tables"].items():
+        if tables is not None and table not in tables:
+            continue
+        path = os.path.join(directory, entry["file"])
+        if not os.path.exists(path):
+            problems.append(f"{table}: {entry['file']} is missing")
+        elif file_checksum(path) != entry["sha256"]:
+            problems.append(f"{table}: {entry['file']} does not match its sha256")
+    return problems
+
+
+def iter_dump_directory(directory, tables=None, chunk_size=CHUNK_SIZE):
+    """Decompressed chunks of the per-table files of a dump directory, in manifest order.
+
+    Only `tables` are read when given. Every selected file is checked against
+    the manifest before the first chunk is yielded, raising RuntimeError on a
+    mismatch, so a restore never starts from a corrupt dump.
+    """
+    problems = verify_dump(directory, tables)
+    if problems:
+        raise RuntimeError(f"{directory} is corrupt: {'; '.join(problems)}")
+    for table, entry in load_dump_manifest(directory)["tables"].items():
+        if tables is not None and table not in tables:
+            continue
+        with gzip.open(os.path.join(directory, entry["file"]), "rb") as f_in:
+            while True:
+                chunk = f_in.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+def require_complete_dump(chunks, backup_file):
+    """Pass dump chunks through, raising RuntimeError at the end unless the dump is complete.
+
+    A complete dump decompresses cleanly and ends with mysqldump's
+    DUMP_COMPLETED_MARKER comment; a dump still being written, or cut short,
+    has neither. The error only comes after the last chunk: wrapped around a
+    restore it kills the `mysql` client before the stream ends (see
+    stream_restore), but what was already applied stays, so the caller has
+    to treat the restored database as lost.
+    """
+    tail = b""
+    try:
+        for chunk in chunks:
+            tail = (tail + chunk)[-256:]
+            yield chunk
+    except (EOFError, gzip.BadGzipFile) as e:
+        raise RuntimeError(f"{backup_file} is truncated or still being written ({e})") from e
+    if DUMP_COMPLETED_MARKER not in tail:
+        raise RuntimeError(f"{backup_file} does not end with '{DUMP_COMPLETED_MARKER.decode()}'; "
+                           f"the dump is incomplete")
+
+
+def iter_dump_lines(chunks):
+    """Yield the lines (without their newline) of a chunked dump stream."""
+    pending = b""
+    for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+# mysqldump opens every table, view and routine block with one of these comments.
+SECTION_MARKER = re.compile(
+    rb"-- (?:Table structure for table|Dumping data for table|"
+    rb"Temporary view structure for view|Temporary table structure for view|"
+    rb"Final view structure for view) `([^`]+)`"
+)
+OTHER_SECTION_MARKER = re.compile(rb"-- Dumping (routines|events) for database")
+SESSION_SETTING = re.compile(rb"(?:/\*!\d+ )?SET ")
+
+
+def section_name(line):
+    """Table (or "routines"/"events") named by a mysqldump section comment, else None."""
+    match = SECTION_MARKER.match(line) or OTHER_SECTION_MARKER.match(line)
+    return match.group(1).decode() if match else None
+
+
+def iter_table_segments(chunks):
+    """Split a mysqldump stream into (table, data) pieces without parsing statements.
+
+    Only comment and DELIMITER lines are inspected: each section marker
+    switches the current table, and every following line belongs to it until
+    the next marker. Lines before the first table, the completion comment and
+    session SET lines (the dump header/trailer and the character set juggling
+    around each CREATE) are yielded with table None because every restore
+    needs them. A SET inside a DELIMITER block is part of a trigger or
+    routine body and stays with its section. Consecutive lines of the same
+    table are joined so each chunk yields only a few pieces.
+    """
+    current = None
+    delimited = False
+
+    def table_of(line):
+        nonlocal current, delimited
+        if line.startswith(b"-- "):
+            current = None if line.startswith(DUMP_COMPLETED_MARKER) else section_name(line) or current
+        elif line.startswith(b"DELIMITER "):
+            delimited = line.split()[1:2] != [b";"]
+        elif not delimited and SESSION_SETTING.match(line):
+            return None
+        return current
+
+    pending = b""
+    for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+
+        piece_table, piece = current, []
+        for line in lines:
+            table = table_of(line)
+            if table != piece_table and piece:
+                yield piece_table, b"\n".join(piece) + b"\n"
+                piece = []
+            piece_table = table
+            piece.append(line)
+        if piece:
+            yield piece_table, b"\n".join(piece) + b"\n"
+    if pending:
+        yield table_of(pending), pending
+
+
+def filter_tables(chunks, tables=None, hashes=None):
+    """Yield only the dump sections for `tables` (all of them when None), plus the shared header and trailer.
+
+    With a `hashes` dict, every table the stream holds is recorded in it as
+    the sections go by: the selected tables with a sha256 of their sections,
+    the others with None. The shared lines are left out, so a hash only
+    changes when a table's definition or rows do, not when the dump date in
+    the trailer does. The hashes are filled in once the stream has been read
+    to the end, so a restore learns them from the pass that loads the tables.
+    """
+    selected = None if tables is None else set(tables)
+    digests = {}
+    for table, data in iter_table_segments(chunks):
+        if table is None:
+            yield data
+            continue
+        if table not in digests:
+            digests[table] = hashlib.sha256() if selected is None or table in selected else None
+        if digests[table] is not None:
+            if hashes is not None:
+                digests[table].update(data)
+            yield data
+    if hashes is not None:
+        hashes.update({table: digest and digest.hexdigest() for table, digest in digests.items()})
+
+
+def plan_restore(manifest, checksum, tables=None, dump_hashes=None):
+    """The tables a restore has to load from a backup, given the restore manifest of the last one.
+
+    `tables` are the tables wanted (all of the backup's when None) and
+    `dump_hashes` the backup's per-table hashes when they are known without
+    reading it (see dump_table_hashes). Returns [] when the restored database
+    already holds everything wanted, else the tables to restore. Of a
+    single-file dump that changed every wanted table is restored (None for
+    all of them): which ones changed is only known once it has been read,
+    and it is read just once, by the restore (see filter_tables).
+    """
+    restored = manifest.get("tables", {})
+    dump_tables = manifest.get("dump_tables")
+    if manifest.get("checksum") == checksum and (dump_tables is not None or tables is not None):
+        wanted = dump_tables if tables is None else [t for t in tables if dump_tables is None or t in dump_tables]
+        return [t for t in wanted if t not in restored]
+    if dump_hashes is not None:
+        wanted = dump_hashes if tables is None else [t for t in tables if t in dump_hashes]
+        return [t for t in wanted if dump_hashes[t] != restored.get(t)]
+    return None if tables is None else list(tables)
+
+
+def file_checksum(path, chunk_size=CHUNK_SIZE):
+    """sha256 of a file's bytes, read in chunks; a dump directory is identified by its manifest's."""
+    if is_dump_directory(path):
+        path = os.path.join(path, DUMP_MANIFEST)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f_in:
+        while True:
+            chunk = f_in.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(path):
+    """Read the restore manifest; a missing or unreadable one counts as empty."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    """Write the restore manifest atomically."""
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+ROW_MARKERS = (b"INSERT INTO", b"),(")
+
+
+def count_rows(chunk, tail=b""):
+    """Count the rows started in a chunk of extended INSERT statements.
+
+    Every INSERT carries one row for its first tuple and one more for each
+    "),(" separator. `tail` is the end of the previous chunk so markers
+    split across a chunk boundary are still counted.
+    """
+    rows = 0
+    for marker in ROW_MARKERS:
+        keep = len(marker) - 1
+        rows += (tail[-keep:] + chunk).count(marker)
+    return rows
+
+
+def stream_restore(chunks, database, user, password, host="localhost", options=(), label=None):
+    """Pipe dump chunks into a `mysql` client restoring into `database`.
+
+    Progress is printed every PROGRESS_INTERVAL seconds, prefixed with `label`
+    when given. Raises RuntimeError if the client exits with a non-zero status.
+    If reading `chunks` fails the client is killed rather than left to apply
+    a partial stream.
+    """
+    command = ["mysql", "-h", host, "-u", user, f"-p{password}", *options, database]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    started = time.monotonic()
+    last_report = started
+    total_bytes = 0
+    total_rows = 0
+    tail = b""
+    try:
+        for chunk in chunks:
+            process.stdin.write(chunk)
+            total_bytes += len(chunk)
+            total_rows += count_rows(chunk, tail)
+            tail = (tail + chunk)[-16:]
+
+            now = time.monotonic()
+            if now - last_report >= PROGRESS_INTERVAL:
+                _print_progress(total_bytes, total_rows, now - started, label)
+                last_report = now
+        process.stdin.close()
+    except BrokenPipeError:
+        pass
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    return_code = process.wait()
+
+    if return_code != 0:
+        where = f" ({label})" if label else ""
+        raise RuntimeError(f"mysql restore{where} failed with exit code {return_code}")
+    _print_progress(total_bytes, total_rows, time.monotonic() - started, label)
+    return total_bytes, total_rows
+
+
+def parallel_restore(chunks, database, user, password, host="localhost", workers=4, spool_dir=None):
+    """Restore each table of a single-file dump stream on its own `mysql` connection.
+
+    The stream is split into one gzip segment per table under `spool_dir`;
+    a segment is handed to the worker pool as soon as it is complete, so the
+    large tables start loading while the rest of the dump is still being
+    read. The segments are spooled rather than piped: a .sql.gz holds its
+    tables one after another, and a reader feeding a pipe per table would
+    block until `mysql` drained each one, loading them one at a time again.
+    A segment is compressed and deleted as soon as its table is loaded, so
+    the spool holds at most the tables still waiting for a worker. A dump
+    directory needs no spool at all; see parallel_restore_directory.
+
+    Each segment gets the dump header plus BULK_LOAD_SETTINGS and ends with
+    a COMMIT. Sections whose name was already seen (the final structure of a
+    view) are applied after every table has committed. Returns a dict of
+    table -> (bytes, rows, seconds) once all segments are done; raises
+    RuntimeError if any of them failed.
+    """
+    header = []
+    timings = {}
+    with tempfile.TemporaryDirectory(prefix="restore_segments_", dir=spool_dir) as segment_dir, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+
+        def restore_segment(table, path):
+            try:
+                return _restore_table(iter_backup_chunks(path), table, database, user, password, host)
+            finally:
+                os.remove(path)
+
+        futures = {}
+        deferred = []
+
+        def finish_segment(table, segment, path):
+            segment.write(b"COMMIT;\n")
+            segment.close()
+            if table in futures:
+                deferred.append((table, path))
+            else:
+                futures[table] = pool.submit(restore_segment, table, path)
+
+        current, segment, path = None, None, None
+        for table, data in iter_table_segments(chunks):
+            if table is not None and table != current:
+                if segment:
+                    finish_segment(current, segment, path)
+                current = table
+                path = os.path.join(segment_dir, f"{len(futures) + len(deferred):04d}.sql.gz")
+                segment = gzip.open(path, "wb", compresslevel=1)
+                segment.write(b"".join(header))
+                segment.write(BULK_LOAD_SETTINGS)
+            if segment:
+                segment.write(data)
+            else:
+                header.append(data)
+        if segment:
+            finish_segment(current, segment, path)
+
+        timings = _collect_timings(futures)
+        for table, path in deferred:
+            restore_segment(table, path)
+
+    _print_timings(timings)
+    return timings
+
+
+def parallel_restore_directory(directory, tables, database, user, password, host="localhost", workers=4):
+    """Restore `tables` of a dump directory, each on its own `mysql` connection.
+
+    Every per-table file is a complete dump of its table (header, structure,
+    rows, trailer), so each worker streams its file straight from disk into
+    `mysql`, wrapped in BULK_LOAD_SETTINGS and a COMMIT; nothing is spooled.
+    The files are checked against the manifest before any table is touched.
+    Returns a dict of table -> (bytes, rows, seconds); raises RuntimeError if
+    the dump is corrupt or any table failed.
+    """
+    problems = verify_dump(directory, tables)
+    if problems:
+        raise RuntimeError(f"{directory} is corrupt: {'; '.join(problems)}")
+    entries = load_dump_manifest(directory)["tables"]
+
+    def table_chunks(table):
+        yield BULK_LOAD_SETTINGS
+        yield from iter_backup_chunks(os.path.join(directory, entries[table]["file"]))
+        yield b"COMMIT;\n"
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {table: pool.submit(_restore_table, table_chunks(table), table, database, user, password, host)
+                   for table in entries if table in tables}
+        timings = _collect_timings(futures)
+    _print_timings(timings)
+    return timings
+
+
+def _restore_table(chunks, table, database, user, password, host):
+    started = time.monotonic()
+    total_bytes, total_rows = stream_restore(chunks, database, user, password,
+                                             host=host, options=BULK_LOAD_OPTIONS, label=table)
+    return total_bytes, total_rows, time.monotonic() - started
+
+
+def _collect_timings(futures):
+    """Wait for every per-table restore; raise RuntimeError listing all that failed."""
+    timings = {}
+    errors = []
+    for table, future in futures.items():
+        try:
+            timings[table] = future.result()
+        except RuntimeError as e:
+            errors.append(str(e))
+    if errors:
+        raise RuntimeError("; ".join(errors))
+    return timings
+
+
+def _print_timings(timings):
+    print("Per-table restore times:")
+    for table, (total_bytes, total_rows, seconds) in sorted(timings.items(), key=lambda item: -item[1][2]):
+        print(f"  {table:<30} {seconds:8.1f} s  {total_bytes / (1024 * 1024):10,.1f} MB  {total_rows:12,} rows")
+
+
+def _print_progress(total_bytes, total_rows, elapsed, label=None):
+    elapsed = max(elapsed, 1e-6)
+    megabytes = total_bytes / (1024 * 1024)
+    prefix = f"{label}: " if label else ""
+    print(f"{prefix}Restored {megabytes:,.1f} MB, {total_rows:,} rows "
+          f"({megabytes / elapsed:,.1f} MB/s, {total_rows / elapsed:,.0f} rows/s)")
@@ -0,0 +1,312 @@
+from decimal import Decimal
+
+import pandas as pd
+
+from demographics import patient_demographics, bucket_ages
+from report_windows import metric_windows, window_metrics, registered_patients
+
+
+def compute_report_results(frames, current_date, start_date_str, end_date_str, windows=None, skip=()):
+    """Compute every report section from snapshot DataFrames with vectorized pandas.
+
+    Returns the same section names and row tuples as
+    report_sql.fetch_report_results, so the shaping and Excel code do not care
+    which engine produced them. Sections in `skip` (answered elsewhere, e.g.
+    from the rollup store) are not computed.
+    """
+    patient = frames["patient"]
+    person = frames["person"]
+    order_entries = frames["order_entries"]
+    services = frames["services"]
+    service_prices = frames["service_prices"]
+    receipts = frames["receipts"]
+
+    now = pd.Timestamp(current_date)
+    today = now.normalize()
+    window_start, window_end = report_window(start_date_str, end_date_str)
+
+    results = {}
+
+    # 1. Registered Patients Summary, with the window metrics
+    results["window_metrics"] = window_metrics(frames, windows or metric_windows(current_date))
+    results["registered_patients"] = registered_patients(results["window_metrics"])
+
+    # Paying vs Non-Paying
+    window_orders = order_entries[in_window(order_entries["order_date"], window_start, window_end)]
+    per_patient = pd.DataFrame({
+        "patient_id": window_orders["patient_id"],
+        "paying_orders": window_orders["full_price"] >= 1000,
+        "non_paying_orders": window_orders["full_price"] == 0,
+    }).groupby("patient_id", dropna=False).sum()
+    paying = per_patient["paying_orders"] > 0
+    non_paying = per_patient["non_paying_orders"] > 0
+    results["paying"] = (
+        len(per_patient),
+        int((paying & ~non_paying).sum()),
+        int((non_paying & ~paying).sum()),
+        int((paying & non_paying).sum()),
+    )
+
+    demographics = patient_demographics(join(patient[["patient_id", "date_created"]],
+                                             person[["person_id", "gender", "birthdate"]],
+                                             "patient_id", "person_id"), today)
+    dimensions = order_entry_dimensions(services, service_prices, demographics)
+    partials = order_entry_partials(order_entries, dimensions, window_start, window_end, skip)
+    results.update(combine_order_entry_partials([partials]))
+
+    # 3. Patient Age Groups
+    results["age_groups"] = registration_age_groups(demographics, now)
+
+    # 7, 8, returning frequency and 10
+    visits = receipt_visits(receipts, window_start, window_end)
+    results.update(returning_patient_results(visits, demographics))
+
+    if "hospital_visits" not in skip:
+        window_patients = patient[in_window(patient["date_created"], window_start, window_end)]
+        registrations = window_patients.groupby(window_patients["date_created"].dt.date).size()
+        results["hospital_visits"] = daily_visit_results(registrations, visits)
+
+    return results
+
+
+def order_entry_dimensions(services, service_prices, demographics):
+    """The small lookup frames every order_entries section joins against."""
+    return {
+        "services": services[["service_id", "name"]],
+        "active_prices": service_prices.loc[service_prices["voided"] == 0, ["service_id", "price", "price_type"]],
+        "patient_age_groups": pd.DataFrame({
+            "patient_id": demographics["patient_id"],
+            "age_group": bucket_ages(demographics["age"], "service_age_groups"),
+        }),
+    }
+
+
+def registration_age_groups(demographics, now):
+    """Section 3 rows: patients registered in the 30 days up to `now`, by age group and gender."""
+    recent = demographics[between(demographics["date_created"], now - pd.Timedelta(days=30), now)]
+    recent = recent.assign(age_group=bucket_ages(recent["age"], "registration_age_groups"))
+    age_groups = recent.groupby(["age_group", "gender"], dropna=False, observed=True).size().reset_index()
+    return rows(age_groups.sort_values(["age_group", "gender"]))
+
+
+def order_entry_partials(orders, dimensions, window_start, window_end, skip=()):
+    """Partial aggregates of one batch of order_entries rows for sections 2, 4, 5, 6 and 9.
+
+    Every partial is additive (sums, counts, distinct pairs), so batches
+    streamed from one scan of order_entries can be combined with
+    combine_order_entry_partials into the full section results. Sections 6
+    and 9 are left out when named in `skip`.
+    """
+    live_orders = orders[orders["voided"] == 0]
+    named_orders = join(live_orders, dimensions["services"], "service_id", "service_id")
+    priced_orders = join(named_orders, dimensions["active_prices"], "service_id", "service_id")
+    priced_orders = priced_orders.assign(expected=priced_orders["quantity"] * priced_orders["price"])
+    partials = {}
+
+    # 2. Order Entries Analysis
+    partials["order_entries"] = priced_orders.groupby(["service_id", "name"], observed=True)[
+        ["quantity", "amount_paid", "expected"]].sum()
+    balance = priced_orders[(priced_orders["amount_paid"] < priced_orders["full_price"])
+                            & priced_orders["patient_id"].notna()]
+    partials["balance_patients"] = balance[["service_id", "name", "patient_id"]].drop_duplicates()
+
+    # 4. Services Used Per Age Group
+    patient_orders = join(named_orders, dimensions["patient_age_groups"], "patient_id", "patient_id")
+    partials["most_profitable_services"] = patient_orders.groupby(["age_group", "name"], observed=True)[
+        ["amount_paid"]].sum()
+
+    # 5. Most Popular Services Overall
+    partials["most_popular_services"] = priced_orders.groupby(["name", "price", "price_type"], dropna=False,
+                                                              observed=True)[
+        ["quantity", "amount_paid"]].sum()
+
+    # 6. Services used per month
+    if "services_used_per_month" not in skip:
+        partials["services_used_per_month"] = named_orders.groupby(
+            [named_orders["name"], named_orders["order_date"].dt.year.rename("year"),
+             named_orders["order_date"].dt.month.rename("month")], observed=True).size().to_frame("count")
+
+    # 9. Trend of money made per day (voided entries included, as in the SQL)
+    if "daily_money_trend" not in skip:
+        cashier_orders = orders[
+            orders["cashier"].astype("string").isin(["1", "8", "9"])
+            & in_window(orders["created_at"], window_start, window_end)
+        ]
+        partials["daily_money_trend"] = cashier_orders.groupby(
+            cashier_orders["created_at"].dt.date.rename("transaction_date"))[["full_price"]].sum()
+
+    return partials
+
+
+def combine_partials(partials):
+    """Fold the partials of several batches into one set of partials.
+
+    The balance patients are deduplicated on every fold, so they never hold
+    more than the distinct (service, patient) pairs seen so far.
+    """
+    combined = {}
+    for name in partials[0]:
+        frames = [p[name] for p in partials]
+        if name == "balance_patients":
+            combined[name] = pd.concat(frames).drop_duplicates()
+        else:
+            levels = list(range(frames[0].index.nlevels))
+            combined[name] = pd.concat(frames).groupby(level=levels, dropna=False, observed=True).sum()
+    return combined
+
+
+def combine_order_entry_partials(partials):
+    """Merge batch partials into the row lists of sections 2, 4, 5, 6 and 9."""
+    partials = combine_partials(partials)
+    results = {}
+
+    summary = partials["order_entries"].copy()
+    balance_patients = partials["balance_patients"]
+    summary["patients_with_balance"] = balance_patients.groupby(["service_id", "name"], observed=True).size()
+    summary["patients_with_balance"] = summary["patients_with_balance"].fillna(0).astype(int)
+    results["order_entries"] = rows(summary.reset_index())
+
+    profits = partials["most_profitable_services"].reset_index()
+    results["most_profitable_services"] = rows(profits.sort_values("amount_paid", ascending=False))
+
+    popular = partials["most_popular_services"].reset_index()
+    popular = popular[["name", "quantity", "amount_paid", "price", "price_type"]]
+    results["most_popular_services"] = rows(popular.sort_values("quantity", ascending=False))
+
+    if "services_used_per_month" in partials:
+        monthly = partials["services_used_per_month"].reset_index()
+        monthly[["year", "month"]] = monthly[["year", "month"]].astype(int)
+        results["services_used_per_month"] = rows(monthly.sort_values(["year", "month"], ascending=False))
+
+    if "daily_money_trend" in partials:
+        trend = partials["daily_money_trend"].reset_index()
+        results["daily_money_trend"] = rows(trend.sort_values("transaction_date"))
+
+    return results
+
+
+def same_rows(left, right, places=2):
+    """True when two row lists hold the same rows, ignoring order and numeric representation."""
+    def normalized(rows_):
+        out = []
+        for row in rows_:
+            out.append(tuple(
+                round(float(value), places) if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+                else str(value) if value is not None else ""
+                for value in row
+            ))
+        return sorted(out)
+    return normalized(left) == normalized(right)
+
+
+def receipt_visits(receipts, window_start, window_end):
+    """Per-(day, patient) receipt counts in the window; the twin of report_sql.receipt_visits_query."""
+    window_receipts = receipts[in_window(receipts["payment_stamp"], window_start, window_end)]
+    return window_receipts.groupby(
+        [window_receipts["payment_stamp"].dt.date.rename("visit_date"), "patient_id"], dropna=False
+    ).agg(visits=("payment_stamp", "size"), receipt_count=("receipt_number", "count")).reset_index()
+
+
+def returning_patient_results(visits, demographics):
+    """Sections 7, 8 and the returning-patient frequency from per-(day, patient) visit counts.
+
+    Per-patient counts are summed from `visits` once; section 7 counts
+    patients with more than one receipt number, the others patients with more
+    than one receipt, as the original queries did. Section 8 takes age and
+    gender from the demographics dimension.
+    """
+    per_patient = visits.groupby("patient_id", dropna=False)[["visits", "receipt_count"]].sum()
+    results = {}
+
+    #7. Returning patients count
+    results["returning_patients_count"] = int((per_patient["receipt_count"] > 1).sum())
+
+    # Returning patients frequency
+    returning = per_patient[(per_patient["visits"] > 1) & per_patient.index.notna()]
+    frequency = returning["visits"].value_counts().sort_index().reset_index()
+    results["returning_patients_frequency"] = rows(frequency)
+
+    #8. Returning patient distribution based on age and gender
+    people = demographics[demographics["patient_id"].isin(returning.index)]
+    people = people.assign(age_category=bucket_ages(people["age"], "returning_age_categories"))
+    distribution = people.groupby(["age_category", "gender"], dropna=False, observed=True).size().reset_index()
+    # Listed alphabetically, as the report always has, rather than youngest first.
+    results["returning_patients_distribution"] = rows(distribution.sort_values(
+        ["age_category", "gender"], key=lambda column: column.astype("string")))
+
+    return results
+
+
+def daily_visit_results(registrations, visits):
+    """Section 10 rows from daily registration counts (indexed by date) and per-(day, patient) visits.
+
+    The days may be dates or datetime64 on either side; the rows carry dates,
+    as DATE() returns them.
+    """
+    returning = visits[(visits["visits"] > 1) & visits["patient_id"].notna()]
+    daily_returning = returning.groupby(pd.to_datetime(returning["visit_date"])).size()
+    daily = pd.DataFrame({"registrations": registrations.set_axis(pd.to_datetime(registrations.index))})
+    daily["returning"] = daily_returning.reindex(daily.index).fillna(0).astype(int)
+    daily["total"] = daily["registrations"] + daily["returning"]
+    daily = daily.sort_index()
+    return rows(daily.set_axis(daily.index.date).reset_index())
+
+
+def rollup_days(frames, rollup, since):
+    """Rows of one rollup-store aggregate from snapshot frames; the twin of report_sql.rollup_queries.
+
+    Covers the days from `since` (a date) on, or all history when it is None.
+    """
+    start = pd.Timestamp(since) if since else pd.Timestamp.min
+
+    if rollup == "daily_collections":
+        orders = frames["order_entries"]
+        orders = orders[orders["created_at"] >= start]
+        daily = orders.groupby([orders["created_at"].dt.date.rename("day"), orders["cashier"].astype("string")],
+                               dropna=False)["full_price"].sum()
+    elif rollup == "daily_registrations":
+        patient = frames["patient"]
+        patient = patient[patient["date_created"] >= start]
+        daily = patient.groupby(patient["date_created"].dt.date.rename("day")).size()
+    elif rollup == "daily_returning":
+        receipts = frames["receipts"]
+        receipts = receipts[(receipts["payment_stamp"] >= start) & receipts["patient_id"].notna()]
+        visits = receipts.groupby([receipts["payment_stamp"].dt.date.rename("day"), "patient_id"]).size()
+        daily = visits[visits > 1].groupby(level="day").size()
+    elif rollup == "daily_service_usage":
+        orders = frames["order_entries"]
+        orders = orders[(orders["voided"] == 0) & (orders["order_date"] >= start)]
+        named_orders = join(orders, frames["services"][["service_id", "name"]], "service_id", "service_id")
+        daily = named_orders.groupby([named_orders["order_date"].dt.date.rename("day"), "name"]).size()
+    else:
+        raise ValueError(f"Unknown rollup {rollup}")
+    return rows(daily.reset_index())
+
+
+def report_window(start_date_str, end_date_str):
+    """The report window as a half-open [start, day after end) pair of Timestamps."""
+    return pd.Timestamp(start_date_str), pd.Timestamp(end_date_str) + pd.Timedelta(days=1)
+
+
+def in_window(series, start, end):
+    """Mask for the half-open range `start <= series < end`."""
+    return (series >= start) & (series < end)
+
+
+def between(series, start, end):
+    """Mask for `series BETWEEN start AND end`; missing values never match."""
+    return (series >= start) & (series <= end)
+
+
+def join(left, right, left_on, right_on):
+    """Inner join with SQL semantics: NULL keys never match each other."""
+    left = left[left[left_on].notna()]
+    right = right[right[right_on].notna()]
+    joined = left.merge(right, left_on=left_on, right_on=right_on, suffixes=("", "_right"))
+    return joined.drop(columns=[c for c in joined.columns if c.endswith("_right")])
+
+
+def rows(frame):
+    """Row tuples of plain Python values, the shape a cursor's fetchall() returns."""
+    values = frame.astype(object).where(frame.notna(), None)
+    return [tuple(row) for row in values.to_numpy().tolist()]
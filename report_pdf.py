@@ -0,0 +1,206 @@
+import zlib
+from decimal import Decimal
+
+import numpy as np
+
+from report_workbook import ROW_CHUNK, cell_text
+
+# A4 landscape, in points.
+PAGE_WIDTH = 842
+PAGE_HEIGHT = 595
+MARGIN = 36
+FONT_SIZE = 8
+TITLE_SIZE = 14
+SUBTITLE_SIZE = 10
+CELL_PADDING = 4
+# Advance widths of the standard Helvetica font (1/1000 em) for characters 32-126;
+# anything else is measured as a digit.
+HELVETICA_WIDTHS = dict(zip(map(chr, range(32, 127)), [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]))
+# Bold glyphs are wider; columns are sized for this much on top of the regular widths.
+BOLD_FACTOR = 1.1
+
+
+def write_report_pdf(path, sections, title="Consolidated Report"):
+    """Write the consolidated report as a PDF, one page at a time; returns the page count.
+
+    `sections` is a list of (name, frame, side tables), side tables being
+    (title, frame) pairs printed after the main table (see
+    report_shaping.report_pdf_sections). Every section starts on a new page
+    and long tables continue over as many pages as they need, repeating their
+    header. Each page is compressed and written as soon as it is full, so
+    memory use does not grow with the length of a table.
+    """
+    with open(path, "wb") as f:
+        document = PdfDocument(f)
+        pages = PageWriter(document, title)
+        for name, frame, side_tables in sections:
+            pages.new_page()
+            pages.heading(name, TITLE_SIZE)
+            pages.table(name, frame)
+            for side_title, side_frame in side_tables:
+                pages.heading(side_title, SUBTITLE_SIZE, keep_lines=3)
+                pages.table(side_title, side_frame)
+        pages.finish_page()
+        document.close()
+    return len(document.page_objects)
+
+
+class PdfDocument:
+    """Writes PDF objects to a file as they are produced; only their offsets are kept."""
+
+    CATALOG, PAGES, FONT, BOLD_FONT = 1, 2, 3, 4
+
+    def __init__(self, f):
+        self.f = f
+        self.offsets = {}
+        self.next_number = 5
+        self.page_objects = []
+        f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        for number, font in ((self.FONT, b"Helvetica"), (self.BOLD_FONT, b"Helvetica-Bold")):
+            self.write_object(number, b"<< /Type /Font /Subtype /Type1 /BaseFont /" + font +
+                              b" /Encoding /WinAnsiEncoding >>")
+
+    def write_object(self, number, body):
+        self.offsets[number] = self.f.tell()
+        self.f.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+    def add_page(self, content):
+        """Write one page from its content stream."""
+        stream_number, page_number = self.next_number, self.next_number + 1
+        self.next_number += 2
+        data = zlib.compress(content)
+        self.write_object(stream_number, b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(data) +
+                          data + b"\nendstream")
+        self.write_object(page_number, (
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 %d 0 R /F2 %d 0 R >> >> /Contents %d 0 R >>"
+            % (self.PAGES, PAGE_WIDTH, PAGE_HEIGHT, self.FONT, self.BOLD_FONT, stream_number)))
+        self.page_objects.append(page_number)
+
+    def close(self):
+        """Write the page tree, catalog and cross-reference table."""
+        kids = b" ".join(b"%d 0 R" % number for number in self.page_objects)
+        self.write_object(self.PAGES, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.page_objects)))
+        self.write_object(self.CATALOG, b"<< /Type /Catalog /Pages %d 0 R >>" % self.PAGES)
+        xref = self.f.tell()
+        size = self.next_number
+        self.f.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        for number in range(1, size):
+            self.f.write(b"%010d 00000 n \n" % self.offsets[number])
+        self.f.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, self.CATALOG, xref))
+
+
+class PageWriter:
+    """Lays out headings and table rows top to bottom, handing each full page to the document."""
+
+    def __init__(self, document, title):
+        self.document = document
+        self.title = title
+        self.content = None
+        self.y = 0
+
+    def new_page(self):
+        self.finish_page()
+        self.content = []
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def finish_page(self):
+        if self.content is None:
+            return
+        number = len(self.document.page_objects) + 1
+        self.text(MARGIN, MARGIN / 2, f"{self.title} - page {number}", 7)
+        self.document.add_page("\n".join(self.content).encode("cp1252", errors="replace"))
+        self.content = None
+
+    def room(self, height):
+        """Start a new page unless `height` more points fit on this one."""
+        if self.y - height < MARGIN:
+            self.new_page()
+
+    def text(self, x, y, value, size, bold=False):
+        escaped = value.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        self.content.append(f"BT /{'F2' if bold else 'F1'} {size:g} Tf {x:.2f} {y:.2f} Td ({escaped}) Tj ET")
+
+    def heading(self, value, size, keep_lines=0):
+        """A bold heading, kept on one page with the `keep_lines` rows after it."""
+        self.room(size * 2 + keep_lines * FONT_SIZE * 1.5)
+        self.y -= size * 1.5
+        self.text(MARGIN, self.y, value, size, bold=True)
+        self.y -= size * 0.5
+
+    def table(self, name, frame):
+        """Stream the rows of `frame` as a ruled table, continuing on new pages with the header repeated.
+
+        Rows with no values at all are skipped; the workbook's padding rows for
+        its side tables have no place in a printed table.
+        """
+        headers = [str(column).strip() for column in frame.columns]
+        widths = [text_width(header, FONT_SIZE) * BOLD_FACTOR for header in headers]
+        for i, column in enumerate(frame.columns):
+            values = frame[column]
+            values = values[values.notna()]
+            if not values.empty:
+                widths[i] = max(widths[i], max(text_width(cell_text(value), FONT_SIZE) for value in values.unique()))
+        natural = sum(widths) + 2 * CELL_PADDING * len(widths)
+        scale = min(1.0, (PAGE_WIDTH - 2 * MARGIN) / natural) if natural else 1.0
+        size = FONT_SIZE * scale
+        padding = CELL_PADDING * scale
+        widths = [width * scale + 2 * padding for width in widths]
+        row_height = size * 1.5
+        edges = [MARGIN]
+        for width in widths:
+            edges.append(edges[-1] + width)
+
+        def rule(y, gray=0):
+            self.content.append(f"{gray:g} G {edges[0]:.2f} {y:.2f} m {edges[-1]:.2f} {y:.2f} l S")
+
+        def header():
+            self.y -= row_height
+            for header_text, left, width in zip(headers, edges, widths):
+                self.text(left + (width - text_width(header_text, size) * BOLD_FACTOR) / 2, self.y + size * 0.4,
+                          header_text, size, bold=True)
+            self.content.append("0.5 w")
+            rule(self.y + row_height)
+            rule(self.y)
+            self.content.append("0.2 w")
+
+        self.room(3 * row_height)
+        header()
+        for start in range(0, len(frame), ROW_CHUNK):
+            chunk = frame.iloc[start:start + ROW_CHUNK]
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            for values in chunk.itertuples(index=False, name=None):
+                if all(value is None or value == "" for value in values):
+                    continue
+                if self.y - row_height < MARGIN:
+                    self.new_page()
+                    self.heading(f"{name} (continued)", SUBTITLE_SIZE)
+                    header()
+                self.y -= row_height
+                for value, left, width in zip(values, edges, widths):
+                    if value is None:
+                        continue
+                    value_text = cell_text(value)
+                    if is_number(value):
+                        x = left + width - padding - text_width(value_text, size)
+                    else:
+                        x = left + padding
+                    self.text(x, self.y + size * 0.4, value_text, size)
+                rule(self.y, 0.75)
+        self.y -= row_height / 2
+
+
+def text_width(value, size):
+    """Width in points of `value` set in Helvetica at `size`."""
+    return sum(HELVETICA_WIDTHS.get(char, 556) for char in value) * size / 1000
+
+
+def is_number(value):
+    return isinstance(value, (int, float, Decimal, np.number)) and not isinstance(value, (bool, np.bool_))
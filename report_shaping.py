@@ -0,0 +1,228 @@
+import calendar
+from decimal import Decimal
+
+import pandas as pd
+
+from report_workbook import paying_block, returning_patient_blocks
+
+
+def format_money(x):
+    """An amount as "MWK 1,234.00"; anything else (labels, blanks) unchanged.
+
+    The mysql engine returns DECIMAL sums as Decimal, the columnar one as
+    float, and both must print the same.
+    """
+    return f"MWK {x:,.2f}" if isinstance(x, (int, float, Decimal)) else x
+
+
+def shape_report(results):
+    """Turn the raw section results into the DataFrames and side tables of the consolidated report.
+
+    `results` is what report_sql.fetch_report_results or
+    report_frames.compute_report_results return. The shaped report is a dict
+    consumed by report_sheets.
+    """
+    this_year, this_month, this_week, today = results["registered_patients"]
+    total, paying, non_paying, both = results["paying"]
+
+    # Combine the first part only in DataFrame
+    registered_patients_df = pd.DataFrame({
+        "Metric": ["Registered This Year", "Registered This Month", "Registered This Week", "Registered Today"],
+        "Count": [this_year, this_month, this_week, today]
+    })
+
+    # Counts and sums of every date window
+    window_metrics_df = pd.DataFrame(results["window_metrics"], columns=[
+        "Window", "From", "To", "Registrations", "Orders", "Total Amount Paid", "Total Collected"
+    ])
+    for col in ["From", "To"]:
+        window_metrics_df[col] = window_metrics_df[col].astype(str)
+    for col in ["Total Amount Paid", "Total Collected"]:
+        window_metrics_df[col] = window_metrics_df[col].apply(lambda x: f"MWK {x:,.2f}")
+
+    # 2. Order Entries Analysis
+    order_entries_results = results["order_entries"]
+
+    order_entries_df = pd.DataFrame(order_entries_results, columns=[
+        "  Service ID   ", "Service Name", "   Total Quantity   ", "Total Amount Paid", 
+        "Expected Total Amount Paid", "Patients With Outstanding Balance"
+    ])
+
+    order_entries_df["Total Amount Overdue"] = order_entries_df["Expected Total Amount Paid"] - order_entries_df["Total Amount Paid"]
+
+    total_quantity = order_entries_df["   Total Quantity   "].sum()
+    total_amount_collected = order_entries_df["Total Amount Paid"].sum()
+    total_expected = order_entries_df["Expected Total Amount Paid"].sum()
+    total_overdue = order_entries_df["Total Amount Overdue"].sum()
+    total_patients_balance = order_entries_df["Patients With Outstanding Balance"].sum()
+
+    totals_df = pd.DataFrame([{
+        "Total Amount Paid": total_amount_collected,
+        "Expected Total Amount Paid": total_expected,
+        "Patients With Outstanding Balance": total_patients_balance,
+        "Total Amount Overdue": total_overdue
+    }])
+
+    order_entries_df = pd.concat([order_entries_df, totals_df], ignore_index=True)
+
+    for col in ["Total Amount Paid", "Expected Total Amount Paid", "Total Amount Overdue"]:
+        order_entries_df[col] = order_entries_df[col].apply(format_money)
+
+
+    # 3. Patient Age Groups
+    age_group_results = results["age_groups"]
+
+    age_group_df = pd.DataFrame(age_group_results, columns=["Age Group", "Gender", "Total Patients"])
+    age_group_df["Age Group"] = pd.Categorical(age_group_df["Age Group"], categories=['Under 5', '5-9', '10-14', '15-19', '20-24', 'Other'], ordered=True)
+    age_group_df = age_group_df.sort_values(["Age Group", "Gender"])
+
+
+    # 4. Services Used Per Age Group
+    most_profitable_services_results = results["most_profitable_services"]
+    most_profitable_services_df = pd.DataFrame(most_profitable_services_results, columns=["Age Group", "Service Name", "Total Amount Paid"])
+    most_profitable_services_df["Total Amount Paid"] = most_profitable_services_df["Total Amount Paid"].apply(lambda x: f"MWK {x:,.2f}")
+
+    # 5. Most Popular Services Overall
+    most_popular_services_results = results["most_popular_services"]
+
+    most_popular_services_df = pd.DataFrame(most_popular_services_results, 
+        columns=["Service Name", "Total Quantity", "Total Amount Paid", "Service Price", "Price Type"])
+
+    # 6. Services used per month
+    services_used_results = results["services_used_per_month"]
+
+    services_used_results = [
+        (service_name, year, calendar.month_name[month], services_used) 
+        for service_name, year, month, services_used in services_used_results
+        ]
+    services_used_df = pd.DataFrame(services_used_results, columns=["Service Name", "Year", "Month", "Services Used Per Month"])
+    services_used_df["Month_num"] = services_used_df["Month"].map({month: idx for idx, month in enumerate(calendar.month_name) if month})
+    services_used_df.sort_values(by=["Year", "Month_num"], ascending=[False, False], inplace=True)
+    services_used_df.drop("Month_num", axis=1, inplace=True)
+
+
+    #7. Get distribution of returning patients
+    returning_patients_count = results["returning_patients_count"]
+
+    #8 Patient distribution based on age and gender
+    returning_patients_results = results["returning_patients_distribution"]
+
+    empty_row = pd.DataFrame([[""] * len(order_entries_df.columns)], columns=order_entries_df.columns)
+    for _ in range(1):
+        order_entries_df = pd.concat([order_entries_df, empty_row], ignore_index=True)
+
+    order_entries_df = pd.concat([order_entries_df, pd.DataFrame([{
+        "Service Name": "",
+        "Total Amount Paid": "",
+        "Expected Total Amount Paid": "",
+        "Patients With Outstanding Balance": ""
+    }])], ignore_index=True)
+
+    distribution_data = []
+    for age_category, gender, count in returning_patients_results:
+        distribution_data.append({
+            "Service Name": "",
+            "Total Amount Paid": "",
+            "Expected Total Amount Paid": "",
+            "Patients With Outstanding Balance": ""
+        })
+
+    distribution_df = pd.DataFrame(distribution_data)
+    order_entries_df = pd.concat([order_entries_df, distribution_df], ignore_index=True)
+
+    # Returning patients frequency
+    returning_patients_freq_results = results["returning_patients_frequency"]
+
+    #9. Trend of money made per day
+    result = results["daily_money_trend"]
+    if result:
+        trend_df = pd.DataFrame(result)
+        trend_df.columns = ["Transaction Date", "Total Collected"]
+        trend_df["Transaction Date"] = pd.to_datetime(trend_df["Transaction Date"])
+        trend_df["Total Collected"] = trend_df["Total Collected"].apply(format_money)
+        trend_df["Transaction Date"] = trend_df["Transaction Date"].dt.strftime("%Y-%m-%d")
+    else:
+        trend_df = pd.DataFrame(columns=["Transaction Date", "Total Collected"])
+
+
+    #10. Daily Hospital Patient Visits
+    result = results["hospital_visits"]
+    if result:
+        hospital_visits_df = pd.DataFrame(result)
+        hospital_visits_df.columns = ["Registration Date", "Total Registrations", "Total Returning Patients", "Total Visits"]
+        hospital_visits_df["Registration Date"] = pd.to_datetime(hospital_visits_df["Registration Date"])
+        hospital_visits_df["Registration Date"] = hospital_visits_df["Registration Date"].dt.strftime("%Y-%m-%d")
+    else:
+        hospital_visits_df = pd.DataFrame(columns=["Registration Date", "Total Registrations", "Total Returning Patients", "Total Visits"])
+
+    return {
+        "registered_patients": registered_patients_df,
+        "paying": (total, paying, non_paying, both),
+        "window_metrics": window_metrics_df,
+        "order_entries": order_entries_df,
+        "age_groups": age_group_df,
+        "most_profitable_services": most_profitable_services_df,
+        "most_popular_services": most_popular_services_df,
+        "services_used_per_month": services_used_df,
+        "returning_patients_count": returning_patients_count,
+        "returning_patients_distribution": returning_patients_results,
+        "returning_patients_frequency": returning_patients_freq_results,
+        "daily_money_trend": trend_df,
+        "hospital_visits": hospital_visits_df,
+    }
+
+
+def report_sheets(report, start_date_str, end_date_str):
+    """(sheet name, frame, layout) of every sheet, for report_workbook.write_report_workbook."""
+    order_entries_df = report["order_entries"]
+    return [
+        ("Registered Patients", report["registered_patients"],
+         {"sized_cells": paying_block(*report["paying"])}),
+        ("Window Metrics", report["window_metrics"], None),
+        ("Order Entries", order_entries_df,
+         returning_patient_blocks(len(order_entries_df), report["returning_patients_distribution"],
+                                  report["returning_patients_frequency"], start_date_str, end_date_str)),
+        ("Registered Patient Age Groups", report["age_groups"], None),
+        ("Service Profits By Age Group", report["most_profitable_services"], None),
+        ("Popular Services", report["most_popular_services"], None),
+        ("Services Used Per Month", report["services_used_per_month"], None),
+        ("Daily Money Trend", report["daily_money_trend"], None),
+        ("Daily Hospital Patient Visits", report["hospital_visits"], None),
+    ]
+
+
+def report_pdf_sections(report, start_date_str, end_date_str):
+    """(name, frame, side tables) of every sheet of report_sheets, for report_pdf.write_report_pdf.
+
+    The side tables the workbook lays beside or below a sheet's frame become
+    frames of their own here.
+    """
+    total, paying, non_paying, both = report["paying"]
+    paying_df = pd.DataFrame({
+        "Patients": ["Total Patients", "Exclusively Paying Patients", "Exclusively Non-Paying Patients",
+                     "Patients in Both Categories"],
+        "Count": [total, paying, non_paying, both],
+    })
+
+    distribution = report["returning_patients_distribution"]
+    distribution_df = pd.DataFrame(
+        [(f"{age_category} ({gender})", count) for age_category, gender, count in distribution]
+        + [("Total Patients", sum(count for _, _, count in distribution))],
+        columns=["Distribution", "Count"])
+
+    frequency = report["returning_patients_frequency"]
+    frequency_df = pd.DataFrame(
+        [(str(visits), patient_count) for visits, patient_count in frequency]
+        + [("Patients With More Visits", sum(patient_count for _, patient_count in frequency))],
+        columns=["Number of Visits", "Number of Patients"])
+
+    side_tables = {
+        "Registered Patients": [("Paying vs. Non-Paying Patients", paying_df)],
+        "Order Entries": [
+            (f"Returning Patients Distribution · {start_date_str} to {end_date_str}", distribution_df),
+            ("Frequency of The Returning Patients", frequency_df),
+        ],
+    }
+    return [(name, frame, side_tables.get(name, []))
+            for name, frame, _ in report_sheets(report, start_date_str, end_date_str)]
+
@@ -0,0 +1,476 @@
+import time
+from decimal import Decimal
+
+import pandas as pd
+
+from cursor_frames import iter_frames, fetch_frame, FETCH_BATCH_SIZE
+from demographics import demographics_query, DEMOGRAPHICS_COLUMNS, patient_demographics
+from report_frames import (order_entry_dimensions, order_entry_partials, combine_partials,
+                           combine_order_entry_partials, registration_age_groups, returning_patient_results,
+                           daily_visit_results, report_window, same_rows)
+from report_tasks import run_tasks
+from report_windows import metric_windows, windowed_queries, fetch_window_metrics, registered_patients
+
+# Paying vs Non-Paying Query
+paying_query = """
+SELECT
+    COUNT(*) AS total_patients,
+    SUM(CASE WHEN paying_orders > 0 AND non_paying_orders = 0 THEN 1 ELSE 0 END) AS exclusively_paying,
+    SUM(CASE WHEN non_paying_orders > 0 AND paying_orders = 0 THEN 1 ELSE 0 END) AS exclusively_non_paying,
+    SUM(CASE WHEN paying_orders > 0 AND non_paying_orders > 0 THEN 1 ELSE 0 END) AS both_categories
+FROM (
+    SELECT
+        patient_id,
+        SUM(CASE WHEN full_price >= 1000 THEN 1 ELSE 0 END) AS paying_orders,
+        SUM(CASE WHEN full_price = 0 THEN 1 ELSE 0 END) AS non_paying_orders
+    FROM order_entries
+    WHERE order_date >= %s AND order_date < %s
+    GROUP BY patient_id
+) AS patient_summary;
+"""
+
+# 2. Order Entries Analysis
+order_entries_query = """
+    SELECT s.service_id,
+           s.name AS service_name,
+           SUM(oe.quantity) AS total_quantity,
+           SUM(oe.amount_paid) AS total_amount_paid,
+           SUM(oe.quantity * sp.price) AS expected_total_amount_paid,
+           COUNT(DISTINCT CASE WHEN oe.amount_paid < oe.full_price THEN oe.patient_id END) AS patients_with_balance
+    FROM order_entries oe
+    JOIN services s ON oe.service_id = s.service_id
+    JOIN service_prices sp ON oe.service_id = sp.service_id AND sp.voided = 0
+    WHERE oe.voided = 0
+    GROUP BY s.service_id, s.name;
+"""
+
+# 4. Services Used Per Age Group (the per-query twin of the "service_age_groups"
+# bucket scheme; the single-pass scan buckets the demographics dimension instead)
+most_profitable_services_query = """
+    SELECT
+        CASE
+            WHEN TIMESTAMPDIFF(YEAR, p.birthdate, CURDATE()) < 5 THEN 'Under 5'
+            WHEN TIMESTAMPDIFF(YEAR, p.birthdate, CURDATE()) BETWEEN 5 AND 17 THEN '5-17'
+            WHEN TIMESTAMPDIFF(YEAR, p.birthdate, CURDATE()) BETWEEN 18 AND 35 THEN '18-35'
+            WHEN TIMESTAMPDIFF(YEAR, p.birthdate, CURDATE()) BETWEEN 36 AND 50 THEN '36-50'
+            WHEN TIMESTAMPDIFF(YEAR, p.birthdate, CURDATE()) > 50 THEN 'Above 50'
+            ELSE 'Unknown'
+        END AS age_group,
+        s.name AS service_name,
+        SUM(oe.amount_paid) AS total_amount_paid
+    FROM order_entries oe
+    JOIN services s ON oe.service_id = s.service_id
+    JOIN patient pt ON oe.patient_id = pt.patient_id
+    JOIN person p ON pt.patient_id = p.person_id
+    WHERE oe.voided = 0
+    GROUP BY age_group, service_name
+    ORDER BY total_amount_paid DESC;
+"""
+
+# 5. Most Popular Services Overall
+most_popular_services_query = """
+    SELECT
+        s.name AS service_name,
+        SUM(oe.quantity) AS total_quantity,
+        SUM(oe.amount_paid) AS total_amount_paid,
+        sp.price AS service_price,
+        sp.price_type AS price_type
+    FROM order_entries oe
+    JOIN services s ON oe.service_id = s.service_id
+    JOIN service_prices sp ON s.service_id = sp.service_id AND sp.voided = 0
+    WHERE oe.voided = 0
+    GROUP BY service_name, sp.price, sp.price_type
+    ORDER BY total_quantity DESC;
+"""
+
+# 6. Services used per month
+services_used_per_month_query = """
+    SELECT
+        s.name AS service_name,
+        YEAR(oe.order_date) AS year,
+        MONTH(oe.order_date) AS month,
+        COUNT(*) AS services_used_per_month
+    FROM order_entries oe
+    JOIN services s ON oe.service_id = s.service_id
+    WHERE oe.voided = 0
+    GROUP BY service_name, year, month
+    ORDER BY year DESC, month DESC;
+"""
+
+#9. Trend of money made per day
+trend_query = """
+    SELECT
+        DATE(created_at) AS transaction_date,
+        SUM(full_price) AS total_collected
+    FROM order_entries
+    WHERE cashier IN ('1','8', '9')
+    AND created_at >= %s AND created_at < %s
+    GROUP BY transaction_date
+    ORDER BY transaction_date;
+"""
+
+# Receipts stage: receipt counts per (day, patient) in the window. Sections 7,
+# 8 (with the demographics dimension), the returning-patient frequency and the
+# returning half of section 10 are all derived from this one result.
+receipt_visits_query = """
+    SELECT
+        DATE(payment_stamp) AS visit_date,
+        patient_id,
+        COUNT(*) AS visits,
+        COUNT(receipt_number) AS receipt_count
+    FROM receipts
+    WHERE payment_stamp >= %s AND payment_stamp < %s
+    GROUP BY visit_date, patient_id;
+"""
+RECEIPT_VISIT_COLUMNS = {"visit_date": "datetime", "patient_id": "int", "visits": "int", "receipt_count": "int"}
+
+#10. Daily registrations, joined to the daily returning patients in pandas
+daily_registrations_query = """
+    SELECT DATE(date_created) AS registration_date, COUNT(*) AS total_registrations
+    FROM patient
+    WHERE date_created >= %s AND date_created < %s
+    GROUP BY registration_date
+    ORDER BY registration_date;
+"""
+
+# Per-day aggregates for the rollup store (see rollup_store.refresh_rollups),
+# each for the days from a bound start day on.
+rollup_queries = {
+    "daily_collections": """
+        SELECT DATE(created_at) AS day, cashier, SUM(full_price) AS total_collected
+        FROM order_entries
+        WHERE created_at >= %s
+        GROUP BY day, cashier;
+    """,
+    "daily_registrations": """
+        SELECT DATE(date_created) AS day, COUNT(*) AS registrations
+        FROM patient
+        WHERE date_created >= %s
+        GROUP BY day;
+    """,
+    "daily_returning": """
+        SELECT visit_date AS day, COUNT(*) AS returning_patients
+        FROM (
+            SELECT DATE(payment_stamp) AS visit_date, patient_id
+            FROM receipts
+            WHERE payment_stamp >= %s AND patient_id IS NOT NULL
+            GROUP BY visit_date, patient_id
+            HAVING COUNT(*) > 1
+        ) AS returning_visits
+        GROUP BY visit_date;
+    """,
+    "daily_service_usage": """
+        SELECT DATE(oe.order_date) AS day, s.name AS service_name, COUNT(*) AS services_used
+        FROM order_entries oe
+        JOIN services s ON oe.service_id = s.service_id
+        WHERE oe.voided = 0 AND oe.order_date >= %s
+        GROUP BY day, service_name;
+    """,
+}
+# Lower bound standing in for "all history" (the smallest MySQL DATETIME).
+FIRST_DAY = "1000-01-01 00:00:00"
+
+# Sections 2, 4, 5, 6 and 9 each scan order_entries; see fetch_order_entry_results.
+ORDER_ENTRY_SECTIONS = ["order_entries", "most_profitable_services", "most_popular_services",
+                        "services_used_per_month", "daily_money_trend"]
+
+# Single-pass order_entries scan: every non-voided row, plus the (possibly voided)
+# cashier rows of the money trend window.
+order_entries_scan_query = """
+    SELECT patient_id, service_id, quantity, amount_paid, full_price,
+           voided, order_date, created_at, cashier
+    FROM order_entries
+    WHERE voided = 0
+       OR (cashier IN ('1','8', '9') AND created_at >= %s AND created_at < %s);
+"""
+# The same scan when the money trend comes from the rollup store: no voided rows.
+order_entries_live_scan_query = """
+    SELECT patient_id, service_id, quantity, amount_paid, full_price,
+           voided, order_date, created_at, cashier
+    FROM order_entries
+    WHERE voided = 0;
+"""
+services_dimension_query = "SELECT service_id, name FROM services;"
+service_prices_dimension_query = "SELECT service_id, price, price_type, voided FROM service_prices WHERE voided = 0;"
+# Column kinds of the fetched detail results, see cursor_frames.typed_column.
+# cashier is a VARCHAR holding user ids (hence the IN ('1','8','9') above).
+ORDER_ENTRY_SCAN_COLUMNS = {"patient_id": "int", "service_id": "int", "quantity": "float", "amount_paid": "float",
+                            "full_price": "float", "voided": "int", "order_date": "datetime",
+                            "created_at": "datetime", "cashier": "category"}
+SERVICES_COLUMNS = {"service_id": "int", "name": "category"}
+SERVICE_PRICES_COLUMNS = {"service_id": "int", "price": "float", "price_type": "category", "voided": "int"}
+
+# Covering indexes for the report predicates, added after restore by create_report_indexes.
+REPORT_INDEXES = {
+    "patient": [
+        ("idx_report_patient_voided_created", ["voided", "date_created"]),
+        ("idx_report_patient_created", ["date_created"]),
+    ],
+    "person": [
+        ("idx_report_person_demographics", ["person_id", "birthdate", "gender"]),
+    ],
+    "receipts": [
+        ("idx_report_receipts_stamp_patient", ["payment_stamp", "patient_id", "receipt_number"]),
+    ],
+    "order_entries": [
+        ("idx_report_oe_voided_service",
+         ["voided", "service_id", "patient_id", "quantity", "amount_paid", "full_price"]),
+        ("idx_report_oe_order_date", ["order_date", "patient_id", "full_price"]),
+        ("idx_report_oe_cashier_created", ["cashier", "created_at", "full_price"]),
+    ],
+    "service_prices": [
+        ("idx_report_sp_service_voided", ["service_id", "voided", "price"]),
+    ],
+}
+
+
+def window_params(start_date_str, end_date_str):
+    """Bound parameters for the half-open report window `>= start AND < day after end`."""
+    return tuple(t.strftime("%Y-%m-%d %H:%M:%S") for t in report_window(start_date_str, end_date_str))
+
+
+def report_statements(start_date_str, end_date_str):
+    """(name, query, params) of every report statement, for EXPLAIN."""
+    window = window_params(start_date_str, end_date_str)
+    windowed = windowed_queries(metric_windows(pd.Timestamp(end_date_str)))
+    return [
+        *((f"window_metrics:{table}", query, params) for table, (query, params) in windowed.items()),
+        ("paying", paying_query, window),
+        ("demographics", demographics_query, ()),
+        ("order_entries", order_entries_query, ()),
+        ("most_profitable_services", most_profitable_services_query, ()),
+        ("most_popular_services", most_popular_services_query, ()),
+        ("services_used_per_month", services_used_per_month_query, ()),
+        ("daily_money_trend", trend_query, window),
+        ("receipt_visits", receipt_visits_query, window),
+        ("daily_registrations", daily_registrations_query, window),
+        ("order_entries_scan", order_entries_scan_query, window),
+        ("order_entries_live_scan", order_entries_live_scan_query, ()),
+    ]
+
+
+def create_report_indexes(cursor, database):
+    """Add whichever REPORT_INDEXES the restored tables do not have yet.
+
+    A re-restored table comes back with only the dump's own indexes, so this
+    checks information_schema every run and adds the missing ones with one
+    ALTER TABLE per table.
+    """
+    for table, indexes in REPORT_INDEXES.items():
+        cursor.execute(
+            "SELECT DISTINCT index_name FROM information_schema.statistics "
+            "WHERE table_schema = %s AND table_name = %s",
+            (database, table),
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [(name, columns) for name, columns in indexes if name not in existing]
+        if not missing:
+            continue
+        clauses = ", ".join(f"ADD INDEX {name} ({', '.join(columns)})" for name, columns in missing)
+        started = time.monotonic()
+        cursor.execute(f"ALTER TABLE {table} {clauses}")
+        print(f"Indexed {table}: {', '.join(name for name, _ in missing)} ({time.monotonic() - started:.1f} s)")
+
+
+def explain_report_queries(cursor, start_date_str, end_date_str, label):
+    """Print the EXPLAIN plan of every report statement, flagging full table scans."""
+    print(f"EXPLAIN plans {label}:")
+    full_scans = 0
+    for name, query, params in report_statements(start_date_str, end_date_str):
+        cursor.execute("EXPLAIN " + query.strip().rstrip(";"), params)
+        columns = [column[0] for column in cursor.description]
+        for row in cursor.fetchall():
+            plan = dict(zip(columns, row))
+            flag = ""
+            if plan.get("type") == "ALL":
+                flag = "  <- full scan"
+                full_scans += 1
+            print(f"  {name:<26} {str(plan.get('table')):<22} type={plan.get('type')} "
+                  f"key={plan.get('key')} rows={plan.get('rows')}{flag}")
+    print(f"  {full_scans} full table scan(s)")
+
+
+def fetch_demographics(conn, current_date):
+    """The demographics dimension (see demographics.patient_demographics), read with one join."""
+    cursor = conn.cursor(buffered=False)
+    people = fetch_frame(cursor, demographics_query, (), DEMOGRAPHICS_COLUMNS)
+    cursor.close()
+    return patient_demographics(people, pd.Timestamp(current_date).normalize())
+
+
+def fetch_order_entry_results(conn, current_date, start_date_str, end_date_str, demographics=None,
+                              batch_size=FETCH_BATCH_SIZE, skip=()):
+    """Compute ORDER_ENTRY_SECTIONS from one streamed scan of order_entries.
+
+    The service and price dimensions are read once (and the demographics
+    dimension too, unless it is passed in), then order_entries rows are
+    pulled from an unbuffered cursor `batch_size` at a time as typed frames
+    and folded into additive partial aggregates with vectorized pandas, so
+    memory stays bounded by one batch plus the running partials (grouped
+    totals and the distinct balance patients) rather than the table.
+    Sections in `skip` are not computed.
+    """
+    window_start, window_end = report_window(start_date_str, end_date_str)
+
+    cursor = conn.cursor(buffered=False)
+    services = fetch_frame(cursor, services_dimension_query, (), SERVICES_COLUMNS)
+    service_prices = fetch_frame(cursor, service_prices_dimension_query, (), SERVICE_PRICES_COLUMNS)
+    cursor.close()
+    if demographics is None:
+        demographics = fetch_demographics(conn, current_date)
+    dimensions = order_entry_dimensions(services, service_prices, demographics)
+
+    partials = []
+    cursor = conn.cursor(buffered=False)
+    if "daily_money_trend" in skip:
+        cursor.execute(order_entries_live_scan_query)
+    else:
+        cursor.execute(order_entries_scan_query, window_params(start_date_str, end_date_str))
+    for orders in iter_frames(cursor, ORDER_ENTRY_SCAN_COLUMNS, batch_size):
+        partials.append(order_entry_partials(orders, dimensions, window_start, window_end, skip))
+        if len(partials) > 1:
+            partials = [combine_partials(partials)]
+    cursor.close()
+
+    if not partials:
+        return {section: [] for section in ORDER_ENTRY_SECTIONS if section not in skip}
+    return combine_order_entry_partials(partials)
+
+
+def fetch_rollup_days(conn, rollup, since):
+    """Rows of one rollup_queries aggregate for the days from `since` (a date) on, or all history if None."""
+    cursor = conn.cursor()
+    cursor.execute(rollup_queries[rollup], (f"{since} 00:00:00" if since else FIRST_DAY,))
+    rows = [tuple(float(value) if isinstance(value, Decimal) else value for value in row)
+            for row in cursor.fetchall()]
+    cursor.close()
+    if rollup == "daily_collections":
+        rows = [(day, None if cashier is None else str(cashier), total) for day, cashier, total in rows]
+    return rows
+
+
+def report_task_graph(pool, current_date, start_date_str, end_date_str, order_entries_scan="single", skip=(),
+                      windows=None):
+    """The report as named tasks with their dependencies, for report_tasks.run_tasks.
+
+    Every SQL task borrows its own connection from `pool`, so independent
+    sections run concurrently; the pandas-only tasks wait for the receipts
+    stage they derive from. `order_entries_scan` picks the single-pass scan,
+    the per-query sections, or both ("compare"). Sections named in `skip`
+    (answered elsewhere, e.g. from the rollup store) get no task of their own.
+    `windows` are the report_windows.metric_windows of the window metrics.
+    """
+    window = window_params(start_date_str, end_date_str)
+    now = pd.Timestamp(current_date)
+    windows = windows or metric_windows(current_date)
+
+    def query(sql, params=(), fetch="all", columns=None):
+        """A task running `sql` on a pooled connection; with `columns` it returns a typed DataFrame."""
+        def task(inputs):
+            conn = pool.get_connection()
+            try:
+                # Each statement runs once per report, and the pool resets the session
+                # (dropping prepared statements) when a connection goes back, so a
+                # server-side prepare would only add a round trip.
+                cursor = conn.cursor()
+                if columns:
+                    rows = fetch_frame(cursor, sql, params, columns)
+                else:
+                    cursor.execute(sql, params)
+                    rows = cursor.fetchone() if fetch == "one" else cursor.fetchall()
+                cursor.close()
+            finally:
+                conn.close()
+            return rows
+        return task, []
+
+    def window_metrics(inputs):
+        conn = pool.get_connection()
+        try:
+            return fetch_window_metrics(conn, windows)
+        finally:
+            conn.close()
+
+    def demographics(inputs):
+        conn = pool.get_connection()
+        try:
+            return fetch_demographics(conn, current_date)
+        finally:
+            conn.close()
+
+    def order_entries_single_pass(inputs):
+        conn = pool.get_connection()
+        try:
+            return fetch_order_entry_results(conn, current_date, start_date_str, end_date_str,
+                                             inputs["demographics"], skip=skip)
+        finally:
+            conn.close()
+
+    def hospital_visits(inputs):
+        registrations = pd.DataFrame(inputs["daily_registrations"],
+                                     columns=["registration_date", "total_registrations"])
+        return daily_visit_results(registrations.set_index("registration_date")["total_registrations"],
+                                   inputs["receipt_visits"])
+
+    tasks = {
+        # 1 and the window metrics: one conditional-aggregation scan per table.
+        "window_metrics": (window_metrics, []),
+        "registered_patients": (lambda inputs: registered_patients(inputs["window_metrics"]), ["window_metrics"]),
+        "paying": query(paying_query, window, fetch="one"),
+        # 3, 4 and 8 bucket the ages of one demographics dimension.
+        "demographics": (demographics, []),
+        "age_groups": (lambda inputs: registration_age_groups(inputs["demographics"], now), ["demographics"]),
+        # 7, 8, returning frequency and 10 all derive from one receipts scan.
+        "receipt_visits": query(receipt_visits_query, window, columns=RECEIPT_VISIT_COLUMNS),
+        "returning_patients": (lambda inputs: returning_patient_results(inputs["receipt_visits"],
+                                                                        inputs["demographics"]),
+                               ["receipt_visits", "demographics"]),
+    }
+    if "hospital_visits" not in skip:
+        tasks["daily_registrations"] = query(daily_registrations_query, window)
+        tasks["hospital_visits"] = (hospital_visits, ["daily_registrations", "receipt_visits"])
+    if order_entries_scan != "single":
+        section_queries = {
+            "order_entries": query(order_entries_query),
+            "most_profitable_services": query(most_profitable_services_query),
+            "most_popular_services": query(most_popular_services_query),
+            "services_used_per_month": query(services_used_per_month_query),
+            "daily_money_trend": query(trend_query, window),
+        }
+        tasks.update({section: task for section, task in section_queries.items() if section not in skip})
+    if order_entries_scan != "per-query":
+        tasks["order_entries_single_pass"] = (order_entries_single_pass, ["demographics"])
+    return tasks
+
+
+def fetch_report_results(pool, current_date, start_date_str, end_date_str, order_entries_scan="single", workers=4,
+                         skip=(), run_log=None, windows=None):
+    """Run the report tasks over a connection pool and return the raw rows by section name.
+
+    Single-value sections hold a tuple, the rest a list of row tuples, exactly
+    as the cursor returned them. All date windows are bound half-open ranges,
+    so every window predicate can use an index. In "compare" mode the single-pass order_entries results are checked
+    against the per-query ones, which are the ones returned. Sections in
+    `skip` are left out of the results. `run_log` records a span per task.
+    `windows` adds date windows to the window metrics (see report_windows).
+    """
+    tasks = report_task_graph(pool, current_date, start_date_str, end_date_str, order_entries_scan, skip, windows)
+    done = run_tasks(tasks, workers, run_log)
+
+    results = {name: done[name] for name in ["registered_patients", "window_metrics", "paying", "age_groups",
+                                             "hospital_visits"]
+               if name in done}
+    results.update(done["returning_patients"])
+    if order_entries_scan == "single":
+        results.update(done["order_entries_single_pass"])
+    else:
+        results.update({section: done[section] for section in ORDER_ENTRY_SECTIONS if section in done})
+    for section in skip:
+        results.pop(section, None)
+    if order_entries_scan == "compare":
+        for section in ORDER_ENTRY_SECTIONS:
+            if section in skip:
+                continue
+            status = "match" if same_rows(done[section], done["order_entries_single_pass"][section]) else "DIFFER"
+            print(f"Single-pass vs per-query {section}: {status}")
+    return results
@@ -0,0 +1,48 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+
+def run_tasks(tasks, workers, run_log=None):
+    """Run named tasks on a thread pool, each as soon as its dependencies are done.
+
+    `tasks` maps a name to (function, dependencies); the function is called
+    with a dict of its dependencies' results. Returns every task's result by
+    name and prints each task's wall time as it finishes. The first failing
+    task's exception is re-raised once the tasks already running complete.
+    With a run_metrics.RunLog each task is also recorded as a "section:" span.
+    """
+    pending = dict(tasks)
+    results = {}
+    running = {}
+    started = time.monotonic()
+
+    def timed(name, function, inputs):
+        task_started = time.monotonic()
+        if run_log is None:
+            return function(inputs), time.monotonic() - task_started
+        with run_log.span(f"section:{name}") as span:
+            result = function(inputs)
+            if isinstance(result, (list, pd.DataFrame)):
+                span["rows"] = len(result)
+        return result, time.monotonic() - task_started
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for name, (function, dependencies) in list(pending.items()):
+                if all(dependency in results for dependency in dependencies):
+                    inputs = {dependency: results[dependency] for dependency in dependencies}
+                    running[pool.submit(timed, name, function, inputs)] = name
+                    del pending[name]
+            if not running:
+                raise ValueError(f"Tasks with unresolvable dependencies: {', '.join(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name], seconds = future.result()
+                print(f"  {name:<32} {seconds:7.2f} s")
+
+    print(f"Report queries finished in {time.monotonic() - started:.2f} s")
+    return results
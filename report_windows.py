@@ -0,0 +1,145 @@
+import re
+
+import pandas as pd
+
+# Calendar periods to date, each ending with today.
+NAMED_WINDOWS = ["today", "week", "month", "quarter", "year"]
+# Section 1 reports registrations for these, in this order.
+REGISTRATION_WINDOWS = ["year", "month", "week", "today"]
+CUSTOM_WINDOW = re.compile(r"^(?P<label>[^=]+)=(?P<start>\d{4}-\d{2}-\d{2}):(?P<end>\d{4}-\d{2}-\d{2})$")
+
+# Row conditions of the measures, as SQL and as a pandas mask.
+ROW_FILTERS = {
+    "live": ("voided = 0", lambda frame: frame["voided"] == 0),
+    "cashier": ("cashier IN ('1','8', '9')", lambda frame: frame["cashier"].astype("string").isin(["1", "8", "9"])),
+}
+# measure -> (table, date column, row filter, summed column or None to count rows).
+# Every measure of a table is computed for every window in one scan of the table.
+WINDOW_MEASURES = {
+    "registrations": ("patient", "date_created", "live", None),
+    "orders": ("order_entries", "order_date", "live", None),
+    "amount_paid": ("order_entries", "order_date", "live", "amount_paid"),
+    "collected": ("order_entries", "created_at", "cashier", "full_price"),
+}
+WINDOW_METRIC_COLUMNS = ["window", "start_date", "end_date", *WINDOW_MEASURES]
+
+
+def named_window(name, current_date):
+    """The half-open [start, tomorrow) range of a NAMED_WINDOWS period to date."""
+    today = pd.Timestamp(current_date).normalize()
+    starts = {
+        "today": today,
+        "week": today - pd.Timedelta(days=today.weekday()),
+        "month": today.replace(day=1),
+        "quarter": today.replace(month=3 * ((today.month - 1) // 3) + 1, day=1),
+        "year": today.replace(month=1, day=1),
+    }
+    if name not in starts:
+        raise ValueError(f"Unknown window {name}; expected one of {', '.join(NAMED_WINDOWS)} or LABEL=START:END")
+    return starts[name], today + pd.Timedelta(days=1)
+
+
+def parse_window(text, current_date):
+    """(label, start, end) of a named window, or of LABEL=YYYY-MM-DD:YYYY-MM-DD with both days included."""
+    match = CUSTOM_WINDOW.match(text)
+    if match is None:
+        return (text, *named_window(text, current_date))
+    start, end = pd.Timestamp(match["start"]), pd.Timestamp(match["end"]) + pd.Timedelta(days=1)
+    if end <= start:
+        raise ValueError(f"Window {text} ends before it starts")
+    return match["label"], start, end
+
+
+def metric_windows(current_date, windows=()):
+    """{label: (start, end)} of REGISTRATION_WINDOWS followed by `windows` (names or custom ranges).
+
+    A label given twice must name the same range, so a custom window can
+    never replace a named one (section 1 reads its registrations by label).
+    """
+    metric_ranges = {}
+    for text in [*REGISTRATION_WINDOWS, *windows]:
+        label, start, end = parse_window(text, current_date)
+        if metric_ranges.setdefault(label, (start, end)) != (start, end):
+            raise ValueError(f"Window {text} reuses the label {label}; choose another label")
+    return metric_ranges
+
+
+def window_metric_rows(windows, totals):
+    """Rows of WINDOW_METRIC_COLUMNS from {measure: [total per window]}."""
+    return [
+        (label, start.date(), (end - pd.Timedelta(days=1)).date(),
+         *(totals[measure][i] for measure in WINDOW_MEASURES))
+        for i, (label, (start, end)) in enumerate(windows.items())
+    ]
+
+
+def registered_patients(window_metrics):
+    """Section 1's (this_year, this_month, this_week, today) from the window metric rows."""
+    registrations = {row[0]: row[WINDOW_METRIC_COLUMNS.index("registrations")] for row in window_metrics}
+    return tuple(registrations[label] for label in REGISTRATION_WINDOWS)
+
+
+def windowed_queries(windows):
+    """{table: (query, params)}: one conditional-aggregation scan per table for every measure and window.
+
+    Each SUM(CASE ...) column is a (measure, window) pair, in WINDOW_MEASURES
+    order then window order; the WHERE clause bounds the scan to the span of
+    all windows so the date indexes can be used.
+    """
+    span_start = min(start for start, _ in windows.values())
+    span_end = max(end for _, end in windows.values())
+    queries = {}
+    for table in dict.fromkeys(table for table, _, _, _ in WINDOW_MEASURES.values()):
+        columns, params = [], []
+        date_columns = []
+        for measure, (measure_table, date_column, row_filter, column) in WINDOW_MEASURES.items():
+            if measure_table != table:
+                continue
+            date_columns.append(date_column)
+            for start, end in windows.values():
+                columns.append(f"SUM(CASE WHEN {ROW_FILTERS[row_filter][0]} AND {date_column} >= %s "
+                               f"AND {date_column} < %s THEN {column or 1} ELSE 0 END)")
+                params += [sql_datetime(start), sql_datetime(end)]
+        bounds = " OR ".join(f"({column} >= %s AND {column} < %s)" for column in dict.fromkeys(date_columns))
+        for _ in dict.fromkeys(date_columns):
+            params += [sql_datetime(span_start), sql_datetime(span_end)]
+        queries[table] = (f"SELECT {', '.join(columns)} FROM {table} WHERE {bounds};", tuple(params))
+    return queries
+
+
+def fetch_window_metrics(conn, windows):
+    """Window metric rows from MySQL, one scan of patient and one of order_entries."""
+    totals = {}
+    cursor = conn.cursor()
+    for table, (query, params) in windowed_queries(windows).items():
+        cursor.execute(query, params)
+        values = iter(cursor.fetchone())
+        for measure, (measure_table, _, _, column) in WINDOW_MEASURES.items():
+            if measure_table == table:
+                cast = float if column else int
+                totals[measure] = [cast(next(values) or 0) for _ in windows]
+    cursor.close()
+    return window_metric_rows(windows, totals)
+
+
+def window_metrics(frames, windows):
+    """Window metric rows from snapshot frames; the twin of fetch_window_metrics.
+
+    Each measure is summed into a per-day histogram in one pass over its
+    table, and every window is then a slice of that histogram.
+    """
+    totals = {}
+    for measure, (table, date_column, row_filter, column) in WINDOW_MEASURES.items():
+        frame = frames[table]
+        frame = frame[ROW_FILTERS[row_filter][1](frame)]
+        values = frame[column].fillna(0) if column else pd.Series(1, index=frame.index)
+        daily = values.groupby(frame[date_column].dt.normalize()).sum().sort_index()
+        cast = float if column else int
+        totals[measure] = [cast(daily[(daily.index >= start) & (daily.index < end)].sum())
+                           for start, end in windows.values()]
+    return window_metric_rows(windows, totals)
+
+
+def sql_datetime(timestamp):
+    """Bound-parameter text of a Timestamp."""
+    return timestamp.strftime("%Y-%m-%d %H:%M:%S")
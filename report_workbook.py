@@ -0,0 +1,208 @@
+from decimal import Decimal
+
+import numpy as np
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.cell_range import CellRange
+
+# Row 1 of every sheet is its title, row 2 the column headers, data starts at row 3.
+FIRST_DATA_ROW = 3
+TITLE_FONT = Font(bold=True, size=14)
+THIN = Side(style="thin")
+HEADER_STYLE = {
+    "font": Font(bold=True),
+    "border": Border(left=THIN, right=THIN, top=THIN, bottom=THIN),
+    "alignment": Alignment(horizontal="center", vertical="top"),
+}
+CENTER = Alignment(horizontal="center", vertical="center")
+LEFT = Alignment(horizontal="left", vertical="center")
+ROW_CHUNK = 10_000
+
+
+def write_report_workbook(path, sheets, password=None):
+    """Write the consolidated report workbook in a single streaming pass.
+
+    `sheets` is a list of (name, frame, layout). Every sheet gets its name as
+    a merged title row, then the frame's header and rows, with the cells of
+    `layout` laid over them (see paying_block and returning_patient_blocks).
+    Column widths are worked out from the frames before any row is written,
+    so rows go straight to disk and only the small layout blocks are held in
+    memory. Each sheet is protected with `password` when one is given.
+    """
+    wb = Workbook(write_only=True)
+    for name, frame, layout in sheets:
+        write_sheet(wb.create_sheet(name), frame, layout or {}, password)
+    wb.save(path)
+
+
+def write_sheet(ws, frame, layout, password=None):
+    """Stream one sheet; see write_report_workbook for the layout."""
+    cells = {}
+    for key, spec in list(layout.get("sized_cells", {}).items()) + list(layout.get("cells", {}).items()):
+        cells.setdefault(key, {}).update(spec)
+    columns_by_row = {}
+    for row, column in cells:
+        columns_by_row.setdefault(row, []).append(column)
+
+    # "sized_cells" count towards the column widths and the title span, the
+    # blocks in "cells" sit inside the columns the frame already sizes.
+    sized = layout.get("sized_cells", {})
+    last_column = max([len(frame.columns)] + [column for _, column in sized])
+    widths = [0] * last_column
+    widths[0] = len(ws.title)
+    for i, column in enumerate(frame.columns):
+        widths[i] = max(widths[i], text_width(frame[column]), len(str(column)))
+    for (_, column), spec in sized.items():
+        if spec.get("value"):
+            widths[column - 1] = max(widths[column - 1], len(cell_text(spec["value"])))
+    for i, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = width + 2
+
+    merges = [(1, 1, last_column)] + list(layout.get("merges", []))
+    merged_away = set()
+    for row, first_column, end_column in merges:
+        ws.merged_cells.add(CellRange(min_row=row, min_col=first_column, max_row=row, max_col=end_column))
+        merged_away.update((row, column) for column in range(first_column + 1, end_column + 1))
+    for row, height in layout.get("row_heights", {}).items():
+        ws.row_dimensions[row].height = height
+
+    def styled(row_number, values):
+        """Apply the layout cells of one row to its frame values."""
+        columns = columns_by_row.get(row_number)
+        if not columns:
+            return values
+        values = list(values) + [None] * (max(columns) - len(values))
+        for column in columns:
+            spec = cells[(row_number, column)]
+            cell = WriteOnlyCell(ws, value=spec.get("value", values[column - 1]))
+            if "font" in spec:
+                cell.font = spec["font"]
+            if "alignment" in spec:
+                cell.alignment = spec["alignment"]
+            values[column - 1] = cell
+        return values
+
+    def without_merged(row_number, values):
+        if not merged_away:
+            return values
+        return [None if (row_number, column) in merged_away else value
+                for column, value in enumerate(values, start=1)]
+
+    title = WriteOnlyCell(ws, value=ws.title)
+    title.font = TITLE_FONT
+    ws.append(styled(1, [title]))
+
+    header = []
+    for column in frame.columns:
+        cell = WriteOnlyCell(ws, value=column)
+        cell.font, cell.border, cell.alignment = (
+            HEADER_STYLE["font"], HEADER_STYLE["border"], HEADER_STYLE["alignment"])
+        header.append(cell)
+    ws.append(without_merged(2, styled(2, header)))
+
+    row_number = FIRST_DATA_ROW
+    for start in range(0, len(frame), ROW_CHUNK):
+        chunk = frame.iloc[start:start + ROW_CHUNK]
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        for values in chunk.itertuples(index=False, name=None):
+            ws.append(without_merged(row_number, styled(row_number, values)))
+            row_number += 1
+
+    last_row = max(list(columns_by_row) + [row_number - 1])
+    for row in range(row_number, last_row + 1):
+        ws.append(without_merged(row, styled(row, [])))
+
+    if password:
+        ws.protection.sheet = True
+        ws.protection.password = password
+
+
+def paying_block(total, paying, non_paying, both, start_row=2, start_col=4):
+    """The "Paying vs. Non-Paying Patients" table beside the registered patient counts."""
+    rows = [
+        ("Total Patients", total),
+        ("Exclusively Paying Patients", paying),
+        ("Exclusively Non-Paying Patients", non_paying),
+        ("Patients in Both Categories", both),
+    ]
+    cells = {(start_row, start_col): {"value": "Paying vs. Non-Paying Patients", "font": Font(bold=True)}}
+    for i, (label, count) in enumerate(rows, start=1):
+        cells[(start_row + i, start_col)] = {"value": label}
+        cells[(start_row + i, start_col + 1)] = {"value": count}
+    return cells
+
+
+def returning_patient_blocks(first_row, distribution, frequency, start_date_str, end_date_str):
+    """Layout of the returning-patient distribution and frequency tables, starting at `first_row`.
+
+    Returns the cells, merges and row heights for write_sheet; the tables
+    occupy columns A to C.
+    """
+    cells = {}
+    merges = []
+    row_heights = {}
+
+    def put(row, column, **spec):
+        cells.setdefault((row, column), {}).update(spec)
+
+    merges.append((first_row, 1, 3))
+    put(first_row, 1, value=f"Returning Patients Distribution · {start_date_str} to {end_date_str}",
+        font=Font(bold=True), alignment=Alignment(horizontal="left", vertical="center", wrap_text=True))
+    row_heights[first_row] = 30
+
+    for column, heading in enumerate(["Distribution", "Count", "Total Patients"], start=1):
+        put(first_row + 1, column, value=heading, alignment=CENTER, font=Font(bold=True))
+
+    total_returning_patients = 0
+    for row, (age_category, gender, count) in enumerate(distribution, start=first_row + 2):
+        put(row, 1, value=f"{age_category} ({gender})", alignment=LEFT)
+        put(row, 2, value=count, alignment=CENTER)
+        total_returning_patients += count
+
+    total_row = first_row + 2 + len(distribution)
+    put(total_row, 2, font=Font(bold=True))
+    put(total_row, 3, value=total_returning_patients, alignment=CENTER, font=Font(bold=True))
+    put(total_row, 1, alignment=LEFT)
+
+    frequency_title_row = total_row + 2
+    merges.append((frequency_title_row, 1, 3))
+    put(frequency_title_row, 1, value="Frequency of The Returning Patients", font=Font(bold=True), alignment=LEFT)
+    row_heights[frequency_title_row] = 30
+
+    freq_header_row = frequency_title_row + 1
+    for column, heading in enumerate(["Number of Visits", "Number of Patients", "Patients With More Visits"],
+                                     start=1):
+        put(freq_header_row, column, value=heading, alignment=CENTER)
+    put(freq_header_row, 1, font=Font(bold=False))
+    put(freq_header_row, 2, font=Font(bold=False))
+
+    total_patients_with_more_visits = 0
+    for row, (visits, patient_count) in enumerate(frequency, start=freq_header_row + 1):
+        put(row, 1, value=visits, alignment=CENTER)
+        put(row, 2, value=patient_count, alignment=CENTER)
+        total_patients_with_more_visits += patient_count
+
+    final_freq_row = freq_header_row + 1 + len(frequency)
+    put(final_freq_row, 3, value=total_patients_with_more_visits, alignment=CENTER, font=Font(bold=True))
+
+    return {"cells": cells, "merges": merges, "row_heights": row_heights}
+
+
+def text_width(series):
+    """Longest cell text of a column; blanks and zeros, which Excel shows empty or short, are skipped."""
+    values = series.astype(object)
+    values = values[values.notna()]
+    values = values[values.map(bool)]
+    if values.empty:
+        return 0
+    return int(values.map(cell_text).str.len().max())
+
+
+def cell_text(value):
+    """Text of a value as the saved workbook holds it: numbers keep 16 significant digits and 12.0 reads back as 12."""
+    if isinstance(value, (int, float, Decimal, np.number)) and not isinstance(value, (bool, np.bool_)):
+        text = "%.16g" % value
+        return str(float(text)) if "." in text or "e" in text else text
+    return str(value)
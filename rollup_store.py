@@ -0,0 +1,129 @@
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+
+# Days before the newest rolled-up day that every refresh re-checks, so rows
+# posted late (a cashier closing the day after midnight, corrections) land.
+REFRESH_DAYS = 7
+
+# The sections answered from the store instead of from all history.
+ROLLUP_SECTIONS = ["services_used_per_month", "daily_money_trend", "hospital_visits"]
+
+# rollup -> (source table, number of columns after the day)
+ROLLUPS = {
+    "daily_collections": ("order_entries", 2),
+    "daily_registrations": ("patient", 1),
+    "daily_returning": ("receipts", 1),
+    "daily_service_usage": ("order_entries", 2),
+}
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_collections (
+    day TEXT, cashier TEXT, total_collected REAL, PRIMARY KEY (day, cashier));
+CREATE TABLE IF NOT EXISTS daily_registrations (
+    day TEXT PRIMARY KEY, registrations INTEGER);
+CREATE TABLE IF NOT EXISTS daily_returning (
+    day TEXT PRIMARY KEY, returning_patients INTEGER);
+CREATE TABLE IF NOT EXISTS daily_service_usage (
+    day TEXT, service_name TEXT, services_used INTEGER, PRIMARY KEY (day, service_name));
+CREATE TABLE IF NOT EXISTS rollup_state (
+    rollup TEXT PRIMARY KEY, source_hash TEXT, refreshed_at TEXT);
+"""
+
+
+def open_rollup_store(path):
+    """Open (creating if needed) the SQLite file holding the per-day aggregates."""
+    store = sqlite3.connect(path)
+    store.executescript(SCHEMA)
+    return store
+
+
+def refresh_rollups(store, fetch_days, table_hashes=None, rebuild=False):
+    """Bring every rollup up to date, computing only the days that can have changed.
+
+    `fetch_days(rollup, since)` returns the (day, ...) rows of a rollup for
+    the days from `since` on, or for all history when `since` is None; see
+    report_sql.fetch_rollup_days and report_frames.rollup_days. A rollup is
+    skipped when `table_hashes` shows its source table is unchanged since the
+    last refresh. Otherwise its last REFRESH_DAYS days and everything newer
+    are aggregated again, and only the days that differ from the store are
+    rewritten. With `rebuild` every rollup is recomputed from all history,
+    for when the rollup logic itself changes or a correction reached further
+    back than REFRESH_DAYS.
+    """
+    table_hashes = table_hashes or {}
+    for rollup, (table, width) in ROLLUPS.items():
+        source_hash = table_hashes.get(table)
+        state = store.execute("SELECT source_hash FROM rollup_state WHERE rollup = ?", (rollup,)).fetchone()
+        if not rebuild and state and source_hash and state[0] == source_hash:
+            print(f"Rollup {rollup}: {table} unchanged since the last refresh")
+            continue
+
+        newest = store.execute(f"SELECT MAX(day) FROM {rollup}").fetchone()[0]
+        since = None if rebuild or newest is None else date.fromisoformat(newest) - timedelta(days=REFRESH_DAYS)
+
+        started = time.monotonic()
+        # Rows with no day (a NULL timestamp) belong to no day of the report.
+        fresh = days_of((str(day), *values) for day, *values in fetch_days(rollup, since) if day is not None)
+        stored = {} if since is None else days_of(
+            store.execute(f"SELECT * FROM {rollup} WHERE day >= ?", (since.isoformat(),)))
+        changed = sorted(day for day in fresh.keys() | stored.keys() if fresh.get(day) != stored.get(day))
+        placeholders = ", ".join("?" * (width + 1))
+        with store:
+            if since is None:
+                store.execute(f"DELETE FROM {rollup}")
+            else:
+                store.executemany(f"DELETE FROM {rollup} WHERE day = ?", [(day,) for day in changed])
+            store.executemany(f"INSERT INTO {rollup} VALUES ({placeholders})",
+                              [row for day in changed for row in fresh.get(day, ())])
+            store.execute("INSERT OR REPLACE INTO rollup_state VALUES (?, ?, ?)",
+                          (rollup, source_hash, datetime.now().isoformat(timespec="seconds")))
+        print(f"Rollup {rollup}: {len(changed):,} of {len(fresh):,} day(s) from {since or 'the first day'} on "
+              f"changed ({time.monotonic() - started:.1f} s)")
+
+
+def days_of(rows):
+    """Rollup rows grouped by their day, as {day: set of rows}."""
+    days = {}
+    for row in rows:
+        days.setdefault(row[0], set()).add(tuple(row))
+    return days
+
+
+def rollup_results(store, start_date_str, end_date_str, cashiers=("1", "8", "9")):
+    """Sections 6, 9 and 10 answered from the store, in the row shapes of the report queries."""
+    results = {}
+
+    # 6. Services used per month
+    results["services_used_per_month"] = store.execute("""
+        SELECT service_name,
+               CAST(substr(day, 1, 4) AS INTEGER) AS year,
+               CAST(substr(day, 6, 2) AS INTEGER) AS month,
+               SUM(services_used)
+        FROM daily_service_usage
+        GROUP BY service_name, year, month
+        ORDER BY year DESC, month DESC
+    """).fetchall()
+
+    #9. Trend of money made per day
+    results["daily_money_trend"] = store.execute(f"""
+        SELECT day, SUM(total_collected)
+        FROM daily_collections
+        WHERE cashier IN ({", ".join("?" * len(cashiers))})
+        AND day >= ? AND day <= ?
+        GROUP BY day
+        ORDER BY day
+    """, (*cashiers, start_date_str, end_date_str)).fetchall()
+
+    #10. Daily Hospital Patient Visits
+    results["hospital_visits"] = store.execute("""
+        SELECT r.day,
+               r.registrations,
+               COALESCE(v.returning_patients, 0),
+               r.registrations + COALESCE(v.returning_patients, 0)
+        FROM daily_registrations r
+        LEFT JOIN daily_returning v ON v.day = r.day
+        WHERE r.day >= ? AND r.day <= ?
+        ORDER BY r.day
+    """, (start_date_str, end_date_str)).fetchall()
+
+    return results
@@ -0,0 +1,114 @@
+import cProfile
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+METRIC_PREFIX = "billing_report"
+
+
+def peak_rss_mb():
+    """High-water resident set size of this process so far, in MB (ru_maxrss is KB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RunLog:
+    """Structured spans of one report run, written out as a JSON run log and Prometheus metrics.
+
+    Every span records its wall time, the rows and bytes the stage reports,
+    and the process's peak RSS when it ended. With `profile` every outermost
+    span of the main thread runs under cProfile (one profiler can be active
+    at a time) and the profile of the slowest one is kept for write_profile.
+    """
+
+    def __init__(self, profile=False):
+        self.started = time.time()
+        self.spans = []
+        self.success = False
+        self.profile = profile
+        self.slowest_profile = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def span(self, name, **fields):
+        """Time the enclosed block; the yielded dict takes "rows", "bytes" and any extra fields."""
+        record = {"stage": name, "rows": None, "bytes": None, **fields}
+        depth = getattr(self._local, "depth", 0)
+        outermost = depth == 0 and threading.current_thread() is threading.main_thread()
+        profiler = cProfile.Profile() if self.profile and outermost else None
+        self._local.depth = depth + 1
+        started = time.monotonic()
+        record["started"] = datetime.now().isoformat(timespec="milliseconds")
+        if profiler:
+            profiler.enable()
+        try:
+            yield record
+            record["status"] = "ok"
+        except BaseException:
+            record["status"] = "failed"
+            raise
+        finally:
+            if profiler:
+                profiler.disable()
+            self._local.depth = depth
+            record["seconds"] = round(time.monotonic() - started, 4)
+            record["peak_rss_mb"] = round(peak_rss_mb(), 1)
+            with self._lock:
+                self.spans.append(record)
+                if profiler and (self.slowest_profile is None or record["seconds"] > self.slowest_profile[1]):
+                    self.slowest_profile = (name, record["seconds"], profiler)
+
+    def summary(self):
+        return {
+            "started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+            "seconds": round(time.time() - self.started, 4),
+            "success": self.success,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "spans": self.spans,
+        }
+
+    def write_json(self, path):
+        """Append this run as one JSON line to the run log at `path`."""
+        with open(path, "a") as f:
+            f.write(json.dumps(self.summary(), default=str) + "\n")
+
+    def write_prometheus(self, path):
+        """Write the run as a Prometheus textfile-collector file, replaced atomically."""
+        summary = self.summary()
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+            for labels, value in samples:
+                label_text = "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}" if labels else ""
+                lines.append(f"{METRIC_PREFIX}_{name}{label_text} {value}")
+
+        def per_stage(key, scale=None):
+            return [({"stage": span["stage"]}, int(span[key] * scale) if scale else span[key])
+                    for span in summary["spans"] if span.get(key) is not None]
+
+        metric("stage_seconds", "Wall time of each stage of the last run.", per_stage("seconds"))
+        metric("stage_rows", "Rows handled by each stage of the last run.", per_stage("rows"))
+        metric("stage_bytes", "Bytes read or written by each stage of the last run.", per_stage("bytes"))
+        metric("stage_peak_rss_bytes", "Process peak RSS at the end of each stage of the last run.",
+               per_stage("peak_rss_mb", 1024 * 1024))
+        metric("run_seconds", "Wall time of the last run.", [({}, summary["seconds"])])
+        metric("run_success", "1 if the last run completed.", [({}, int(summary["success"]))])
+        metric("last_run_timestamp_seconds", "Start time of the last run.", [({}, round(self.started))])
+
+        with open(path + ".tmp", "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(path + ".tmp", path)
+
+    def write_profile(self, path):
+        """Dump the cProfile stats of the slowest profiled stage (pstats format, e.g. for snakeviz)."""
+        if self.slowest_profile is None:
+            return None
+        name, seconds, profiler = self.slowest_profile
+        profiler.dump_stats(path)
+        return name, seconds
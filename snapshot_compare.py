@@ -0,0 +1,157 @@
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+BACKUP_PREFIX = "billing_prod_import_backup_"
+
+
+def newest_first(backup_files):
+    """Backup paths ordered by modification time, newest first.
+
+    The rolling dumps are named by weekday, so their names sort
+    alphabetically (Friday, Monday, ...) rather than by date.
+    """
+    return sorted(backup_files, key=os.path.getmtime, reverse=True)
+
+
+def snapshot_label(backup_file):
+    """Short column label for a backup: its weekday, or the file name without the common prefix."""
+    name = os.path.basename(backup_file.rstrip(os.sep))
+    for suffix in (".sql.gz", ".sql"):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name[len(BACKUP_PREFIX):] if name.startswith(BACKUP_PREFIX) else name
+
+
+def label_key(label):
+    """The part of a label that names its scratch database; labels must differ in it."""
+    return re.sub(r"[^0-9A-Za-z_]", "_", label).lower()
+
+
+def snapshot_labels(backup_files):
+    """One distinct label per backup: snapshot_label, prefixed with the parent directory where that collides.
+
+    Backups that still collide (or whose labels only differ in characters
+    a database name cannot hold) get a counter.
+    """
+    labels = [snapshot_label(path) for path in backup_files]
+    counts = {}
+    for label in labels:
+        counts[label_key(label)] = counts.get(label_key(label), 0) + 1
+    labels = [f"{os.path.basename(os.path.dirname(os.path.abspath(path)))}/{label}"
+              if counts[label_key(label)] > 1 else label
+              for label, path in zip(labels, backup_files)]
+    unique = []
+    taken = set()
+    for label in labels:
+        candidate, counter = label, 1
+        while label_key(candidate) in taken:
+            counter += 1
+            candidate = f"{label} ({counter})"
+        taken.add(label_key(candidate))
+        unique.append(candidate)
+    return unique
+
+
+def snapshot_results(label, backup_file, engine, db, current_date, start_date_str, end_date_str, query_workers=4):
+    """Compute the report results of one backup; runs inside a worker process.
+
+    The columnar engine uses the snapshot next to the backup. The mysql
+    engine restores the report tables into a scratch database of its own
+    (`db["database"]` suffixed with the backup's `label`, which
+    snapshot_labels keeps distinct), queries it and drops it again, so
+    workers never share a database.
+    """
+    if engine == "columnar":
+        from columnar_snapshot import ensure_snapshot, load_snapshot
+        from report_frames import compute_report_results
+
+        snapshot_dir = ensure_snapshot(backup_file)
+        return compute_report_results(load_snapshot(snapshot_dir), current_date, start_date_str, end_date_str)
+
+    import mysql.connector
+    import mysql.connector.pooling
+    from dump_restore import iter_backup_chunks, filter_tables, stream_restore
+    from report_sql import fetch_report_results
+
+    database = f"{db['database']}_{label_key(label)}"
+    conn = mysql.connector.connect(host=db["host"], user=db["user"], password=db["password"])
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {database}")
+    cursor.execute(f"CREATE DATABASE {database}")
+    try:
+        chunks = filter_tables(iter_backup_chunks(backup_file, tables=db["tables"]), db["tables"])
+        stream_restore(chunks, database, db["user"], db["password"], host=db["host"], label=label)
+        pool = mysql.connector.pooling.MySQLConnectionPool(pool_name=f"report_{os.getpid()}",
+                                                           pool_size=query_workers, host=db["host"],
+                                                           user=db["user"], password=db["password"],
+                                                           database=database)
+        return fetch_report_results(pool, current_date, start_date_str, end_date_str, workers=query_workers)
+    finally:
+        cursor.execute(f"DROP DATABASE IF EXISTS {database}")
+        cursor.close()
+        conn.close()
+
+
+def compare_snapshots(backup_files, engine, db, current_date, start_date_str, end_date_str,
+                      workers=4, query_workers=4):
+    """Compute every backup's results on a process pool; returns {label: results} oldest first.
+
+    The workers are forked, since a spawned child would re-run the top level
+    of Backup_analysis.py.
+    """
+    backup_files = sorted(backup_files, key=os.path.getmtime)
+    labels = snapshot_labels(backup_files)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as pool:
+        futures = {
+            label: pool.submit(snapshot_results, label, path, engine, db, current_date, start_date_str,
+                               end_date_str, query_workers)
+            for label, path in zip(labels, backup_files)
+        }
+        return {label: future.result() for label, future in futures.items()}
+
+
+def comparative_frames(snapshots):
+    """Merge per-snapshot results into side-by-side DataFrames, one column per snapshot.
+
+    Returns (sheet name, frame) pairs: a summary of the headline figures, and
+    the daily money trend and daily visits with one row per date.
+    """
+    summary = {}
+    money = {}
+    visits = {}
+    for label, results in snapshots.items():
+        this_year, this_month, this_week, today = results["registered_patients"]
+        total, paying, non_paying, both = results["paying"]
+        order_entries = results["order_entries"]
+        summary[label] = [
+            this_year, this_month, this_week, today,
+            total, paying, non_paying, both,
+            results["returning_patients_count"],
+            sum(float(row[3] or 0) for row in order_entries),
+            sum(float(row[4] or 0) for row in order_entries),
+            sum(float(row[1] or 0) for row in results["daily_money_trend"]),
+            sum(row[3] for row in results["hospital_visits"]),
+        ]
+        money[label] = pd.Series({str(day): float(amount or 0) for day, amount in results["daily_money_trend"]})
+        visits[label] = pd.Series({str(day): total_visits for day, _, _, total_visits in results["hospital_visits"]})
+
+    summary_df = pd.DataFrame(summary, index=[
+        "Registered This Year", "Registered This Month", "Registered This Week", "Registered Today",
+        "Total Patients", "Exclusively Paying Patients", "Exclusively Non-Paying Patients",
+        "Patients in Both Categories", "Returning Patients", "Total Amount Paid",
+        "Expected Total Amount Paid", "Total Collected In Window", "Total Visits In Window",
+    ])
+    summary_df = summary_df.rename_axis("Metric").reset_index()
+
+    money_df = pd.DataFrame(money).sort_index().rename_axis("Transaction Date").reset_index()
+    visits_df = pd.DataFrame(visits).sort_index().rename_axis("Visit Date").reset_index()
+    return [
+        ("Snapshot Comparison", summary_df),
+        ("Daily Money Trend", money_df),
+        ("Daily Hospital Patient Visits", visits_df),
+    ]
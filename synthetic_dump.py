@@ -0,0 +1,229 @@
+"""Generate a synthetic mysqldump of the billing tables the report reads.
+
+The rows are random but shaped like the production data: a few services
+account for most orders, prices sit on a handful of tiers, most patients
+come once while some return often, and registrations and orders grow towards
+the end date. Used by benchmark.py; nothing here touches a real backup.
+
+    python synthetic_dump.py /tmp/billing_prod_import_backup_Friday.sql.gz --order-entries 1000000
+"""
+import argparse
+import gzip
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+BATCH_ROWS = 200_000
+INSERT_ROWS = 1_000
+HISTORY_DAYS = 3 * 365
+SERVICE_COUNT = 250
+PRICE_TIERS = [0, 500, 1000, 1500, 2500, 5000, 10000]
+PRICE_TIER_WEIGHTS = [0.15, 0.2, 0.25, 0.15, 0.12, 0.08, 0.05]
+CASHIERS = [1, 8, 9, 2, 5]
+CASHIER_WEIGHTS = [0.35, 0.25, 0.2, 0.12, 0.08]
+
+TABLES = {
+    "patient": """  `patient_id` int NOT NULL,
+  `date_created` datetime NOT NULL,
+  `creator` int DEFAULT NULL,
+  `voided` tinyint NOT NULL DEFAULT '0',
+  PRIMARY KEY (`patient_id`)""",
+    "person": """  `person_id` int NOT NULL,
+  `gender` varchar(50) DEFAULT NULL,
+  `birthdate` date DEFAULT NULL,
+  `dead` tinyint NOT NULL DEFAULT '0',
+  PRIMARY KEY (`person_id`)""",
+    "services": """  `service_id` int NOT NULL,
+  `name` varchar(255) NOT NULL,
+  `voided` tinyint NOT NULL DEFAULT '0',
+  PRIMARY KEY (`service_id`)""",
+    "service_prices": """  `price_id` int NOT NULL,
+  `service_id` int NOT NULL,
+  `price` decimal(10,2) NOT NULL,
+  `price_type` varchar(50) DEFAULT NULL,
+  `voided` tinyint NOT NULL DEFAULT '0',
+  PRIMARY KEY (`price_id`)""",
+    "order_entries": """  `order_entry_id` int NOT NULL,
+  `patient_id` int DEFAULT NULL,
+  `service_id` int NOT NULL,
+  `quantity` int NOT NULL,
+  `amount_paid` decimal(10,2) NOT NULL,
+  `full_price` decimal(10,2) NOT NULL,
+  `voided` tinyint NOT NULL DEFAULT '0',
+  `order_date` datetime NOT NULL,
+  `created_at` datetime NOT NULL,
+  `cashier` varchar(255) DEFAULT NULL,
+  PRIMARY KEY (`order_entry_id`)""",
+    "receipts": """  `receipt_number` varchar(20) NOT NULL,
+  `patient_id` int DEFAULT NULL,
+  `payment_stamp` datetime NOT NULL,
+  PRIMARY KEY (`receipt_number`)""",
+}
+
+HEADER = """-- MySQL dump 10.13  Distrib 8.0.36, for Linux (x86_64)
+--
+-- Host: localhost    Database: billing_prod_import
+-- ------------------------------------------------------
+/*!40101 SET @OLD_CHARACTER_SET_CLIENT=@@CHARACTER_SET_CLIENT */;
+/*!50503 SET NAMES utf8mb4 */;
+/*!40103 SET @OLD_TIME_ZONE=@@TIME_ZONE */;
+/*!40103 SET TIME_ZONE='+00:00' */;
+/*!40014 SET @OLD_UNIQUE_CHECKS=@@UNIQUE_CHECKS, UNIQUE_CHECKS=0 */;
+/*!40014 SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0 */;
+"""
+TRAILER = """/*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;
+/*!40014 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS */;
+/*!40014 SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS */;
+/*!40101 SET CHARACTER_SET_CLIENT=@OLD_CHARACTER_SET_CLIENT */;
+
+-- Dump completed on {date}
+"""
+
+
+def table_sizes(order_entries):
+    """Row counts of every table for a dump with `order_entries` orders."""
+    patients = max(100, order_entries // 6)
+    return {
+        "patient": patients,
+        "person": patients,
+        "services": SERVICE_COUNT,
+        "service_prices": SERVICE_COUNT + SERVICE_COUNT // 5,
+        "order_entries": order_entries,
+        "receipts": order_entries // 2,
+    }
+
+
+def write_synthetic_dump(path, order_entries, seed=0, end_date=None, compresslevel=6):
+    """Write a gzipped mysqldump with `order_entries` orders and proportionate other tables.
+
+    Rows are generated and written BATCH_ROWS at a time, so memory stays
+    flat at any scale. Returns the row count of every table.
+    """
+    rng = np.random.default_rng(seed)
+    end_date = pd.Timestamp(end_date or datetime.now()).floor("s")
+    sizes = table_sizes(order_entries)
+
+    # Services: popularity falls off with rank; each has one live price on a tier.
+    popularity = 1 / np.arange(1, SERVICE_COUNT + 1) ** 1.1
+    popularity /= popularity.sum()
+    service_prices = rng.choice(PRICE_TIERS, size=SERVICE_COUNT, p=PRICE_TIER_WEIGHTS).astype(float)
+
+    # Patients: a few come very often, most once or twice.
+    patient_weights = rng.pareto(1.5, size=sizes["patient"]) + 1
+    patient_weights /= patient_weights.sum()
+
+    with gzip.open(path, "wt", compresslevel=compresslevel, encoding="utf-8") as out:
+        out.write(HEADER)
+        for table, definition in TABLES.items():
+            out.write(f"\n--\n-- Table structure for table `{table}`\n--\n\n")
+            out.write(f"DROP TABLE IF EXISTS `{table}`;\n")
+            out.write(f"CREATE TABLE `{table}` (\n{definition}\n) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;\n")
+            out.write(f"\n--\n-- Dumping data for table `{table}`\n--\n\n")
+            out.write(f"LOCK TABLES `{table}` WRITE;\n")
+            for start in range(0, sizes[table], BATCH_ROWS):
+                count = min(BATCH_ROWS, sizes[table] - start)
+                frame = generate_rows(table, rng, start, count, end_date, popularity, service_prices,
+                                      patient_weights, sizes)
+                write_inserts(out, table, frame)
+            out.write("UNLOCK TABLES;\n")
+        out.write(TRAILER.format(date=end_date.strftime("%Y-%m-%d %H:%M:%S")))
+    return sizes
+
+
+def generate_rows(table, rng, start, count, end_date, popularity, service_prices, patient_weights, sizes):
+    """One batch of rows of `table` as a DataFrame of SQL literals, ids from start + 1."""
+    ids = np.arange(start + 1, start + count + 1)
+
+    if table == "patient":
+        return pd.DataFrame({
+            "patient_id": ids,
+            "date_created": sql_datetimes(recent_days(rng, count, end_date)),
+            "creator": rng.integers(1, 40, count),
+            "voided": (rng.random(count) < 0.02).astype(int),
+        })
+    if table == "person":
+        # Ages: many young children, a broad adult middle, some elderly; a few unknown.
+        ages = np.concatenate([rng.uniform(0, 5, count), rng.uniform(5, 18, count),
+                               rng.uniform(18, 50, count), rng.uniform(50, 90, count)])
+        pick = rng.choice(4, size=count, p=[0.22, 0.2, 0.43, 0.15])
+        ages = ages[pick * count + np.arange(count)]
+        birthdates = (end_date.normalize() - pd.to_timedelta(ages * 365.25, unit="D")).strftime("%Y-%m-%d")
+        birthdates = np.where(rng.random(count) < 0.03, "NULL", "'" + birthdates + "'")
+        gender = rng.choice(["'M'", "'F'", "NULL"], size=count, p=[0.44, 0.55, 0.01])
+        return pd.DataFrame({"person_id": ids, "gender": gender, "birthdate": birthdates, "dead": 0})
+    if table == "services":
+        return pd.DataFrame({"service_id": ids, "name": [f"'Service {i:03d}'" for i in ids], "voided": 0})
+    if table == "service_prices":
+        # One live price per service, then voided historical prices for some of them.
+        service_ids = np.where(ids <= SERVICE_COUNT, ids, rng.integers(1, SERVICE_COUNT + 1, count))
+        live = ids <= SERVICE_COUNT
+        prices = np.where(live, service_prices[service_ids - 1], service_prices[service_ids - 1] * 0.8)
+        return pd.DataFrame({
+            "price_id": ids,
+            "service_id": service_ids,
+            "price": [f"{p:.2f}" for p in prices],
+            "price_type": rng.choice(["'base'", "'ward'", "'private'"], size=count, p=[0.7, 0.2, 0.1]),
+            "voided": (~live).astype(int),
+        })
+    if table == "order_entries":
+        service_ids = rng.choice(SERVICE_COUNT, size=count, p=popularity) + 1
+        quantity = rng.choice([1, 1, 1, 2, 3], size=count)
+        full_price = service_prices[service_ids - 1]
+        paid_share = rng.choice([1.0, 0.5, 0.0], size=count, p=[0.75, 0.1, 0.15])
+        order_dates = recent_days(rng, count, end_date)
+        created_at = order_dates + pd.to_timedelta(rng.integers(0, 3600, count), unit="s")
+        patient_ids = rng.choice(sizes["patient"], size=count, p=patient_weights) + 1
+        return pd.DataFrame({
+            "order_entry_id": ids,
+            "patient_id": np.where(rng.random(count) < 0.005, "NULL", patient_ids.astype(str)),
+            "service_id": service_ids,
+            "quantity": quantity,
+            "amount_paid": [f"{v:.2f}" for v in full_price * quantity * paid_share],
+            "full_price": [f"{v:.2f}" for v in full_price],
+            "voided": (rng.random(count) < 0.03).astype(int),
+            "order_date": sql_datetimes(order_dates),
+            "created_at": sql_datetimes(created_at),
+            "cashier": [f"'{cashier}'" for cashier in rng.choice(CASHIERS, size=count, p=CASHIER_WEIGHTS)],
+        })
+    if table == "receipts":
+        return pd.DataFrame({
+            "receipt_number": [f"'R{i:09d}'" for i in ids],
+            "patient_id": rng.choice(sizes["patient"], size=count, p=patient_weights) + 1,
+            "payment_stamp": sql_datetimes(recent_days(rng, count, end_date, history_days=120)),
+        })
+    raise ValueError(f"Unknown table {table}")
+
+
+def recent_days(rng, count, end_date, history_days=HISTORY_DAYS):
+    """Random timestamps before `end_date`, denser towards it (the service grows over time)."""
+    days_back = history_days * (1 - np.sqrt(rng.random(count)))
+    return end_date - pd.to_timedelta(days_back * 86400, unit="s").round("s")
+
+
+def sql_datetimes(timestamps):
+    """Quoted DATETIME literals."""
+    return "'" + pd.DatetimeIndex(timestamps).strftime("%Y-%m-%d %H:%M:%S") + "'"
+
+
+def write_inserts(out, table, frame):
+    """Write a frame of SQL literals as extended INSERTs of INSERT_ROWS rows each."""
+    columns = [frame[column].astype(str) for column in frame.columns]
+    tuples = "(" + columns[0].str.cat(columns[1:], sep=",") + ")"
+    for start in range(0, len(tuples), INSERT_ROWS):
+        out.write(f"INSERT INTO `{table}` VALUES {','.join(tuples.iloc[start:start + INSERT_ROWS])};\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic billing mysqldump (.sql.gz).")
+    parser.add_argument("output", help="path of the .sql.gz to write")
+    parser.add_argument("--order-entries", type=int, default=10_000,
+                        help="order_entries rows; the other tables scale with it (default: 10000)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    parser.add_argument("--end-date", help="latest timestamp in the data, YYYY-MM-DD (default: now)")
+    args = parser.parse_args()
+
+    sizes = write_synthetic_dump(args.output, args.order_entries, seed=args.seed, end_date=args.end_date)
+    print(f"Synthetic dump written: {args.output}")
+    for table, rows in sizes.items():
+        print(f"  {table:<16} {rows:12,} rows")
@@ -0,0 +1,59 @@
+import gzip
+import os
+import threading
+import time
+
+import pytest
+
+import backup_watcher
+from backup_watcher import watch_backups
+from dump_restore import DUMP_MANIFEST
+
+
+def later(seconds, action):
+    timer = threading.Timer(seconds, action)
+    timer.start()
+    return timer
+
+
+def write_dump_directory(path):
+    path.mkdir()
+    (path / "billing_patient.sql.gz").write_bytes(gzip.compress(b"-- patient\n"))
+    (path / (DUMP_MANIFEST + ".part")).write_text("{}")
+    os.replace(path / (DUMP_MANIFEST + ".part"), path / DUMP_MANIFEST)
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def watch(request, tmp_path, monkeypatch):
+    if request.param == "polling":
+        monkeypatch.setattr(backup_watcher, "open_inotify", lambda directory: None)
+    watchers = []
+
+    def start(**options):
+        watcher = watch_backups(str(tmp_path), poll_seconds=0.05, **options)
+        watchers.append(watcher)
+        return watcher
+
+    yield start
+    for watcher in watchers:
+        watcher.close()
+
+
+def test_backup_file_is_yielded_once_it_settles(tmp_path, watch):
+    (tmp_path / "billing_backup_Thursday.sql.gz").write_bytes(b"old")
+    watcher = watch(settle_seconds=0.3)
+    backup = tmp_path / "billing_backup_Friday.sql.gz"
+    later(0.1, lambda: backup.write_bytes(b"new"))
+    started = time.monotonic()
+    assert next(watcher) == str(backup)
+    assert time.monotonic() - started >= 0.4
+
+
+def test_dump_directory_is_yielded_without_settling(tmp_path, watch):
+    watcher = watch(settle_seconds=60)
+    directory = tmp_path / "billing_backup_Friday"
+    (tmp_path / "ignored.txt").write_text("not a backup")
+    later(0.1, lambda: write_dump_directory(directory))
+    started = time.monotonic()
+    assert next(watcher) == str(directory)
+    assert time.monotonic() - started < 10
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pytest
+
+from delta_transfer import DirectoryRemote, MAX_CHUNK, MIN_CHUNK, chunk_file, cut_points, directory_files, send_file
+
+
+def random_bytes(size, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, size, dtype=np.uint8).tobytes()
+
+
+def test_cut_points_bound_chunk_sizes():
+    data = random_bytes(3 * 1024 * 1024)
+    cuts = cut_points(data, final=True)
+    lengths = np.diff([0, *cuts])
+    assert cuts[-1] == len(data)
+    assert lengths[:-1].min() >= MIN_CHUNK and lengths.max() <= MAX_CHUNK
+
+
+def test_cut_points_do_not_depend_on_the_read_size():
+    data = random_bytes(2 * 1024 * 1024, seed=1)
+    whole = cut_points(data, final=True)
+    pieced = []
+    start = 0
+    pending = b""
+    for offset in range(0, len(data), 300_000):
+        buffer = pending + data[offset:offset + 300_000]
+        final = offset + 300_000 >= len(data)
+        position = 0
+        for end in cut_points(buffer, final):
+            pieced.append(start + end)
+            position = end
+        start += position
+        pending = buffer[position:]
+    assert pieced == whole
+
+
+def test_round_trip_sends_only_changed_chunks(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    remote = DirectoryRemote(str(tmp_path / "lab"))
+    path = source / "billing_backup_Friday.sql.gz"
+    data = random_bytes(1024 * 1024)
+    path.write_bytes(data)
+
+    first = send_file(str(path), remote, retry_delays=[])
+    assert (tmp_path / "lab" / path.name).read_bytes() == data
+    assert first > len(data) * 0.9
+
+    changed = data[:500_000] + b"a few new rows" + data[500_000:]
+    path.write_bytes(changed)
+    second = send_file(str(path), remote, retry_delays=[])
+    assert (tmp_path / "lab" / path.name).read_bytes() == changed
+    assert second < MAX_CHUNK * 3
+    assert send_file(str(path), remote, retry_delays=[]) == 0
+
+
+def test_directories_arrive_under_their_name_with_the_manifest_last(tmp_path):
+    dump = tmp_path / "billing_backup_Friday"
+    dump.mkdir()
+    for name in ["manifest.json", "billing_patient.sql.gz", "billing_services.sql.gz"]:
+        (dump / name).write_bytes(name.encode() * 100)
+    (dump / ".delta_index.json").write_text("{}")
+    files = directory_files(str(dump))
+    assert [name for _, name in files] == ["billing_backup_Friday/billing_patient.sql.gz",
+                                           "billing_backup_Friday/billing_services.sql.gz",
+                                           "billing_backup_Friday/manifest.json"]
+    remote = DirectoryRemote(str(tmp_path / "lab"))
+    for path, name in files:
+        send_file(path, remote, name, retry_delays=[])
+    assert sorted(os.listdir(tmp_path / "lab" / dump.name)) == sorted(name for name in os.listdir(dump)
+                                                                      if not name.startswith("."))
+    # The recipes of the directory's files keep their chunks from being pruned.
+    remote.prune()
+    chunk_ids = [chunk_id for chunk_id, _ in chunk_file(str(dump / "billing_patient.sql.gz"))[1]]
+    assert remote.missing(chunk_ids) == []
+
+
+def test_names_outside_the_target_are_refused(tmp_path):
+    remote = DirectoryRemote(str(tmp_path / "lab"))
+    remote.connect()
+    with pytest.raises(RuntimeError):
+        remote.assemble("../escape", [], "")
@@ -0,0 +1,32 @@
+import pandas as pd
+
+from demographics import age_in_years, bucket_ages, patient_demographics
+
+
+def test_service_age_groups_include_age_five():
+    ages = [0, 4, 5, 6, 17, 18, 35, 36, 50, 51, 90, None]
+    assert list(bucket_ages(ages, "service_age_groups")) == [
+        "Under 5", "Under 5", "5-17", "5-17", "5-17", "18-35", "18-35", "36-50", "36-50",
+        "Above 50", "Above 50", "Unknown"]
+
+
+def test_missing_ages_go_to_the_missing_bucket():
+    assert list(bucket_ages([None, 30], "registration_age_groups")) == ["Other", "Other"]
+    categories = bucket_ages([4, 12, None], "returning_age_categories")
+    assert list(categories) == ["under_five", "under_thirteen", "adult"]
+    assert categories.ordered
+
+
+def test_age_counts_whole_years_like_timestampdiff():
+    birthdates = pd.Series(pd.to_datetime(["2019-06-30", "2019-07-01", "2020-02-29", None]))
+    ages = age_in_years(birthdates, pd.Timestamp("2024-06-30 12:00:00"))
+    assert ages.tolist()[:3] == [5, 4, 4] and pd.isna(ages.iloc[3])
+
+
+def test_demographics_add_one_age_per_patient():
+    people = pd.DataFrame({"patient_id": [1, 2], "date_created": pd.to_datetime(["2024-01-01", "2024-02-01"]),
+                           "gender": ["F", "M"], "birthdate": pd.to_datetime(["2019-06-30", None])})
+    demographics = patient_demographics(people, "2024-06-30")
+    assert demographics["age"].dtype == "Int16"
+    assert demographics["age"].tolist()[0] == 5 and pd.isna(demographics["age"].iloc[1])
+    assert list(bucket_ages(demographics["age"], "service_age_groups")) == ["5-17", "Unknown"]
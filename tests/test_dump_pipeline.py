@@ -0,0 +1,81 @@
+import gzip
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from dump_pipeline import ParallelGzipWriter, dump_table
+
+
+def compress(data, scan_size=64 * 1024):
+    out = io.BytesIO()
+    with ThreadPoolExecutor(4) as pool:
+        writer = ParallelGzipWriter(out, pool, scan_size=scan_size)
+        for start in range(0, len(data), 10_000):
+            writer.write(data[start:start + 10_000])
+        writer.close()
+    return out.getvalue(), writer
+
+
+def members(data):
+    """The raw gzip members of a multi-member stream."""
+    starts = [i for i in range(len(data)) if data.startswith(b"\x1f\x8b\x08\x00\x00\x00\x00\x00", i)]
+    return [data[start:end] for start, end in zip(starts, starts[1:] + [len(data)])]
+
+
+def rows(seed, count=20_000):
+    rng = np.random.default_rng(seed)
+    return b"".join(b"(%d,'%s',%d)," % (i, rng.bytes(6).hex().encode(), rng.integers(1000)) for i in range(count))
+
+
+def test_members_decompress_to_the_input():
+    data = rows(0)
+    compressed, writer = compress(data)
+    assert gzip.decompress(compressed) == data
+    assert writer.raw_bytes == len(data) and writer.bytes == len(compressed)
+    assert len(members(compressed)) > 1
+
+
+def test_unchanged_rows_compress_to_the_same_members():
+    data = rows(0)
+    changed = data[:len(data) // 2] + b"(0,'edited',1)," + data[len(data) // 2:]
+    before, _ = compress(data)
+    after, _ = compress(changed, scan_size=100 * 1024)
+    old, new = members(before), members(after)
+    assert len(set(old) & set(new)) >= len(old) - 2
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.batches = None
+
+    def execute(self, query, params=()):
+        self.batches = [[("patient", "CREATE TABLE `patient` (`patient_id` int)")]] if query.startswith("SHOW") \
+            else [self.rows]
+
+    def fetchone(self):
+        return self.batches.pop(0)[0]
+
+    def fetchmany(self, size):
+        return self.batches.pop(0) if self.batches else []
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, **options):
+        return FakeCursor(self.rows)
+
+
+def test_content_hash_ignores_the_dump_times():
+    first, second, changed = io.BytesIO(), io.BytesIO(), io.BytesIO()
+    rows, content = dump_table(FakeConnection([(1,), (2,)]), "billing", "patient", first, "2024-01-01 01:00:00")
+    assert rows == 2
+    assert dump_table(FakeConnection([(1,), (2,)]), "billing", "patient", second, "2024-01-02 01:00:00")[1] == content
+    assert first.getvalue() != second.getvalue()
+    assert dump_table(FakeConnection([(1,), (3,)]), "billing", "patient", changed, "2024-01-02 01:00:00")[1] != content
@@ -0,0 +1,296 @@
+import gzip
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from columnar_snapshot import parse_insert_values
+from dump_restore import (BULK_LOAD_SETTINGS, DUMP_MANIFEST, count_rows, dump_table_hashes, file_checksum,
+                          filter_tables, find_backups, iter_backup_chunks, iter_table_segments, parallel_restore,
+                          parallel_restore_directory, plan_restore)
+
+DUMP = b"""-- MySQL dump 10.13  Distrib 8.0.36, for Linux (x86_64)
+/*!40101 SET NAMES utf8mb4 */;
+
+--
+-- Table structure for table `patient`
+--
+
+DROP TABLE IF EXISTS `patient`;
+/*!40101 SET character_set_client = utf8mb4 */;
+CREATE TABLE `patient` (
+  `patient_id` int NOT NULL,
+  `date_created` datetime DEFAULT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+--
+-- Dumping data for table `patient`
+--
+
+LOCK TABLES `patient` WRITE;
+INSERT INTO `patient` VALUES (1,'2024-01-01 08:00:00'),(2,NULL);
+UNLOCK TABLES;
+
+--
+-- Table structure for table `services`
+--
+
+DROP TABLE IF EXISTS `services`;
+CREATE TABLE `services` (
+  `service_id` int NOT NULL,
+  `name` varchar(255) DEFAULT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+--
+-- Dumping data for table `services`
+--
+
+LOCK TABLES `services` WRITE;
+INSERT INTO `services` VALUES (1,'X-ray'),(2,'Lab'),(3,'Ward');
+UNLOCK TABLES;
+/*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;
+
+-- Dump completed on 2024-01-02  1:00:00
+"""
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [7, 64, len(DUMP)])
+def test_segments_rebuild_the_dump_at_any_chunk_size(size):
+    segments = list(iter_table_segments(chunked(DUMP, size)))
+    assert b"".join(data for _, data in segments) == DUMP
+    assert {table for table, _ in segments} == {None, "patient", "services"}
+    services = b"".join(data for table, data in segments if table == "services")
+    assert b"INSERT INTO `services`" in services
+    assert b"patient" not in services
+
+
+def test_session_settings_belong_to_every_table():
+    segments = list(iter_table_segments([DUMP]))
+    settings = [table for table, data in segments if data.startswith(b"/*!40101 SET character_set_client")]
+    assert settings == [None]
+
+
+@pytest.mark.parametrize("size", [5, 100])
+def test_filter_tables_keeps_only_the_selected_tables(size):
+    filtered = b"".join(filter_tables(chunked(DUMP, size), ["services"]))
+    assert b"INSERT INTO `services`" in filtered
+    assert b"INSERT INTO `patient`" not in filtered
+    assert b"CREATE TABLE `patient`" not in filtered
+    assert filtered.startswith(b"-- MySQL dump")
+    assert b"-- Dump completed" in filtered
+
+
+def test_filter_tables_on_a_gzip_dump(tmp_path):
+    path = tmp_path / "billing_backup_Friday.sql.gz"
+    with gzip.open(path, "wb") as f:
+        f.write(DUMP)
+    assert b"".join(iter_backup_chunks(str(path), chunk_size=11)) == DUMP
+    selected = b"".join(filter_tables(iter_backup_chunks(str(path), chunk_size=11), ["patient"]))
+    assert b"INSERT INTO `patient`" in selected and b"INSERT INTO `services`" not in selected
+
+
+@pytest.mark.parametrize("size", range(1, 12))
+def test_count_rows_across_split_markers(size):
+    tail = b""
+    rows = 0
+    for chunk in chunked(DUMP, size):
+        rows += count_rows(chunk, tail)
+        tail = (tail + chunk)[-16:]
+    assert rows == 5
+
+
+def test_parse_insert_values_unescapes_strings():
+    values = (rb"(1,'O\'Brien'),(2,'a,b (c)'),(3,'line\nbreak'),(4,'back\\slash'),(5,NULL),"
+              rb"(6,'tab\there'),(7,'')")
+    frame = parse_insert_values(values, ["service_id", "name"], ["service_id", "name"],
+                                {"service_id": "int", "name": "varchar"})
+    assert frame["service_id"].tolist() == [1, 2, 3, 4, 5, 6, 7]
+    assert frame["name"].tolist() == ["O'Brien", "a,b (c)", "line\nbreak", "back\\slash", None, "tab\there", ""]
+
+
+def test_parse_insert_values_types_and_column_selection():
+    values = b"(1,'2024-01-01 08:00:00',12.50,'x'),(2,NULL,NULL,'y')"
+    frame = parse_insert_values(values, ["id", "created", "price", "note"], ["created", "price"],
+                                {"id": "int", "created": "datetime", "price": "decimal", "note": "varchar"})
+    assert list(frame.columns) == ["created", "price"]
+    assert frame["created"].iloc[0] == pd.Timestamp("2024-01-01 08:00:00")
+    assert pd.isna(frame["created"].iloc[1])
+    assert frame["price"].iloc[0] == 12.5 and pd.isna(frame["price"].iloc[1])
+
+
+def test_parse_insert_values_rejects_ragged_rows():
+    with pytest.raises(ValueError):
+        parse_insert_values(b"(1,'a'),(2)", ["id", "name"], ["id"], {"id": "int", "name": "varchar"})
+
+
+def write_dump_directory(directory, tables):
+    """A per-table dump directory with the manifest dump_pipeline.py writes."""
+    directory.mkdir()
+    entries = {}
+    for table, data in tables.items():
+        name = f"billing_{table}.sql.gz"
+        (directory / name).write_bytes(gzip.compress(data))
+        entries[table] = {"file": name, "sha256": file_checksum(str(directory / name))}
+    (directory / DUMP_MANIFEST).write_text(json.dumps({"database": "billing", "tables": entries}))
+
+
+def test_dump_directory_reads_the_selected_tables(tmp_path):
+    directory = tmp_path / "billing_backup_Friday"
+    write_dump_directory(directory, {"patient": b"-- patient rows\n", "services": b"-- service rows\n"})
+    assert find_backups(str(tmp_path)) == [str(directory)]
+    assert b"".join(iter_backup_chunks(str(directory))) == b"-- patient rows\n-- service rows\n"
+    assert b"".join(iter_backup_chunks(str(directory), tables=["services"])) == b"-- service rows\n"
+
+
+def test_corrupt_dump_directory_fails_before_any_chunk(tmp_path):
+    directory = tmp_path / "billing_backup_Friday"
+    write_dump_directory(directory, {"patient": b"-- patient rows\n", "services": b"-- service rows\n"})
+    (directory / "billing_services.sql.gz").write_bytes(gzip.compress(b"-- other rows\n"))
+    chunks = iter_backup_chunks(str(directory))
+    with pytest.raises(RuntimeError, match="services"):
+        next(chunks)
+    assert b"".join(iter_backup_chunks(str(directory), tables=["patient"])) == b"-- patient rows\n"
+
+
+TRIGGER_DUMP = b"""/*!40101 SET NAMES utf8mb4 */;
+
+--
+-- Table structure for table `audit_log`
+--
+
+CREATE TABLE `audit_log` (
+  `id` int NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+/*!50003 SET @saved_sql_mode       = @@sql_mode */ ;
+DELIMITER ;;
+/*!50003 CREATE*/ /*!50003 TRIGGER `audit_bi` BEFORE INSERT ON `audit_log` FOR EACH ROW BEGIN
+SET NEW.id = NEW.id + 1;
+END */;;
+DELIMITER ;
+/*!50003 SET sql_mode              = @saved_sql_mode */ ;
+
+--
+-- Table structure for table `patient`
+--
+
+CREATE TABLE `patient` (
+  `patient_id` int NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+INSERT INTO `patient` VALUES (1);
+/*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;
+
+-- Dump completed on 2024-01-02  1:00:00
+"""
+
+
+@pytest.mark.parametrize("size", [9, len(TRIGGER_DUMP)])
+def test_trigger_bodies_stay_with_their_table(size):
+    skipped = b"".join(filter_tables(chunked(TRIGGER_DUMP, size), ["patient"]))
+    assert b"NEW.id" not in skipped and b"DELIMITER" not in skipped
+    assert b"INSERT INTO `patient`" in skipped
+    assert b"-- Dump completed" in skipped
+    kept = b"".join(filter_tables(chunked(TRIGGER_DUMP, size), ["audit_log"]))
+    assert b"DELIMITER ;;\n/*!50003 CREATE*/" in kept and b"SET NEW.id = NEW.id + 1;\nEND */;;\nDELIMITER ;\n" in kept
+    assert b"INSERT INTO `patient`" not in kept
+
+
+@pytest.fixture
+def fake_mysql(tmp_path, monkeypatch):
+    """A `mysql` on PATH that saves each restore stream it is given under tmp_path/restored."""
+    restored = tmp_path / "restored"
+    restored.mkdir()
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "mysql"
+    script.write_text(f"#!/bin/sh\ncat > \"$(mktemp {restored}/XXXXXX)\"\n")
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return restored
+
+
+def restored_streams(restored):
+    return [path.read_bytes() for path in restored.iterdir()]
+
+
+def test_parallel_restore_loads_each_table_on_its_own_connection(tmp_path, fake_mysql):
+    timings = parallel_restore(chunked(DUMP, 13), "billing", "root", "secret", workers=2, spool_dir=str(tmp_path))
+    assert set(timings) == {"patient", "services"}
+    assert timings["services"][1] == 3
+    streams = restored_streams(fake_mysql)
+    assert len(streams) == 2
+    for stream in streams:
+        assert stream.startswith(b"-- MySQL dump") and stream.endswith(b"COMMIT;\n")
+        assert BULK_LOAD_SETTINGS in stream
+        assert (b"INSERT INTO `patient`" in stream) != (b"INSERT INTO `services`" in stream)
+    assert not list(tmp_path.glob("restore_segments_*"))
+
+
+def test_parallel_restore_directory_streams_the_table_files(tmp_path, fake_mysql):
+    directory = tmp_path / "billing_backup_Friday"
+    write_dump_directory(directory, {"patient": b"INSERT INTO `patient` VALUES (1),(2);\n",
+                                     "services": b"INSERT INTO `services` VALUES (1);\n"})
+    timings = parallel_restore_directory(str(directory), ["services"], "billing", "root", "secret", workers=2)
+    assert list(timings) == ["services"]
+    assert restored_streams(fake_mysql) == [BULK_LOAD_SETTINGS + b"INSERT INTO `services` VALUES (1);\nCOMMIT;\n"]
+
+
+def test_failed_table_fails_the_parallel_restore(tmp_path, fake_mysql):
+    (tmp_path / "bin" / "mysql").write_text("#!/bin/sh\ncat > /dev/null\nexit 1\n")
+    with pytest.raises(RuntimeError, match="exit code 1"):
+        parallel_restore([DUMP], "billing", "root", "secret", workers=2, spool_dir=str(tmp_path))
+    assert not list(tmp_path.glob("restore_segments_*"))
+
+
+@pytest.mark.parametrize("size", [7, len(DUMP)])
+def test_filter_tables_hashes_the_selected_tables_as_it_goes(size):
+    hashes = {}
+    assert b"".join(filter_tables(chunked(DUMP, size), ["services"], hashes)) == \
+        b"".join(filter_tables([DUMP], ["services"]))
+    assert list(hashes) == ["patient", "services"]
+    assert hashes["patient"] is None
+    later = {}
+    list(filter_tables([DUMP.replace(b"1:00:00", b"2:30:00")], None, later))
+    assert later["services"] == hashes["services"] and later["patient"] is not None
+    changed = {}
+    list(filter_tables([DUMP.replace(b"'Ward'", b"'Ward B'")], ["services"], changed))
+    assert changed["services"] != hashes["services"]
+
+
+MANIFEST = {"database": "billing", "checksum": "old", "dump_tables": ["patient", "services", "audit_log"],
+            "tables": {"patient": "p1", "services": "s1"}}
+
+
+def test_plan_restore_reuses_an_unchanged_backup():
+    assert plan_restore(MANIFEST, "old", ["patient", "services"]) == []
+    assert plan_restore(MANIFEST, "old", ["patient", "unknown"]) == []
+    assert plan_restore(MANIFEST, "old", None) == ["audit_log"]
+    assert plan_restore({}, "old", ["patient"]) == ["patient"]
+
+
+def test_plan_restore_of_a_changed_single_file_dump_restores_every_wanted_table():
+    assert plan_restore(MANIFEST, "new", ["patient", "services"]) == ["patient", "services"]
+    assert plan_restore(MANIFEST, "new", None) is None
+    assert plan_restore({"checksum": "old", "tables": {"patient": "p1"}}, "old", None) is None
+
+
+def test_plan_restore_of_a_dump_directory_picks_the_changed_tables():
+    dump_hashes = {"patient": "p1", "services": "s2", "audit_log": "a1"}
+    assert plan_restore(MANIFEST, "new", ["patient", "services"], dump_hashes) == ["services"]
+    assert plan_restore(MANIFEST, "new", ["patient", "unknown"], dump_hashes) == []
+    assert plan_restore(MANIFEST, "new", None, dump_hashes) == ["services", "audit_log"]
+
+
+def test_dump_directory_hashes_come_from_its_manifest(tmp_path):
+    directory = tmp_path / "billing_backup_Friday"
+    write_dump_directory(directory, {"patient": b"-- patient rows\n"})
+    assert dump_table_hashes(str(directory)) == {"patient": file_checksum(str(directory / "billing_patient.sql.gz"))}
+    manifest = json.loads((directory / DUMP_MANIFEST).read_text())
+    manifest["tables"]["patient"]["content_sha256"] = "c1"
+    (directory / DUMP_MANIFEST).write_text(json.dumps(manifest))
+    assert dump_table_hashes(str(directory)) == {"patient": "c1"}
+    assert dump_table_hashes(str(tmp_path / "billing_backup_Friday.sql.gz")) is None
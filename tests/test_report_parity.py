@@ -0,0 +1,119 @@
+"""The two engines must give the same report: report_sql on a database, report_frames on a snapshot.
+
+The SQL side runs on SQLite loaded from the snapshot, which understands every
+statement of the default single-pass report; MySQL itself is not needed.
+"""
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from columnar_snapshot import build_snapshot, load_snapshot
+from dump_restore import iter_backup_chunks
+from report_frames import compute_report_results, rollup_days, same_rows
+from report_sql import ORDER_ENTRY_SECTIONS, fetch_order_entry_results, fetch_report_results, fetch_rollup_days
+from rollup_store import ROLLUP_SECTIONS, ROLLUPS
+from synthetic_dump import write_synthetic_dump
+
+NOW = pd.Timestamp("2024-06-30 12:00:00")
+START, END = "2024-06-01", "2024-06-30"
+
+
+class SqliteCursor:
+    """The slice of the mysql.connector cursor API the report code uses."""
+
+    def __init__(self, db):
+        self.cursor = db.cursor()
+
+    def execute(self, query, params=()):
+        self.cursor.execute(query.replace("%s", "?"), params)
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def fetchmany(self, size):
+        return self.cursor.fetchmany(size)
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    def close(self):
+        self.cursor.close()
+
+
+class SqlitePool:
+    """Stands in for both the connection pool and its connections."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def get_connection(self):
+        return self
+
+    def cursor(self, **options):
+        return SqliteCursor(self.db)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(scope="module")
+def frames(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("parity")
+    dump = str(directory / "billing_prod_import_backup_Sunday.sql.gz")
+    write_synthetic_dump(dump, 3000, seed=3, end_date=NOW)
+    build_snapshot(iter_backup_chunks(dump), str(directory / "snapshot"))
+    return load_snapshot(str(directory / "snapshot"))
+
+
+@pytest.fixture(scope="module")
+def pool(frames):
+    db = sqlite3.connect(":memory:", check_same_thread=False)
+    for table, frame in frames.items():
+        frame = frame.copy()
+        for column in frame.columns:
+            if pd.api.types.is_datetime64_any_dtype(frame[column]):
+                frame[column] = frame[column].dt.strftime("%Y-%m-%d %H:%M:%S")
+        frame.to_sql(table, db, index=False)
+    return SqlitePool(db)
+
+
+def test_report_sections_match(frames, pool):
+    expected = compute_report_results(frames, NOW.to_pydatetime(), START, END)
+    results = fetch_report_results(pool, NOW.to_pydatetime(), START, END, workers=2)
+    assert sorted(results) == sorted(expected)
+    for section, rows in expected.items():
+        if isinstance(rows, list):
+            assert same_rows(results[section], rows), section
+        elif isinstance(rows, tuple):
+            assert same_rows([results[section]], [rows]), section
+        else:
+            assert results[section] == rows, section
+
+
+@pytest.mark.parametrize("rollup", list(ROLLUPS))
+def test_rollup_days_match(frames, pool, rollup):
+    assert same_rows(fetch_rollup_days(pool, rollup, None), rollup_days(frames, rollup, None))
+    since = pd.Timestamp(START).date()
+    assert same_rows(fetch_rollup_days(pool, rollup, since), rollup_days(frames, rollup, since))
+
+
+def test_order_entry_batches_combine_to_the_whole_scan(frames, pool):
+    expected = compute_report_results(frames, NOW.to_pydatetime(), START, END)
+    results = fetch_order_entry_results(pool, NOW.to_pydatetime(), START, END, batch_size=97)
+    assert sorted(results) == sorted(ORDER_ENTRY_SECTIONS)
+    for section in ORDER_ENTRY_SECTIONS:
+        assert same_rows(results[section], expected[section]), section
+
+
+def test_rollup_sections_are_not_computed_when_skipped(frames, pool):
+    expected = compute_report_results(frames, NOW.to_pydatetime(), START, END, skip=ROLLUP_SECTIONS)
+    assert not set(ROLLUP_SECTIONS) & set(expected)
+    results = fetch_order_entry_results(pool, NOW.to_pydatetime(), START, END, skip=ROLLUP_SECTIONS)
+    assert sorted(results) == ["most_popular_services", "most_profitable_services", "order_entries"]
+    for section, rows in results.items():
+        assert same_rows(rows, expected[section]), section
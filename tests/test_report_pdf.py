@@ -0,0 +1,43 @@
+import re
+import zlib
+
+import pandas as pd
+
+from report_pdf import write_report_pdf
+
+
+def page_texts(data):
+    """The decompressed content stream of every page, in order."""
+    streams = re.findall(rb"/FlateDecode >>\nstream\n(.*?)\nendstream", data, re.S)
+    return [zlib.decompress(stream).decode("cp1252") for stream in streams]
+
+
+def test_long_tables_continue_over_pages_with_their_header(tmp_path):
+    path = tmp_path / "report.pdf"
+    visits = pd.DataFrame({"Date": [f"2024-06-{day % 30 + 1:02d}" for day in range(120)],
+                           "Visits": range(120)})
+    paying = pd.DataFrame({"Category": ["Paying", "Non-paying", None], "Patients": [12, 3, None]})
+    side = pd.DataFrame({"Age group": ["0-5", "(50+)"], "Patients": [1, 2]})
+    pages = write_report_pdf(str(path), [("Hospital Visits", visits, []),
+                                         ("Paying vs Non-Paying", paying, [("By age", side)])])
+
+    data = path.read_bytes()
+    assert data.startswith(b"%PDF-1.4") and data.rstrip().endswith(b"%%EOF")
+    assert data.count(b"/Type /Page ") == pages and b"/Count %d" % pages in data
+    texts = page_texts(data)
+    assert len(texts) == pages >= 3
+    assert "(Hospital Visits \\(continued\\))" in texts[1] and "(Visits)" in texts[1]
+    assert "(119)" in "".join(texts[:-1])
+    assert "(Paying vs Non-Paying)" in texts[-1] and "(By age)" in texts[-1] and "\\(50+\\)" in texts[-1]
+    assert f"page {pages})" in texts[-1]
+
+
+def test_cross_reference_offsets_point_at_the_objects(tmp_path):
+    path = tmp_path / "report.pdf"
+    write_report_pdf(str(path), [("Summary", pd.DataFrame({"Total": [1.5]}), [])])
+    data = path.read_bytes()
+    xref = int(data.rsplit(b"startxref\n", 1)[1].split()[0])
+    assert data[xref:].startswith(b"xref\n")
+    offsets = re.findall(rb"(\d{10}) 00000 n ", data[xref:])
+    for number, offset in enumerate(offsets, start=1):
+        assert data[int(offset):].startswith(b"%d 0 obj\n" % number)
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from report_windows import metric_windows, parse_window, registered_patients, window_metrics
+
+NOW = pd.Timestamp("2024-05-15 10:30:00")  # a Wednesday
+
+
+def test_named_windows_run_to_the_end_of_today():
+    tomorrow = pd.Timestamp("2024-05-16")
+    assert parse_window("today", NOW) == ("today", pd.Timestamp("2024-05-15"), tomorrow)
+    assert parse_window("week", NOW) == ("week", pd.Timestamp("2024-05-13"), tomorrow)
+    assert parse_window("month", NOW) == ("month", pd.Timestamp("2024-05-01"), tomorrow)
+    assert parse_window("quarter", NOW) == ("quarter", pd.Timestamp("2024-04-01"), tomorrow)
+    assert parse_window("year", NOW) == ("year", pd.Timestamp("2024-01-01"), tomorrow)
+
+
+def test_custom_window_includes_both_days():
+    assert parse_window("ramadan=2024-03-11:2024-04-09", NOW) == (
+        "ramadan", pd.Timestamp("2024-03-11"), pd.Timestamp("2024-04-10"))
+    assert parse_window("single=2024-03-11:2024-03-11", NOW)[1:] == (
+        pd.Timestamp("2024-03-11"), pd.Timestamp("2024-03-12"))
+
+
+@pytest.mark.parametrize("text", ["fortnight", "late=2024-03-11:2024-03-10", "bad=2024-3-1:2024-03-10"])
+def test_bad_windows_are_rejected(text):
+    with pytest.raises(ValueError):
+        parse_window(text, NOW)
+
+
+def test_custom_windows_follow_the_registration_windows():
+    windows = metric_windows(NOW, ["quarter", "q1=2024-01-01:2024-03-31", "month"])
+    assert list(windows) == ["year", "month", "week", "today", "quarter", "q1"]
+
+
+def test_a_label_may_not_name_another_range():
+    with pytest.raises(ValueError, match="reuses the label today"):
+        metric_windows(NOW, ["today=2024-01-01:2024-01-31"])
+    assert metric_windows(NOW, ["today=2024-05-15:2024-05-15"])["today"] == (
+        pd.Timestamp("2024-05-15"), pd.Timestamp("2024-05-16"))
+
+
+def test_window_metrics_from_frames():
+    frames = {
+        "patient": pd.DataFrame({"date_created": pd.to_datetime(["2024-05-15 08:00", "2024-05-02 00:00", "2023-12-31 00:00"]),
+                                 "voided": [0, 0, 0]}),
+        "order_entries": pd.DataFrame({
+            "order_date": pd.to_datetime(["2024-05-15 09:00", "2024-05-14 00:00", "2024-02-01 00:00"]),
+            "created_at": pd.to_datetime(["2024-05-15 09:05", "2024-05-14 00:00", "2024-02-01 00:00"]),
+            "voided": [0, 1, 0],
+            "amount_paid": [100.0, 50.0, None],
+            "full_price": [120.0, 60.0, 10.0],
+            "cashier": pd.Series(["1", "8", "2"], dtype="category"),
+        }),
+    }
+    rows = window_metrics(frames, metric_windows(NOW))
+    assert [row[0] for row in rows] == ["year", "month", "week", "today"]
+    assert registered_patients(rows) == (2, 2, 1, 1)
+    year = rows[0]
+    assert year[1:] == (pd.Timestamp("2024-01-01").date(), pd.Timestamp("2024-05-15").date(), 2, 2, 100.0, 180.0)
@@ -0,0 +1,53 @@
+import pandas as pd
+from openpyxl import load_workbook
+
+from report_workbook import (FIRST_DATA_ROW, ROW_CHUNK, cell_text, paying_block, returning_patient_blocks,
+                             write_report_workbook)
+
+
+def test_rows_stream_past_a_chunk_with_the_layout_laid_over(tmp_path):
+    path = tmp_path / "report.xlsx"
+    visits = pd.DataFrame({"Date": [f"day {i}" for i in range(ROW_CHUNK + 5)],
+                           "Visits": [i if i % 7 else None for i in range(ROW_CHUNK + 5)]})
+    summary = pd.DataFrame({"Period": ["This Year", "Today"], "Registered": [120, 3]})
+    write_report_workbook(str(path), [
+        ("Hospital Visits", visits, None),
+        ("Registered Patients", summary, {"sized_cells": paying_block(10, 6, 3, 1)}),
+    ], password="secret")
+
+    wb = load_workbook(path)
+    ws = wb["Hospital Visits"]
+    assert ws["A1"].value == "Hospital Visits" and ws["A1"].font.bold
+    assert "A1:B1" in {str(merged) for merged in ws.merged_cells.ranges}
+    assert [ws["A2"].value, ws["B2"].value] == ["Date", "Visits"]
+    assert ws.max_row == FIRST_DATA_ROW + ROW_CHUNK + 4
+    last = FIRST_DATA_ROW + ROW_CHUNK + 4
+    assert [ws[f"A{last}"].value, ws[f"B{last}"].value] == [f"day {ROW_CHUNK + 4}", ROW_CHUNK + 4]
+    assert ws[f"B{FIRST_DATA_ROW}"].value is None
+    assert ws.protection.sheet
+
+    ws = wb["Registered Patients"]
+    assert ws["D2"].value == "Paying vs. Non-Paying Patients" and ws["D2"].font.bold
+    assert [ws["D5"].value, ws["E5"].value] == ["Exclusively Non-Paying Patients", 3]
+    assert [ws["A4"].value, ws["B4"].value] == ["Today", 3]
+    assert ws.column_dimensions["D"].width == len("Exclusively Non-Paying Patients") + 2
+
+
+def test_side_blocks_run_past_the_frame(tmp_path):
+    path = tmp_path / "report.xlsx"
+    frame = pd.DataFrame({"Patient": ["a"], "Visits": [2]})
+    layout = returning_patient_blocks(FIRST_DATA_ROW + 2, [("adult", "F", 4), ("adult", "M", 1)], [(2, 3), (3, 2)],
+                                      "2024-06-01", "2024-06-30")
+    write_report_workbook(str(path), [("Returning Patients", frame, layout)])
+
+    ws = load_workbook(path)["Returning Patients"]
+    first = FIRST_DATA_ROW + 2
+    assert ws.cell(first, 1).value.startswith("Returning Patients Distribution")
+    assert f"A{first}:C{first}" in {str(merged) for merged in ws.merged_cells.ranges}
+    assert ws.cell(first + 2, 1).value == "adult (F)" and ws.cell(first + 4, 3).value == 5
+    assert ws.max_row == first + 10 and ws.cell(first + 10, 3).value == 5
+
+
+def test_cell_text_reads_like_the_saved_value():
+    assert cell_text(12.0) == "12" and cell_text(12.5) == "12.5"
+    assert cell_text(0.1 + 0.2) == "0.3" and cell_text("x") == "x"
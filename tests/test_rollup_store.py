@@ -0,0 +1,63 @@
+from datetime import date, timedelta
+
+from rollup_store import REFRESH_DAYS, open_rollup_store, refresh_rollups, rollup_results
+
+
+class Source:
+    """fetch_days over in-memory daily registrations; the other rollups stay empty."""
+
+    def __init__(self, registrations):
+        self.registrations = registrations
+        self.calls = []
+
+    def __call__(self, rollup, since):
+        self.calls.append((rollup, since))
+        if rollup != "daily_registrations":
+            return []
+        return [(day, count) for day, count in sorted(self.registrations.items()) if since is None or day >= since]
+
+
+def stored(store):
+    return dict(store.execute("SELECT day, registrations FROM daily_registrations ORDER BY day"))
+
+
+NEWEST = date(2024, 6, 30)
+DAYS = {NEWEST - timedelta(days=n): n + 1 for n in range(30)}
+
+
+def test_first_refresh_covers_all_history():
+    store = open_rollup_store(":memory:")
+    source = Source(DAYS)
+    refresh_rollups(store, source, {"patient": "h1"})
+    assert ("daily_registrations", None) in source.calls
+    assert stored(store) == {str(day): count for day, count in DAYS.items()}
+
+
+def test_refresh_rechecks_only_the_recent_days():
+    store = open_rollup_store(":memory:")
+    refresh_rollups(store, Source(DAYS), {"patient": "h1"})
+    recent, old = NEWEST - timedelta(days=2), NEWEST - timedelta(days=20)
+    source = Source({**DAYS, recent: 100, old: 200, NEWEST + timedelta(days=1): 5})
+    refresh_rollups(store, source, {"patient": "h2"})
+    assert ("daily_registrations", NEWEST - timedelta(days=REFRESH_DAYS)) in source.calls
+    days = stored(store)
+    assert days[str(recent)] == 100 and days[str(NEWEST + timedelta(days=1))] == 5
+    assert days[str(old)] == DAYS[old]
+
+    refresh_rollups(store, source, {"patient": "h2"}, rebuild=True)
+    assert stored(store)[str(old)] == 200
+
+
+def test_unchanged_source_table_is_not_read():
+    store = open_rollup_store(":memory:")
+    refresh_rollups(store, Source(DAYS), {"patient": "h1", "order_entries": "o1", "receipts": "r1"})
+    source = Source(DAYS)
+    refresh_rollups(store, source, {"patient": "h1", "order_entries": "o1", "receipts": "r1"})
+    assert source.calls == []
+
+
+def test_hospital_visits_from_the_store():
+    store = open_rollup_store(":memory:")
+    refresh_rollups(store, Source(DAYS), {})
+    visits = rollup_results(store, "2024-06-29", "2024-06-30")["hospital_visits"]
+    assert visits == [("2024-06-29", 2, 0, 2), ("2024-06-30", 1, 0, 1)]